@@ -0,0 +1,76 @@
+"""Compila precios, redes, info adicional y campañas en datos_cotizador.npz.
+
+Uso: python actualizar_db.py [--salida datos_cotizador.npz]
+
+La app abre esa foto con mmap al arrancar y solo vuelve a leer los CSV/XLSX si alguno cambió.
+"""
+import sys
+import argparse
+
+import numpy as np
+
+from datos import ARCHIVO_FOTO, ARCHIVOS_DATOS, cargar_foto_fuentes, guardar_foto_binaria, leer_foto_binaria
+from tarifas import TRAMO, COLUMNAS_SALUD, informe_anomalias
+
+def validar_foto(foto):
+    """Devuelve (errores, avisos). Con errores no se escribe la foto."""
+    errores, avisos = [], []
+    offsets = foto.indice_precios['offsets']
+
+    if not offsets: errores.append("La tarifa no tiene planes")
+    if not foto.clinicas_unicas: errores.append("base_clinicas.xlsx no tiene clínicas en la hoja REDES")
+    for anio, (clave, precio) in sorted(foto.indice_precios['tramos'].items()):
+        if not np.isfinite(precio).all(): errores.append(f"Hay precios no numéricos en precios_{anio}.csv")
+        if (precio < 0).any(): errores.append(f"Hay precios negativos en precios_{anio}.csv")
+        # Series (plan, salud) con algún tramo de precio > 0
+        con_precio = set((clave[precio > 0] // TRAMO // len(COLUMNAS_SALUD)).tolist())
+        for (cia, plan), fila in offsets.items():
+            if fila not in con_precio: avisos.append(f"{cia} - {plan}: sin ningún precio mayor a 0 en precios_{anio}.csv")
+    for cia, plan in foto.indice_clinicas['planes']:
+        if (cia, plan) not in offsets: avisos.append(f"{cia} - {plan}: tiene red pero no tarifa (no se cotizará)")
+    for (cia, plan), reg in foto.catalogo['planes'].items():
+        if reg.nivel_cobertura in ('', '-'): avisos.append(f"{cia} - {plan}: sin Nivel_Cobertura en info_adicional.csv")
+    filas = foto.campanas.filas
+    for cia, plan, tipo in zip(filas['Aseguradora'], filas['Plan'], filas['Tipo_Cliente']):
+        if (cia, plan) not in offsets: avisos.append(f"Campaña para plan inexistente: {cia} - {plan}")
+        if tipo not in ('Nuevo', 'Continuidad', 'Todos', ''): avisos.append(f"Campaña con Tipo_Cliente desconocido (no se aplica): {cia} - {plan} '{tipo}'")
+    for _, f in filas[(filas['Desde'] > 0) & (filas['Hasta'] > 0) & (filas['Desde'] > filas['Hasta'])].iterrows():
+        avisos.append(f"Campaña con Desde posterior a Hasta (no se aplica): {f['Aseguradora']} - {f['Plan']}")
+    return errores, sorted(set(avisos))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compila los datos del cotizador en una foto binaria.")
+    parser.add_argument('--salida', default=ARCHIVO_FOTO)
+    args = parser.parse_args(argv)
+
+    foto = cargar_foto_fuentes(ARCHIVOS_DATOS)
+    if foto is None:
+        print("❌ Faltan precios_<año>.csv o base_clinicas.xlsx")
+        return 1
+
+    errores, avisos = validar_foto(foto)
+    for a in informe_anomalias(foto.anomalias_tarifa) + avisos: print(f"⚠️ {a}")
+    if errores:
+        for e in errores: print(f"❌ {e}")
+        return 1
+
+    guardar_foto_binaria(foto, args.salida)
+
+    # Se relee para confirmar que la foto escrita es igual a la de las fuentes
+    leida = leer_foto_binaria(args.salida, ARCHIVOS_DATOS)
+    tramos_iguales = leida is not None and leida.indice_precios['tramos'].keys() == foto.indice_precios['tramos'].keys() \
+        and all(np.array_equal(leida.indice_precios['tramos'][a][i], t[i]) for a, t in foto.indice_precios['tramos'].items() for i in (0, 1))
+    if leida is None or not tramos_iguales \
+            or leida.catalogo['planes'] != foto.catalogo['planes'] \
+            or not np.array_equal(leida.indice_clinicas['matriz'], foto.indice_clinicas['matriz']) \
+            or leida.campanas.filas.to_dict('records') != foto.campanas.filas.to_dict('records') \
+            or leida.anomalias_tarifa != foto.anomalias_tarifa:
+        print(f"❌ La verificación de {args.salida} falló")
+        return 1
+
+    tarifas = ", ".join(f"{anio} ({len(clave)} tramos)" for anio, (clave, _) in sorted(foto.indice_precios['tramos'].items()))
+    print(f"✅ {args.salida}: {len(foto.indice_precios['offsets'])} planes, tarifas {tarifas}, {len(foto.clinicas_unicas)} clínicas, {len(foto.campanas)} campañas")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
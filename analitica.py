@@ -0,0 +1,159 @@
+import csv
+from bisect import bisect_right
+from collections import Counter
+from typing import NamedTuple
+
+import pandas as pd
+
+# --- ANALÍTICA DE LEADS ---
+# Resúmenes que se acumulan en historial_leads.db en la misma transacción que escribe cada lote de leads:
+#   resumen_dia:     (Dia, Cobertura, Tramo_Edad) -> Leads, Asegurados
+#   resumen_clinica: (Dia, Cobertura, Clinica, Tramo_Edad) -> Leads
+#   resumen_plan:    (Dia, Cobertura, Aseguradora, Plan) -> Propuestas (plan recomendado en cada propuesta PDF)
+# Un lead con varias clínicas suma una vez en cada una (Clinica '' = sin preferencia), así que los totales salen
+# de resumen_dia. Las consultas recorren solo estas tablas: su tamaño depende de los días y categorías, no de los leads.
+
+LIMITES_TRAMOS = [18, 26, 36, 46, 56, 65]
+TRAMOS_EDAD = ['0-17', '18-25', '26-35', '36-45', '46-55', '56-64', '65+']
+SIN_EDAD = 'Sin dato'
+# dimensión -> (expresión SQL, nombre de columna)
+DIMENSIONES = {'dia': ('Dia', 'Dia'), 'mes': ('substr(Dia, 1, 7)', 'Mes'), 'cobertura': ('Cobertura', 'Cobertura'),
+               'tramo': ('Tramo_Edad', 'Tramo_Edad'), 'clinica': ('Clinica', 'Clinica')}
+# Las de resumen_plan (planes recomendados)
+DIMENSIONES_PLAN = {'dia': DIMENSIONES['dia'], 'mes': DIMENSIONES['mes'], 'cobertura': DIMENSIONES['cobertura'],
+                    'aseguradora': ('Aseguradora', 'Aseguradora'), 'plan': ('Plan', 'Plan')}
+TABLAS_RESUMEN = ('resumen_dia', 'resumen_clinica', 'resumen_plan')
+
+ESQUEMA_RESUMEN = """
+CREATE TABLE IF NOT EXISTS resumen_dia (
+    Dia TEXT NOT NULL, Cobertura TEXT NOT NULL, Tramo_Edad TEXT NOT NULL,
+    Leads INTEGER NOT NULL, Asegurados INTEGER NOT NULL,
+    PRIMARY KEY (Dia, Cobertura, Tramo_Edad)
+);
+CREATE TABLE IF NOT EXISTS resumen_clinica (
+    Dia TEXT NOT NULL, Cobertura TEXT NOT NULL, Clinica TEXT NOT NULL, Tramo_Edad TEXT NOT NULL,
+    Leads INTEGER NOT NULL,
+    PRIMARY KEY (Dia, Cobertura, Clinica, Tramo_Edad)
+);
+CREATE TABLE IF NOT EXISTS resumen_plan (
+    Dia TEXT NOT NULL, Cobertura TEXT NOT NULL, Aseguradora TEXT NOT NULL, Plan TEXT NOT NULL,
+    Propuestas INTEGER NOT NULL,
+    PRIMARY KEY (Dia, Cobertura, Aseguradora, Plan)
+);
+"""
+
+def tramo_edad(edad):
+    try: return TRAMOS_EDAD[bisect_right(LIMITES_TRAMOS, int(float(edad)))]
+    except (TypeError, ValueError): return SIN_EDAD
+
+def _entero(valor, defecto=1):
+    try: return int(valor)
+    except (TypeError, ValueError): return defecto
+
+class Conteo(NamedTuple):
+    leads: Counter           # (Dia, Cobertura, Tramo_Edad) -> leads
+    asegurados: Counter      # (Dia, Cobertura, Tramo_Edad) -> asegurados
+    clinicas: Counter        # (Dia, Cobertura, Clinica, Tramo_Edad) -> leads
+
+def contar_leads(filas, conteo=None):
+    """Suma a `conteo` (uno nuevo por defecto) los leads de `filas`: tuplas (día aaaa-mm-dd, cobertura, edad, clínicas 'a, b', asegurados)."""
+    conteo = conteo or Conteo(Counter(), Counter(), Counter())
+    for dia, cobertura, edad, clinicas, asegurados in filas:
+        clave = (dia, cobertura or '', tramo_edad(edad))
+        conteo.leads[clave] += 1
+        conteo.asegurados[clave] += _entero(asegurados)
+        for cli in {c.strip() for c in str(clinicas or '').split(',')}:
+            conteo.clinicas[(dia, clave[1], cli, clave[2])] += 1
+    return conteo
+
+def volcar(con, conteo):
+    """Suma el conteo a las tablas de resumen (dentro de la transacción de `con`)."""
+    con.executemany("INSERT INTO resumen_dia VALUES (?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET "
+                    "Leads = Leads + excluded.Leads, Asegurados = Asegurados + excluded.Asegurados",
+                    [k + (n, conteo.asegurados[k]) for k, n in conteo.leads.items()])
+    con.executemany("INSERT INTO resumen_clinica VALUES (?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET Leads = Leads + excluded.Leads",
+                    [k + (n,) for k, n in conteo.clinicas.items()])
+
+def reconstruir(con, lotes):
+    """Rehace los resúmenes desde cero con lotes de filas (ver contar_leads) en una sola pasada, dentro de la transacción de `con`.
+
+    Devuelve cuántos leads se contaron.
+    """
+    conteo, total = None, 0
+    for filas in lotes:
+        filas = list(filas)
+        conteo = contar_leads(filas, conteo)
+        total += len(filas)
+    con.execute("DELETE FROM resumen_dia")
+    con.execute("DELETE FROM resumen_clinica")
+    if conteo: volcar(con, conteo)
+    return total
+
+def contar_propuestas(filas, conteo=None):
+    """Suma a `conteo` (un Counter nuevo por defecto) las propuestas de `filas`: tuplas (día aaaa-mm-dd, cobertura, aseguradora, plan)."""
+    conteo = conteo if conteo is not None else Counter()
+    for dia, cobertura, aseguradora, plan in filas:
+        conteo[(dia, cobertura or '', aseguradora, plan)] += 1
+    return conteo
+
+def volcar_propuestas(con, conteo):
+    """Suma el conteo de propuestas a resumen_plan (dentro de la transacción de `con`)."""
+    con.executemany("INSERT INTO resumen_plan VALUES (?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET Propuestas = Propuestas + excluded.Propuestas",
+                    [k + (n,) for k, n in conteo.items()])
+
+def reconstruir_propuestas(con, filas):
+    """Rehace resumen_plan desde cero con las filas de contar_propuestas, dentro de la transacción de `con`."""
+    conteo = contar_propuestas(filas)
+    con.execute("DELETE FROM resumen_plan")
+    volcar_propuestas(con, conteo)
+    return sum(conteo.values())
+
+# --- CONSULTA ---
+def _filtros(desde=None, hasta=None, cobertura=None, clinica=None):
+    condiciones, params = [], []
+    if desde is not None:
+        condiciones.append("Dia >= ?"); params.append(desde.strftime('%Y-%m-%d'))
+    if hasta is not None:
+        condiciones.append("Dia < ?"); params.append(hasta.strftime('%Y-%m-%d'))
+    if cobertura is not None:
+        condiciones.append("Cobertura = ?"); params.append(cobertura)
+    if clinica is not None:
+        condiciones.append("Clinica = ?"); params.append(clinica)
+    return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), params
+
+def resumen(con, por=('mes',), **filtros):
+    """Leads (y asegurados si no se agrupa por clínica) sumados por las dimensiones de `por` (claves de DIMENSIONES).
+
+    Filtros: desde/hasta (date, hasta excluido), cobertura, clinica.
+    """
+    expresiones = [DIMENSIONES[d][0] for d in por]
+    por_clinica = 'clinica' in por or filtros.get('clinica') is not None
+    sumas = ["COALESCE(SUM(Leads), 0)"] + ([] if por_clinica else ["COALESCE(SUM(Asegurados), 0)"])
+    where, params = _filtros(**filtros)
+    grupo = f" GROUP BY {', '.join(expresiones)} ORDER BY {', '.join(expresiones)}" if expresiones else ""
+    sql = f"SELECT {', '.join(expresiones + sumas)} FROM {'resumen_clinica' if por_clinica else 'resumen_dia'}{where}{grupo}"
+    columnas = [DIMENSIONES[d][1] for d in por] + ['Leads'] + ([] if por_clinica else ['Asegurados'])
+    return pd.DataFrame(con.execute(sql, params).fetchall(), columns=columnas)
+
+def resumen_planes(con, por=('aseguradora', 'plan'), **filtros):
+    """Propuestas por plan recomendado, sumadas por las dimensiones de `por` (claves de DIMENSIONES_PLAN).
+
+    Filtros: desde/hasta (date, hasta excluido), cobertura.
+    """
+    expresiones = [DIMENSIONES_PLAN[d][0] for d in por]
+    where, params = _filtros(**filtros)
+    grupo = f" GROUP BY {', '.join(expresiones)} ORDER BY {', '.join(expresiones)}" if expresiones else ""
+    sql = f"SELECT {', '.join(expresiones + ['COALESCE(SUM(Propuestas), 0)'])} FROM resumen_plan{where}{grupo}"
+    return pd.DataFrame(con.execute(sql, params).fetchall(), columns=[DIMENSIONES_PLAN[d][1] for d in por] + ['Propuestas'])
+
+def exportar_resumen(con, destino, tabla='resumen_dia'):
+    """Escribe una tabla de resumen (de TABLAS_RESUMEN) en CSV. `destino` es una ruta o un archivo de texto abierto."""
+    if tabla not in TABLAS_RESUMEN: raise ValueError(f"'{tabla}' no es una tabla de resumen ({', '.join(TABLAS_RESUMEN)})")
+    archivo = open(destino, 'w', newline='', encoding='utf-8-sig') if isinstance(destino, str) else destino
+    try:
+        cur = con.execute(f"SELECT * FROM {tabla} ORDER BY 1, 2, 3")
+        escritor = csv.writer(archivo)
+        escritor.writerow([c[0] for c in cur.description])
+        while filas := cur.fetchmany(5000): escritor.writerows(filas)
+    finally:
+        if archivo is not destino: archivo.close()
@@ -0,0 +1,253 @@
+"""API HTTP del cotizador (ASGI, Starlette), sin estado entre peticiones.
+
+Uso: python api.py [--host 0.0.0.0] [--port 8000] [--workers 2] [--procesos-pdf 2]
+     o uvicorn api:app
+
+POST /quote          {"familia": [{"edad": 40, "salud": "Sano"}], "clinicas": [...], "continuidad": "Nuevo", "cobertura": "Integral"}
+POST /quote/batch    {"familias": [<mismo formato que /quote>, ...]}
+POST /quote/optimize <mismo formato que /quote> + opcional "max_polizas": planes repartidos entre los miembros (frente costo / cobertura)
+POST /proposal.pdf   <mismo formato que /quote> + "cliente", y opcionales "plan" (ID a recomendar) y "razon"
+GET  /metrics        métricas en formato Prometheus (con COTIZADOR_METRICAS=1)
+
+Los precios usan las campañas vigentes del día. Cada proceso comparte una sola foto de datos (la de
+datos.py) y una caché de cotizaciones; los PDF se arman en un pool de procesos aparte. Cada PDF emitido
+queda en historial_leads.db con su plan recomendado (rol 'API'), para la analítica de planes de la app.
+"""
+import os
+import sys
+import argparse
+import asyncio
+import contextlib
+import unicodedata
+from datetime import datetime
+from urllib.parse import quote as quote_url
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from datos import AlmacenDatos, ARCHIVOS_DATOS
+from folios import AsignadorFolios
+from historial import AlmacenLeads
+from motor import COBERTURAS, CONDICIONES, EDAD_MAXIMA, buscar_base, aplicar_descuentos, buscar_lote
+from cache_cotizaciones import CacheCotizaciones, clave_cotizacion
+from propuesta_pdf import generar_pdf, motivo_recomendacion, nombre_archivo_pdf
+from metricas import REGISTRO, contar, tramo
+from presentacion import columnas_html
+from optimizador import MAX_POLIZAS, optimizar
+
+MAX_FAMILIAS_LOTE = 1000
+MAX_MIEMBROS = 11
+COLUMNAS_RESPUESTA = ['ID', 'Aseguradora', 'Plan', 'Precio_Lista', 'Pct_Dscto', 'Precio_Final', 'Ahorro_Soles', 'Precio_Mensual',
+                      'Txt_Clin_Red', 'Txt_Cob_Amb', 'Txt_Cob_Hosp', 'Int_Amb_Full', 'Int_Hosp_Full', 'Link_Cartilla', 'Link_Carencia']
+
+almacen = AlmacenDatos(ARCHIVOS_DATOS)
+cache = CacheCotizaciones(max_items=4096)
+asignador = AsignadorFolios('folios.db', 'folio.txt', bloque=10)
+almacen_leads = AlmacenLeads('historial_leads.db')
+_pool_pdf = None
+
+class ErrorSolicitud(ValueError):
+    pass
+
+class DatosNoDisponibles(RuntimeError):
+    pass
+
+class ErrorPDF(RuntimeError):
+    pass
+
+# --- VALIDACIÓN ---
+def _perfil(datos):
+    """Normaliza el JSON de una cotización: (familia, clinicas, continuidad, cobertura)."""
+    if not isinstance(datos, dict): raise ErrorSolicitud("Se esperaba un objeto JSON")
+    familia = datos.get('familia')
+    if not isinstance(familia, list) or not 1 <= len(familia) <= MAX_MIEMBROS:
+        raise ErrorSolicitud(f"'familia' debe ser una lista de 1 a {MAX_MIEMBROS} personas")
+    miembros = []
+    for p in familia:
+        edad = p.get('edad') if isinstance(p, dict) else None
+        # bool es subclase de int ("edad": true valdría 1) y int() truncaría 34.9: solo enteros JSON
+        if type(edad) is not int: raise ErrorSolicitud("Cada persona necesita una 'edad' entera")
+        salud = p.get('salud', 'Sano')
+        if not 0 <= edad <= 120: raise ErrorSolicitud(f"Edad fuera de rango: {edad}")
+        if salud not in ('Sano', 'Crónico'): raise ErrorSolicitud("'salud' debe ser 'Sano' o 'Crónico'")
+        miembros.append({'edad': min(edad, EDAD_MAXIMA), 'salud': salud})
+
+    clinicas = datos.get('clinicas', [])
+    if not isinstance(clinicas, list) or not all(isinstance(c, str) for c in clinicas):
+        raise ErrorSolicitud("'clinicas' debe ser una lista de textos")
+    continuidad = datos.get('continuidad', 'Nuevo')
+    if continuidad not in CONDICIONES: raise ErrorSolicitud(f"'continuidad' debe ser uno de {CONDICIONES}")
+    cobertura = datos.get('cobertura')
+    if cobertura not in COBERTURAS: raise ErrorSolicitud(f"'cobertura' debe ser uno de {COBERTURAS}")
+    return miembros, sorted(set(clinicas)), continuidad, cobertura
+
+def _foto():
+    foto = almacen.actual()
+    if foto is None: raise DatosNoDisponibles(f"Datos no disponibles: {almacen.error}")
+    return foto
+
+def _descuentos(foto, continuidad):
+    tipo_cliente = "Nuevo" if continuidad == "Nuevo" else "Continuidad"
+    return foto.campanas.vector(tipo_cliente)
+
+def _cotizar(foto, familia, clinicas, continuidad, cobertura):
+    """Resultado de buscar (DataFrame). Se memoriza la etapa sin descuentos; el descuento del día se aplica en cada pedido."""
+    clave = clave_cotizacion(familia, clinicas, continuidad, cobertura, {})
+    base = cache.obtener(clave, lambda: buscar_base(foto.catalogo, foto.indice_clinicas, foto.indice_precios, familia, clinicas, continuidad, cobertura),
+                         firma=foto.firma)
+    return aplicar_descuentos(base, _descuentos(foto, continuidad))
+
+def _planes(df):
+    if df.empty: return []
+    return columnas_html(df)[COLUMNAS_RESPUESTA].to_dict('records')
+
+async def _leer_json(request):
+    try: return await request.json()
+    except ValueError: raise ErrorSolicitud("El cuerpo no es JSON válido")
+
+def _errores(endpoint):
+    async def envoltura(request):
+        try: return await endpoint(request)
+        except ErrorSolicitud as e: return JSONResponse({'error': str(e)}, status_code=400)
+        except DatosNoDisponibles as e: return JSONResponse({'error': str(e)}, status_code=503)
+        except ErrorPDF as e: return JSONResponse({'error': str(e)}, status_code=500)
+    return envoltura
+
+# --- ENDPOINTS ---
+@_errores
+async def quote(request):
+    familia, clinicas, continuidad, cobertura = _perfil(await _leer_json(request))
+    foto = _foto()
+    res = await run_in_threadpool(_cotizar, foto, familia, clinicas, continuidad, cobertura)
+    return JSONResponse({'planes': _planes(res)})
+
+def _cotizar_lote(foto, perfiles):
+    descuentos = {tipo: foto.campanas.vector(tipo) for tipo in ('Nuevo', 'Continuidad')}
+    familias = pd.DataFrame({
+        'Edades': [[p['edad'] for p in fam] for fam, _, _, _ in perfiles],
+        'Salud': [[p['salud'] for p in fam] for fam, _, _, _ in perfiles],
+        'Continuidad': [cont for _, _, cont, _ in perfiles],
+        'Cobertura': [cob for _, _, _, cob in perfiles],
+        'Clinicas': [clis for _, clis, _, _ in perfiles],
+    })
+    res = buscar_lote(foto.catalogo, foto.indice_clinicas, foto.indice_precios, familias, descuentos)
+    columnas = ['ID', 'Aseguradora', 'Plan', 'Precio_Lista', 'Pct_Dscto', 'Precio_Final', 'Ahorro_Soles', 'Precio_Mensual']
+    salida = [{'planes': []} for _ in perfiles]
+    for lead, grupo in res.groupby('Lead', sort=False):
+        salida[lead]['planes'] = grupo[columnas].to_dict('records')
+    return salida
+
+@_errores
+async def quote_batch(request):
+    datos = await _leer_json(request)
+    familias = datos.get('familias') if isinstance(datos, dict) else None
+    if not isinstance(familias, list) or not 1 <= len(familias) <= MAX_FAMILIAS_LOTE:
+        raise ErrorSolicitud(f"'familias' debe ser una lista de 1 a {MAX_FAMILIAS_LOTE} cotizaciones")
+    perfiles = []
+    for i, f in enumerate(familias):
+        try: perfiles.append(_perfil(f))
+        except ErrorSolicitud as e: raise ErrorSolicitud(f"familias[{i}]: {e}")
+    foto = _foto()
+    return JSONResponse({'resultados': await run_in_threadpool(_cotizar_lote, foto, perfiles)})
+
+def _asignaciones(asignaciones):
+    return [{'precio_final': a.precio_final, 'precio_mensual': a.precio_final/12, 'puntaje_cobertura': a.puntaje,
+             'polizas': [{'ID': f"{p.aseguradora}-{p.plan}", 'Aseguradora': p.aseguradora, 'Plan': p.plan, 'Nivel_Cobertura': p.nivel_cobertura,
+                          'miembros': list(p.miembros), 'Precio_Lista': p.precio_lista, 'Precio_Final': p.precio_final} for p in a.polizas]}
+            for a in asignaciones]
+
+@_errores
+async def quote_optimize(request):
+    datos = await _leer_json(request)
+    familia, clinicas, continuidad, cobertura = _perfil(datos)
+    max_polizas = datos.get('max_polizas', MAX_POLIZAS)
+    # bool es subclase de int: "max_polizas": true no debe valer 1
+    if type(max_polizas) is not int or not 1 <= max_polizas <= MAX_POLIZAS:
+        raise ErrorSolicitud(f"'max_polizas' debe ser un entero de 1 a {MAX_POLIZAS}")
+    foto = _foto()
+    asignaciones = await run_in_threadpool(optimizar, foto.catalogo, foto.indice_clinicas, foto.indice_precios, familia, clinicas,
+                                           continuidad, cobertura, _descuentos(foto, continuidad), max_polizas)
+    return JSONResponse({'asignaciones': _asignaciones(asignaciones)})
+
+def _pdf_bytes(perfil, res, id_sel, razon, folio):
+    pdf = generar_pdf(perfil, res, id_sel, razon, folio)
+    if isinstance(pdf, str): raise ErrorPDF(f"{pdf} (folio {folio} sin emitir)")
+    return pdf.getvalue()
+
+def _content_disposition(nombre):
+    """Cabecera de descarga: filename ASCII para clientes antiguos y filename* (RFC 5987) con el nombre en UTF-8."""
+    ascii_ = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode('ascii')
+    return f"attachment; filename=\"{ascii_}\"; filename*=UTF-8''{quote_url(nombre)}"
+
+@_errores
+async def proposal_pdf(request):
+    datos = await _leer_json(request)
+    familia, clinicas, continuidad, cobertura = _perfil(datos)
+    cliente = str(datos.get('cliente') or '').strip()
+    if not cliente: raise ErrorSolicitud("Falta 'cliente'")
+    foto = _foto()
+    res = await run_in_threadpool(_cotizar, foto, familia, clinicas, continuidad, cobertura)
+    if res.empty: return JSONResponse({'error': f"Sin planes de cobertura '{cobertura}' para esas clínicas"}, status_code=404)
+
+    id_sel = datos.get('plan') or res['ID'].iloc[0]
+    if not isinstance(id_sel, str): raise ErrorSolicitud("'plan' debe ser el ID de un plan cotizado (texto)")
+    if id_sel not in set(res['ID']): raise ErrorSolicitud(f"El plan {id_sel} no está entre los cotizados")
+    razon = datos.get('razon') or motivo_recomendacion(clinicas, continuidad)
+    if not isinstance(razon, str): raise ErrorSolicitud("'razon' debe ser texto")
+    dependientes = ", ".join(f"Dep ({p['edad']}a)" for p in familia[1:]) or "Ninguno"
+    perfil = {'Titular': f"{cliente} ({familia[0]['edad']} años)", 'Dependientes': dependientes, 'Continuidad': continuidad, 'Cobertura': cobertura}
+
+    # El folio se reserva con todo validado (los textos van escapados en el PDF): un folio reservado no se recupera
+    folio = await run_in_threadpool(asignador.siguiente)
+    with tramo('pdf'):
+        pdf = await asyncio.get_running_loop().run_in_executor(_pool_pdf, _pdf_bytes, perfil, res, id_sel, razon, folio)
+    contar('pdf_generados')
+    plan = res.loc[res['ID'] == id_sel].iloc[0]
+    almacen_leads.registrar_propuesta({'Fecha': datetime.now(), 'Folio': folio, 'Aseguradora': plan['Aseguradora'], 'Plan': plan['Plan'],
+                                       'Cobertura': cobertura, 'Condicion': continuidad, 'Rol_Cotizador': 'API'})
+    nombre = nombre_archivo_pdf(cliente, clinicas, datetime.now())
+    return Response(pdf, media_type='application/pdf', headers={'Content-Disposition': _content_disposition(nombre), 'X-Folio': str(folio)})
+
+async def salud(request):
+    foto = almacen.actual()
+    return JSONResponse({'ok': foto is not None, 'cargado': foto.cargado.isoformat() if foto else None}, status_code=200 if foto else 503)
+
+async def metrics(request):
+    return Response(REGISTRO.prometheus(), media_type='text/plain; version=0.0.4')
+
+# --- APLICACIÓN ---
+@contextlib.asynccontextmanager
+async def ciclo_vida(app):
+    global _pool_pdf
+    _foto()
+    _pool_pdf = ProcessPoolExecutor(max_workers=int(os.environ.get('COTIZADOR_PROCESOS_PDF', os.cpu_count() or 1)))
+    try: yield
+    finally: _pool_pdf.shutdown(cancel_futures=True)
+
+app = Starlette(routes=[
+    Route('/quote', quote, methods=['POST']),
+    Route('/quote/batch', quote_batch, methods=['POST']),
+    Route('/quote/optimize', quote_optimize, methods=['POST']),
+    Route('/proposal.pdf', proposal_pdf, methods=['POST']),
+    Route('/health', salud),
+    Route('/metrics', metrics),
+], lifespan=ciclo_vida)
+
+def main(argv=None):
+    import uvicorn
+    parser = argparse.ArgumentParser(description="API HTTP del cotizador.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help="Procesos que atienden peticiones")
+    parser.add_argument('--procesos-pdf', type=int, default=None, help="Procesos para armar PDF (por worker)")
+    args = parser.parse_args(argv)
+    if args.procesos_pdf: os.environ['COTIZADOR_PROCESOS_PDF'] = str(args.procesos_pdf)
+    uvicorn.run('api:app', host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
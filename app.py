@@ -1,12 +1,22 @@
 import streamlit as st
 import pandas as pd
 import os
-from io import BytesIO
+import uuid
+from io import StringIO
 from datetime import datetime, timedelta
 import calendar
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+
+from motor import buscar, buscar_base, aplicar_descuentos, MESES, COBERTURAS, CONDICIONES
+from datos import AlmacenDatos, ARCHIVOS_DATOS
+from folios import AsignadorFolios
+from historial import AlmacenLeads
+from notificaciones import DespachadorNotificaciones, TransporteSMTP
+from cache_cotizaciones import CacheCotizaciones, clave_cotizacion
+from presentacion import ORDENES_TABLA, pagina_resultados, tabla_asesor
+from sesiones import AlmacenSesiones, compactar, expandir
+from optimizador import optimizar, tabla_asignaciones
+from tarifas import informe_anomalias
+import metricas
 
 # --- CONFIGURACIÓN ---
 st.set_page_config(page_title="Cotizador YQ Seguros", page_icon="🛡️", layout="wide")
@@ -30,11 +40,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 try:
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as ImageRL
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
+    from propuesta_pdf import generar_pdf, motivo_recomendacion, nombre_archivo_pdf
 except ImportError:
     st.error("❌ Falta la librería 'reportlab'. Ejecuta REPARAR.bat")
     st.stop()
@@ -43,14 +49,26 @@ except ImportError:
 CODIGO_ADMIN = "ADMIN2026"
 CODIGOS_ASESORES = ["ASE01", "ASE02", "ASE03", "VENTAS2026"] 
 
+# Filas por página de la tabla comparativa del asesor
+FILAS_TABLA = 25
+
+# Tope del descuento que el admin puede poner a mano (una campaña del archivo puede pasarlo: se muestra topada)
+DESCUENTO_MAXIMO_ADMIN = 50
+
 # --- FUNCIONES ---
 
+@st.cache_resource
+def obtener_almacen_leads():
+    almacen = AlmacenLeads('historial_leads.db')
+    # Migración única del CSV que se usaba antes
+    if os.path.exists('historial_leads.csv'):
+        almacen.importar_csv('historial_leads.csv', solo_si_vacio=True)
+    return almacen
+
 def guardar_historial(cliente, correo, celular, edad, salud, cobertura, continuidad, clinicas, n_familia, usuario_rol):
-    """Guarda cada cotización en un archivo CSV local."""
-    archivo_historial = 'historial_leads.csv'
-    
+    """Encola cada cotización; un hilo la escribe por lotes en historial_leads.db."""
     nuevo_registro = {
-        'Fecha': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+        'Fecha': datetime.now(),
         'Cliente': cliente,
         'Correo': correo,
         'Celular': celular,
@@ -63,22 +81,34 @@ def guardar_historial(cliente, correo, celular, edad, salud, cobertura, continui
         'Rol_Cotizador': usuario_rol
     }
     
-    df_new = pd.DataFrame([nuevo_registro])
-    
-    if not os.path.exists(archivo_historial):
-        df_new.to_csv(archivo_historial, index=False, encoding='utf-8-sig')
-    else:
-        df_new.to_csv(archivo_historial, mode='a', header=False, index=False, encoding='utf-8-sig')
+    obtener_almacen_leads().registrar(nuevo_registro)
+
+def guardar_propuesta(folio, plan, cobertura, continuidad, usuario_rol):
+    """Encola el plan recomendado de cada PDF emitido (para la analítica de planes recomendados)."""
+    obtener_almacen_leads().registrar_propuesta({
+        'Fecha': datetime.now(),
+        'Folio': folio,
+        'Aseguradora': plan['Aseguradora'],
+        'Plan': plan['Plan'],
+        'Cobertura': cobertura,
+        'Condicion': continuidad,
+        'Rol_Cotizador': usuario_rol
+    })
+
+# --- CONFIGURACIÓN ZOHO ---
+SMTP_SERVER = "smtppro.zoho.com"
+SMTP_PORT = 587
+SENDER_EMAIL = "administracion@yqcorredores.com"
+RECEIVER_EMAIL = "administracion@yqcorredores.com"
+
+@st.cache_resource
+def obtener_despachador_correos():
+    transporte = TransporteSMTP(SMTP_SERVER, SMTP_PORT, SENDER_EMAIL, st.secrets["EMAIL_PASSWORD"])
+    return DespachadorNotificaciones(transporte, SENDER_EMAIL, RECEIVER_EMAIL, carpeta_spool='spool_correos')
 
 def enviar_notificacion(cliente, correo, celular, plan_interes, n_familia, edad, clinicas, continuidad):
-    """Envía un correo detallado a administración con los datos de cotización."""
-    # --- CONFIGURACIÓN ZOHO ---
-    SMTP_SERVER = "smtppro.zoho.com"
-    SMTP_PORT = 587
-    SENDER_EMAIL = "administracion@yqcorredores.com"
+    """Deja en cola un correo detallado a administración con los datos de cotización (se envía en segundo plano)."""
     SENDER_PASSWORD = st.secrets["EMAIL_PASSWORD"] 
-    RECEIVER_EMAIL = "administracion@yqcorredores.com"
-    # -----------------------------------------------------
 
     # Formatear lista de clínicas
     clinicas_txt = ", ".join(clinicas) if clinicas else "Sin preferencia específica"
@@ -114,333 +144,68 @@ def enviar_notificacion(cliente, correo, celular, plan_interes, n_familia, edad,
             print("⚠️ [AVISO] Correo no enviado (Falta contraseña).")
             return True
 
-        msg = MIMEMultipart()
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = RECEIVER_EMAIL
-        msg['Subject'] = asunto
-        msg.attach(MIMEText(cuerpo, 'plain'))
-
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.sendmail(SENDER_EMAIL, RECEIVER_EMAIL, msg.as_string())
-        server.quit()
+        obtener_despachador_correos().encolar(asunto, cuerpo)
         return True
     except Exception as e:
-        print(f"Error enviando correo: {e}")
+        print(f"Error encolando correo: {e}")
         return False
 
 def normalizar_clinica(nombre):
     if pd.isna(nombre): return ""
     return str(nombre).strip().title()
 
-def obtener_nuevo_folio():
-    try:
-        with open('folio.txt', 'r') as f: return int(f.read().strip()) + 1
-    except: return 1000
+@st.cache_resource
+def obtener_asignador_folios():
+    # Bloques de 10: los folios no usados de un bloque se pierden al reiniciar, pero nunca se repiten
+    return AsignadorFolios('folios.db', 'folio.txt', bloque=10)
 
 def incrementar_folio():
-    fol = obtener_nuevo_folio()
-    try:
-        with open('folio.txt', 'w') as f: f.write(str(fol))
-    except: pass
-    return fol
+    return obtener_asignador_folios().siguiente()
 
 def get_mes_actual():
-    meses = {1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
-             7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"}
-    return meses[datetime.now().month]
+    return MESES[datetime.now().month]
 
 # --- CARGA DE DATOS ---
-@st.cache_data
-def cargar_datos_base():
-    if not os.path.exists('precios_2026.csv') or not os.path.exists('base_clinicas.xlsx'):
-        return None
-
-    try:
-        try: df_precios = pd.read_csv('precios_2026.csv', sep=',')
-        except: df_precios = pd.read_csv('precios_2026.csv', sep=';')
-
-        df_precios = df_precios.loc[:, ~df_precios.columns.str.contains('^Unnamed')]
-        df_precios['Aseguradora'] = df_precios['Aseguradora'].astype(str).str.strip()
-        df_precios['Plan'] = df_precios['Plan'].astype(str).str.strip()
-
-        if os.path.exists('info_adicional.csv'):
-            try: df_int = pd.read_csv('info_adicional.csv')
-            except: df_int = pd.read_csv('info_adicional.csv', sep=';')
-            
-            df_int['Aseguradora'] = df_int['Aseguradora'].astype(str).str.strip()
-            df_int['Plan'] = df_int['Plan'].astype(str).str.strip()
-            cols_drop = [c for c in df_int.columns if c in df_precios.columns and c not in ['Aseguradora','Plan']]
-            df_precios = df_precios.drop(columns=cols_drop, errors='ignore')
-            df_precios = pd.merge(df_precios, df_int, on=['Aseguradora','Plan'], how='left')
-        
-        cols_seguras = ['Cob_Int_Amb', 'Cob_Int_Hosp', 'Link_Carencia', 'Link_Cartilla', 'Int_Ded_Amb_Pre', 'Int_Reem_Amb_Sin', 'Int_Ded_Hosp_Pre', 'Int_Reem_Hosp_Sin', 'Tiene_Int']
-        for col in cols_seguras:
-            if col not in df_precios.columns: df_precios[col] = "-"
-            df_precios[col] = df_precios[col].fillna("-")
-
-        xls = pd.ExcelFile('base_clinicas.xlsx', engine='openpyxl')
-        df_redes = pd.read_excel(xls, sheet_name='REDES')
-        df_redes['Clinicas_Busqueda'] = df_redes['Clinicas_Incluidas'].fillna('').astype(str)
-        df_redes['Aseguradora'] = df_redes['Aseguradora'].astype(str).str.strip()
-        df_redes['Plan'] = df_redes['Plan'].astype(str).str.strip()
-        
-        todas = []
-        for l in df_redes['Clinicas_Incluidas'].dropna():
-            todas.extend([c.strip() for c in l.split(',')])
-        clinicas_unicas = sorted(list(set(todas)))
-
-        return df_precios, df_redes, clinicas_unicas, df_precios
-    except Exception as e:
-        st.error(f"Error cargando datos base: {e}")
-        return None
-
-def cargar_campanas():
-    dict_campanas = {}
-    if os.path.exists('campana_descuentos.csv'):
-        try:
-            try: df_camp = pd.read_csv('campana_descuentos.csv', sep=',')
-            except: df_camp = pd.read_csv('campana_descuentos.csv', sep=';')
-            for _, row in df_camp.iterrows():
-                key = (str(row['Aseguradora']).strip(), str(row['Plan']).strip(), str(row['Tipo_Cliente']).strip(), str(row['Mes']).strip())
-                try: dict_campanas[key] = int(row['Porcentaje_Descuento'])
-                except: dict_campanas[key] = 0
-        except: pass
-    return dict_campanas
-
-# --- BÚSQUEDA ---
-def calcular_precio(df, cia, plan, familia):
-    total = 0
-    for p in familia:
-        edad = min(p['edad'], 81)
-        row = df[(df['Aseguradora']==cia) & (df['Plan']==plan) & (df['Edad']==edad)]
-        if row.empty: return None
-        col_p = 'Precio_Sano' if p['salud']=='Sano' else 'Precio_Cronico'
-        try: precio = float(row.iloc[0][col_p])
-        except: precio = 0.0
-        if precio <= 0: return None
-        total += precio
-    return total
-
-def buscar(df_precios, df_redes, familia, clinicas_user, continuidad, cobertura, descuentos):
-    candidatos = []
-    set_user = set(clinicas_user)
-    
-    PLANES_BASICA = ['Esencial', 'Esencial Plus', 'Multisalud Base', 'Medisalud Lite', 'Medisalud Base']
-    PLANES_INTEGRAL = ['Red Preferente', 'Red Médica', 'Multisalud', 'Medisalud', 'Medisalud Plus', 'Viva Salud', 'Trébol Salud', 'Medisalud Senior +', 'Oro - Plan preferente', 'Oro - Plan Red', 'Oro - Plan Completo']
-    PLANES_REEMBOLSO = ['Full Salud', 'Medicvida Nacional', 'Medisalud Premium']
-    PLANES_INTERNACIONAL = ['Salud Preferencial', 'Medicvida Internacional']
-
-    es_continuidad = (continuidad == "Vengo con continuidad")
-
-    for (cia, plan), grupo in df_redes.groupby(['Aseguradora', 'Plan']):
-        if es_continuidad and "mapfre" in str(cia).lower(): continue
-
-        plan_check = str(plan).strip()
-        if cobertura == "Básica" and plan_check not in PLANES_BASICA: continue
-        elif cobertura == "Integral":
-            if plan_check not in PLANES_INTEGRAL: continue
-            if plan_check in ['Viva Salud', 'Trébol Salud'] and es_continuidad: continue
-        elif cobertura == "Integral + Reembolso" and plan_check not in PLANES_REEMBOLSO: continue
-        elif cobertura == "Integral + Cobertura Internacional" and plan_check not in PLANES_INTERNACIONAL: continue
-
-        clinicas_plan = set()
-        for _, row in grupo.iterrows():
-            clinicas_plan.update([c.strip() for c in str(row['Clinicas_Busqueda']).split(',')])
-        
-        if clinicas_user and not set_user.issubset(clinicas_plan): continue
-
-        list_clin_red = []
-        list_cob_amb = []
-        list_cob_hosp = []
-        
-        if not clinicas_user:
-            row = grupo.iloc[0]
-            list_clin_red.append(f"• <b>Red:</b> {row['Nombre_Red']}")
-            list_cob_amb.append(f"• <b>Amb:</b> {row['Cobertura_Amb']}")
-            list_cob_hosp.append(f"• <b>Hosp:</b> {row['Cobertura_Hosp']}")
-        else:
-            for cli in clinicas_user:
-                for _, row in grupo.iterrows():
-                    if cli in [c.strip() for c in str(row['Clinicas_Busqueda']).split(',')]:
-                        list_clin_red.append(f"• <b>{cli}</b>: {row['Nombre_Red']}")
-                        list_cob_amb.append(f"• <b>{cli}</b>: {row['Cobertura_Amb']}")
-                        list_cob_hosp.append(f"• <b>{cli}</b>: {row['Cobertura_Hosp']}")
-                        break
-        
-        match = df_precios[(df_precios['Aseguradora']==cia) & (df_precios['Plan']==plan)]
-        if match.empty: continue
-        data = match.iloc[0]
-        
-        base = calcular_precio(df_precios, cia, plan, familia)
-        if base is None: continue
-        
-        dsc = descuentos.get((cia, plan), 0)
-        final = base * (1 - dsc/100)
-        ahorro = base - final
-
-        amb_pre = str(data.get('Int_Ded_Amb_Pre', '-'))
-        amb_sin = str(data.get('Int_Reem_Amb_Sin', '-'))
-        hosp_pre = str(data.get('Int_Ded_Hosp_Pre', '-'))
-        hosp_sin = str(data.get('Int_Reem_Hosp_Sin', '-'))
-        txt_int_amb = f"<b>Ded:</b> {amb_pre}<br/><b>Reemb:</b> {amb_sin}"
-        txt_int_hosp = f"<b>Ded:</b> {hosp_pre}<br/><b>Reemb:</b> {hosp_sin}"
-
-        candidatos.append({
-            'Aseguradora': cia, 'Plan': plan,
-            'Txt_Clin_Red': "<br/>".join(list_clin_red),
-            'Txt_Cob_Amb': "<br/>".join(list_cob_amb),
-            'Txt_Cob_Hosp': "<br/>".join(list_cob_hosp),
-            'Int_Amb_Full': txt_int_amb,
-            'Int_Hosp_Full': txt_int_hosp,
-            'Precio_Final': final,
-            'Precio_Lista': base,
-            'Ahorro_Soles': ahorro,
-            'Pct_Dscto': dsc,
-            'Precio_Mensual': final/12,
-            'Link_Cartilla': data.get('Link_Cartilla', ''),
-            'Link_Carencia': data.get('Link_Carencia', ''),
-            'ID': f"{cia}-{plan}"
-        })
-
-    if not candidatos: return pd.DataFrame()
-    return pd.DataFrame(candidatos).sort_values('Precio_Final')
-
-# --- PDF ---
-def generar_pdf(perfil, df, id_sel, razon, folio):
-    try:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=15, leftMargin=15, topMargin=20, bottomMargin=20)
-        estilos = getSampleStyleSheet()
-        
-        AZUL = colors.HexColor("#2456A6"); DORADO_FONDO = colors.HexColor("#FFF2CC"); DORADO_BORDE = colors.HexColor("#D6B656")
-        VERDE = colors.HexColor("#28A745"); ROJO = colors.HexColor("#D32F2F"); GRIS = colors.HexColor("#6E7A8A"); AZUL_CLARO = colors.HexColor("#E6F3FF")
-        
-        st_tit = ParagraphStyle('T', parent=estilos['Heading1'], fontName='Helvetica-Bold', fontSize=14, textColor=AZUL, leading=16)
-        st_sub = ParagraphStyle('S', parent=estilos['Normal'], fontName='Helvetica-Bold', fontSize=11, textColor=AZUL)
-        st_norm = ParagraphStyle('N', parent=estilos['Normal'], fontSize=9, textColor=GRIS, leading=11)
-        st_bold = ParagraphStyle('B', parent=st_norm, fontName='Helvetica-Bold', textColor=AZUL)
-        st_analysis = ParagraphStyle('Analysis', parent=st_norm, leading=14, fontSize=9)
-        st_th = ParagraphStyle('TH', parent=estilos['Normal'], fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, alignment=1)
-        st_td = ParagraphStyle('TD', parent=estilos['Normal'], fontSize=7.5, textColor=colors.black, leading=9)
-        st_td_b = ParagraphStyle('TDB', parent=st_td, fontName='Helvetica-Bold', textColor=AZUL)
-
-        elements = []
-        img = ImageRL("logo.png", width=4.5*cm, height=1.6*cm, kind='proportional') if os.path.exists("logo.png") else Paragraph("", st_norm)
-        txt_header = """<b>YQ CORREDORES DE SEGUROS</b><br/>Propuesta de seguro de salud"""
-        p_header = Paragraph(txt_header, st_tit)
-        txt_folio = f"<b>Folio:</b> {folio}<br/><b>Fecha:</b> {datetime.now().strftime('%d/%m/%Y')}"
-        p_folio = Paragraph(txt_folio, ParagraphStyle('F', parent=st_norm, alignment=2))
-        t_head = Table([[img, p_header, p_folio]], colWidths=[5*cm, 9*cm, 4*cm])
-        t_head.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'MIDDLE')]))
-        elements.append(t_head)
-        elements.append(Spacer(1, 15))
-
-        elements.append(Paragraph("En YQ Corredores de Seguros, entendemos la importancia de proteger tu salud. Te presentamos esta cotización personalizada con precios de campaña exclusivos.", st_norm))
-        elements.append(Spacer(1, 10))
-
-        elements.append(Paragraph("TU PERFIL", st_sub))
-        elements.append(Spacer(1, 5))
-        data_perfil = [
-            [Paragraph("<b>Titular:</b>", st_bold), Paragraph(perfil['Titular'], st_norm),
-             Paragraph("<b>Cobertura:</b>", st_bold), Paragraph(perfil['Cobertura'], st_norm)],
-            [Paragraph("<b>Dependientes:</b>", st_bold), Paragraph(perfil['Dependientes'], st_norm),
-             Paragraph("<b>Condición:</b>", st_bold), Paragraph(perfil['Continuidad'], st_norm)]
-        ]
-        t_perf = Table(data_perfil, colWidths=[2.5*cm, 6.5*cm, 2.5*cm, 6.5*cm])
-        t_perf.setStyle(TableStyle([('LINEBELOW', (0,0), (-1,-1), 0.5, colors.lightgrey), ('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('PADDING', (0,0), (-1,-1), 5)]))
-        elements.append(t_perf)
-        elements.append(Spacer(1, 20))
-
-        es_int = "Internacional" in perfil['Cobertura']
-        if es_int:
-            headers = ['Plan', 'Clínicas / Redes', 'Int. Amb', 'Int. Hosp', 'Mensual', 'Anual']
-            anchos = [3.0*cm, 4.2*cm, 3.7*cm, 3.5*cm, 1.4*cm, 2.2*cm]
-        else:
-            headers = ['Plan', 'Clínicas / Redes', 'Cob. Ambulatoria', 'Cob. Hospitalaria', 'Mensual', 'Anual']
-            anchos = [3.0*cm, 4.2*cm, 4.2*cm, 3.0*cm, 1.4*cm, 2.2*cm]
+@st.cache_resource
+def obtener_almacen_datos():
+    return AlmacenDatos(ARCHIVOS_DATOS)
 
-        data = [[Paragraph(h, st_th) for h in headers]]
-        
-        for _, row in df.iterrows():
-            rec = (row['ID'] == id_sel)
-            txt_p = f"<b>{row['Aseguradora']}</b><br/>{row['Plan']}"
-            if rec: txt_p = "⭐ RECOMENDADO ⭐<br/>" + txt_p
-            
-            links = []
-            if row['Link_Cartilla'] and str(row['Link_Cartilla']).startswith('http'):
-                links.append(f"<a href='{row['Link_Cartilla']}' color='blue'><u>Cartilla</u></a>")
-            if perfil['Continuidad'] == "Nuevo" and row['Link_Carencia'] and str(row['Link_Carencia']).startswith('http'):
-                links.append(f"<a href='{row['Link_Carencia']}' color='red'><u>Carencias</u></a>")
-            
-            if links: txt_p += "<br/>" + " | ".join(links)
-
-            precio_anual = f"S/ {row['Precio_Final']:,.2f}"
-            if row['Pct_Dscto'] > 0:
-                precio_anual = f"<strike color='grey'>S/ {row['Precio_Lista']:,.0f}</strike><br/><b>{precio_anual}</b><br/><font color='red' size='7'>Ahorras S/ {row['Ahorro_Soles']:,.0f}</font>"
-            precio_mensual = f"S/ {row['Precio_Mensual']:,.0f}"
-
-            if es_int:
-                fila = [Paragraph(txt_p, st_td), Paragraph(row['Txt_Clin_Red'], st_td), Paragraph(row['Int_Amb_Full'], st_td), Paragraph(row['Int_Hosp_Full'], st_td), Paragraph(precio_mensual, st_td_b), Paragraph(precio_anual, st_td_b)]
-            else:
-                fila = [Paragraph(txt_p, st_td), Paragraph(row['Txt_Clin_Red'], st_td), Paragraph(row['Txt_Cob_Amb'], st_td), Paragraph(row['Txt_Cob_Hosp'], st_td), Paragraph(precio_mensual, st_td_b), Paragraph(precio_anual, st_td_b)]
-            data.append(fila)
-
-        t = Table(data, colWidths=anchos, repeatRows=1)
-        estilos_t = [('BACKGROUND', (0,0), (-1,0), AZUL), ('GRID', (0,0), (-1,-1), 0.5, colors.grey), ('VALIGN', (0,0), (-1,-1), 'TOP'), ('PADDING', (0,0), (-1,-1), 4)]
-        for i, row in enumerate(df.iterrows()):
-            if row[1]['ID'] == id_sel:
-                estilos_t.append(('BACKGROUND', (0, i+1), (-1, i+1), DORADO_FONDO))
-                estilos_t.append(('BOX', (0, i+1), (-1, i+1), 1.5, DORADO_BORDE))
-        t.setStyle(TableStyle(estilos_t))
-        elements.append(t)
-        
-        elements.append(Spacer(1, 10))
-        if perfil['Continuidad'] == "Nuevo":
-            aviso = "<b>IMPORTANTE:</b> Al ser un seguro nuevo, aplican periodos de carencia (30 días) y espera. Por favor revise el enlace de carencias en la tabla superior."
-            t_warn = Table([[Paragraph(aviso, ParagraphStyle('W', parent=st_norm, textColor=AZUL))]], colWidths=[18*cm])
-            t_warn.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), AZUL_CLARO), ('BOX', (0,0), (-1,-1), 0.5, AZUL), ('PADDING', (0,0), (-1,-1), 8)]))
-            elements.append(t_warn)
-        elif perfil['Continuidad'] == "Vengo con continuidad":
-            aviso_cont = "<b>BENEFICIO DE CONTINUIDAD:</b> Para gozar del beneficio de continuidad debe haber estado asegurado dentro de los últimos 90 días con una póliza de salud EPS o Individual."
-            t_cont = Table([[Paragraph(aviso_cont, ParagraphStyle('W', parent=st_norm, textColor=VERDE))]], colWidths=[18*cm])
-            t_cont.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), colors.HexColor("#E8F5E9")), ('BOX', (0,0), (-1,-1), 0.5, VERDE), ('PADDING', (0,0), (-1,-1), 8)]))
-            elements.append(t_cont)
-
-        elements.append(Spacer(1, 20))
-        if razon:
-            elements.append(Paragraph(f"¿POR QUÉ RECOMENDAMOS EL PLAN {str(df[df['ID']==id_sel]['Plan'].values[0]).upper()}?", st_sub))
-            elements.append(Spacer(1, 15)) 
-            t_box = Table([[Paragraph(f"<b>ANÁLISIS DEL EXPERTO:</b><br/><br/>{razon}", st_analysis)]], colWidths=[18*cm])
-            t_box.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), DORADO_FONDO), ('BOX', (0,0), (-1,-1), 1, DORADO_BORDE), ('PADDING', (0,0), (-1,-1), 12)]))
-            elements.append(t_box)
-            elements.append(Spacer(1, 25))
-
-        elements.append(Paragraph("¿Listo para estar protegido?", st_sub))
-        elements.append(Spacer(1, 5))
-        st_btn = ParagraphStyle('Btn', parent=st_norm, textColor=colors.white, alignment=1, fontName='Helvetica-Bold', fontSize=10)
-        t_btns = Table([[Paragraph('<a href="https://wa.link/czc7jg">¡QUIERO MI ASESORÍA GRATUITA!</a>', st_btn), "", Paragraph('<a href="https://wa.link/zwdc6r">¡QUIERO CONTRATAR AHORA!</a>', st_btn)]], colWidths=[7*cm, 1*cm, 7*cm], rowHeights=[1.2*cm])
-        t_btns.setStyle(TableStyle([('BACKGROUND', (0,0), (0,0), AZUL), ('BACKGROUND', (2,0), (2,0), VERDE), ('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('ROUNDED', (0,0), (-1,-1), 8)]))
-        elements.append(t_btns)
-        elements.append(Spacer(1, 30))
-        elements.append(Paragraph("Nota: Precios referenciales sujetos a evaluación médica. Incluyen IGV. Esta cotización tiene una validez máxima de 7 días y/o hasta finalizar campaña vigente (lo que ocurra primero).", ParagraphStyle('D', parent=st_norm, fontSize=7)))
-
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
-    except Exception as e:
-        return f"ERROR PDF: {str(e)}"
+def cargar_datos_base():
+    almacen = obtener_almacen_datos()
+    foto = almacen.actual()
+    if foto is None and almacen.error is not None:
+        st.error(f"Error cargando datos base: {almacen.error}")
+    return foto
+
+@st.cache_resource
+def obtener_cache_cotizaciones():
+    return CacheCotizaciones(max_items=512)
+
+# --- SESIÓN ---
+# La última cotización de cada sesión vive compacta en sesiones.db, no como DataFrame en st.session_state.
+# El id de sesión y los datos del titular quedan solo en st.session_state (nunca en la URL): quien reciba un
+# enlace no puede abrir la cotización de otro.
+@st.cache_resource
+def obtener_almacen_sesiones():
+    return AlmacenSesiones('sesiones.db')
+
+def id_sesion():
+    """Id aleatorio de la sesión del navegador (st.session_state)."""
+    # Enlaces de antes traían el id en la URL (?s=...): se quita y no se usa
+    if 's' in st.query_params: del st.query_params['s']
+    if 'id_sesion' not in st.session_state: st.session_state['id_sesion'] = uuid.uuid4().hex
+    return st.session_state['id_sesion']
 
 # --- INTERFAZ ---
 base_data = cargar_datos_base()
 if base_data is None:
     st.error("Ejecuta 'actualizar_db.py'")
 else:
-    df_precios, df_redes, clinicas_unicas, df_full = base_data
-    campanas_activas = cargar_campanas() 
-    
-    if 'resultados' not in st.session_state: st.session_state['resultados'] = None
+    clinicas_unicas = base_data.clinicas_unicas
+    indice_precios, indice_clinicas, catalogo = base_data.indice_precios, base_data.indice_clinicas, base_data.catalogo
+    campanas_activas = base_data.campanas
+    almacen_sesiones = obtener_almacen_sesiones()
+    sesion = id_sesion()
     
     with st.sidebar:
         # --- LOGO ---
@@ -466,8 +231,8 @@ else:
         txt_dependientes = ", ".join(txt_fam) if txt_fam else "Ninguno"
 
         st.header("Filtros")
-        cont = st.selectbox("Tipo de asegurado", ["Nuevo", "Vengo con continuidad"])
-        cob = st.selectbox("Cobertura", ["Básica", "Integral", "Integral + Reembolso", "Integral + Cobertura Internacional"])
+        cont = st.selectbox("Tipo de asegurado", CONDICIONES)
+        cob = st.selectbox("Cobertura", COBERTURAS)
         clinicas = st.multiselect("Clínicas de preferencia", clinicas_unicas, placeholder="Puedes elegir más de una")
         
         # --- DESCUENTO (REQ 1) ---
@@ -490,20 +255,27 @@ else:
         mes_actual = get_mes_actual()
         tipo_cliente_key = "Nuevo" if cont == "Nuevo" else "Continuidad"
         
-        descuentos = {}
+        # Vector de descuentos vigente hoy (campañas ya compiladas en la foto de datos)
+        descuentos = campanas_activas.vector(tipo_cliente_key)
         if es_admin:
+            descuentos = {}
             with st.expander(f"Campañas {mes_actual} (Modo Admin)"):
-                for c in df_full['Aseguradora'].unique():
-                    for p in df_full[df_full['Aseguradora']==c]['Plan'].unique():
-                        key = (str(c).strip(), str(p).strip(), tipo_cliente_key, mes_actual)
-                        val_default = campanas_activas.get(key, 0)
-                        widget_key = f"dsct_{c}_{p}_{tipo_cliente_key}"
-                        descuentos[(c,p)] = st.number_input(f"{c} - {p} %", 0, 50, val_default, key=widget_key)
-        else:
-            for c in df_full['Aseguradora'].unique():
-                for p in df_full[df_full['Aseguradora']==c]['Plan'].unique():
-                    key = (str(c).strip(), str(p).strip(), tipo_cliente_key, mes_actual)
-                    descuentos[(c,p)] = campanas_activas.get(key, 0)
+                for (c, p), val_default in campanas_activas.descuentos(tipo_cliente_key).items():
+                    widget_key = f"dsct_{c}_{p}_{tipo_cliente_key}"
+                    descuentos[(c,p)] = st.number_input(f"{c} - {p} %", 0, DESCUENTO_MAXIMO_ADMIN, min(val_default, DESCUENTO_MAXIMO_ADMIN), key=widget_key)
+
+        cache_cotizaciones = obtener_cache_cotizaciones()
+        if es_admin:
+            with st.expander("Caché de cotizaciones (Modo Admin)"):
+                stats = cache_cotizaciones.estadisticas()
+                st.write(f"Aciertos: {stats['Aciertos']} | Fallos: {stats['Fallos']} | Tasa: {stats['Tasa_Aciertos']:.0%}")
+                st.write(f"En caché: {stats['En_Cache']}/{stats['Capacidad']} | Descartes: {stats['Descartes']} | Invalidaciones: {stats['Invalidaciones']}")
+
+            # Anomalías que encontró la validación de tarifas al cargar (la carga sigue igual)
+            avisos_tarifa = informe_anomalias(base_data.anomalias_tarifa)
+            if avisos_tarifa:
+                with st.expander(f"Avisos de tarifa: {len(avisos_tarifa)} (Modo Admin)"):
+                    for aviso in avisos_tarifa: st.caption(aviso)
 
         requiere_clinica = (cob != "Integral + Cobertura Internacional") and es_cliente
 
@@ -519,33 +291,52 @@ else:
                     # Guardamos el historial
                     guardar_historial(nom, correo, celular, edad, salud, cob, cont, clinicas, len(familia)-1, "Cliente")
                 
-                st.session_state['resultados'] = buscar(df_full, df_redes, familia, clinicas, cont, cob, descuentos)
-                st.session_state['perfil'] = {'Titular': f"{nom} ({edad} años)", 'Dependientes': txt_dependientes, 'Continuidad': cont, 'Cobertura': cob}
-                st.session_state['nombre_cliente'] = nom
-                st.session_state['clinicas_sel'] = clinicas
-
-    if st.session_state['resultados'] is not None:
-        res = st.session_state['resultados']
+                # La caché guarda la etapa sin descuentos; clínicas en orden fijo porque la clave no distingue el orden de selección
+                clave = clave_cotizacion(familia, clinicas, cont, cob, {})
+                with metricas.tramo('cotizacion'):
+                    base_res = cache_cotizaciones.obtener(clave, lambda: buscar_base(catalogo, indice_clinicas, indice_precios, familia, sorted(clinicas), cont, cob), firma=base_data.firma)
+                    perfil = {'Dependientes': txt_dependientes, 'Continuidad': cont, 'Cobertura': cob}
+                    st.session_state['titular'] = (nom, edad)
+                    almacen_sesiones.guardar(sesion, compactar(base_data, base_res, aplicar_descuentos(base_res, descuentos), clinicas,
+                                                               cont, cob, tipo_cliente_key, perfil))
+
+    # Última cotización de la sesión, rehecha sobre la foto de datos compartida
+    cotizacion = almacen_sesiones.obtener(sesion)
+    base_res = res = None
+    if cotizacion is not None:
+        expandida = expandir(cotizacion, base_data)
+        if expandida is None: st.info("ℹ️ Los precios se actualizaron desde tu última cotización. Vuelve a cotizar.")
+        else: base_res, res = expandida
+
+    # Admin: los cambios de descuento se aplican al momento sobre la última cotización, sin volver a buscar
+    if es_admin and base_res is not None and cotizacion.tipo_cliente == tipo_cliente_key:
+        res = aplicar_descuentos(base_res, descuentos)
+
+    if res is not None:
         if res.empty:
             st.error(f"⚠️ No se encontraron planes de cobertura '{cob}' para las clínicas que has elegido. Por favor, intenta seleccionando un nivel de cobertura superior (Ej. Integral o Integral + Reembolso).")
         else:
             st.success(f"¡Hemos encontrado {len(res)} opciones compatibles con tus clínicas!")
             
             if not es_cliente:
-                cols = ['Aseguradora','Plan']
-                if cob == "Integral + Cobertura Internacional":
-                    cols += ['Int_Amb_Full', 'Int_Hosp_Full']
-                    df_view = res.copy()
-                    for c in ['Int_Amb_Full', 'Int_Hosp_Full']:
-                        df_view[c] = df_view[c].str.replace('<b>','').str.replace('</b>','').str.replace('<br/>','\n')
-                else:
-                    cols += ['Txt_Cob_Amb', 'Txt_Cob_Hosp']
-                    df_view = res.copy()
-                    for c in ['Txt_Cob_Amb', 'Txt_Cob_Hosp']:
-                        df_view[c] = df_view[c].str.replace('<b>','').str.replace('</b>','').str.replace('• ','').str.replace('<br/>','\n')
-                
                 st.subheader("Tabla Comparativa (Vista Asesor/Admin)")
-                st.dataframe(df_view[cols + ['Precio_Lista', 'Pct_Dscto', 'Precio_Final']], hide_index=True)
+                # Orden y página sobre los resultados; el texto de coberturas se arma solo para las filas visibles
+                col_t1, col_t2, col_t3 = st.columns(3)
+                orden = col_t1.selectbox("Ordenar por", list(ORDENES_TABLA), key="tabla_orden")
+                descendente = col_t2.toggle("Descendente", key="tabla_desc")
+                n_paginas = max(1, -(-len(res) // FILAS_TABLA))
+                pagina = col_t3.number_input(f"Página (de {n_paginas})", 1, n_paginas, 1, key="tabla_pag")
+                filas = pagina_resultados(res, ORDENES_TABLA[orden], descendente, pagina, FILAS_TABLA)
+                st.dataframe(tabla_asesor(filas, cob == "Integral + Cobertura Internacional"), hide_index=True)
+
+                # Familias: repartir a los miembros entre planes (frente de Pareto costo / cobertura)
+                if len(familia) > 1 and st.toggle("Combinar planes entre miembros", key="opt_activo"):
+                    asignaciones = optimizar(catalogo, indice_clinicas, indice_precios, familia, sorted(clinicas), cont, cob, descuentos)
+                    st.caption("Con los datos actuales del formulario. Puntaje: niveles de cobertura sobre el pedido, sumados por miembro.")
+                    if asignaciones:
+                        ahorro = res['Precio_Final'].min() - asignaciones[0].precio_final
+                        if ahorro > 0.005: st.write(f"La combinación más barata ahorra S/ {ahorro:,.2f} al año frente al mejor plan único.")
+                        st.dataframe(tabla_asignaciones(asignaciones, familia), hide_index=True)
             else:
                 st.info("👇 Descarga el PDF para ver el comparativo detallado de precios y coberturas.")
 
@@ -554,31 +345,116 @@ else:
 
             st.divider()
             
-            op = {f"{r['Aseguradora']} {r['Plan']}": r['ID'] for _,r in res.iterrows()}
+            op = dict(zip(res['Aseguradora'] + " " + res['Plan'], res['ID']))
             op_keys = list(op.keys())
             
-            clin_txt = ", ".join(st.session_state.get('clinicas_sel', []))
-            if not clin_txt: clin_txt = "su red de afiliados"
-            
-            txt_motivo = f"Este plan es el que tiene mejor precio considerando las clínicas que prefiere ({clin_txt}) y sus beneficios."
-            if cont == "Nuevo": txt_motivo += " Recuerde revisar los periodos de carencia."
+            txt_motivo = motivo_recomendacion(cotizacion.clinicas, cont)
 
             if es_cliente:
                 sel = op_keys[0] 
                 razon = txt_motivo 
             else:
-                sel = st.radio("Recomendar", op_keys) 
+                # Con muchos planes (búsquedas amplias) una lista desplegable en vez de botones
+                sel = st.radio("Recomendar", op_keys) if len(op_keys) <= FILAS_TABLA else st.selectbox("Recomendar", op_keys)
                 razon = st.text_area("Motivo (Análisis del Experto):", value=txt_motivo)
             
             if st.button("Generar PDF"):
-                pdf_res = generar_pdf(st.session_state['perfil'], res, op[sel], razon, incrementar_folio())
+                try: folio = incrementar_folio()
+                except Exception as e:
+                    st.error(f"❌ No se pudo asignar el folio: {e}")
+                    st.stop()
+                nombre_titular, edad_titular = st.session_state.get('titular', (nom, edad))
+                perfil = dict(cotizacion.perfil, Titular=f"{nombre_titular} ({edad_titular} años)")
+                pdf_res = generar_pdf(perfil, res, op[sel], razon, folio)
                 if isinstance(pdf_res, str): st.error(pdf_res)
                 else:
-                    nom_clean = st.session_state.get('nombre_cliente', 'Cliente').strip().split()[0]
-                    cls_list = [c.strip().split()[0] for c in st.session_state.get('clinicas_sel', [])]
-                    cls_clean = "_".join(cls_list)
-                    fecha_str = datetime.now().strftime("%d%m%y_%H%M")
-                    file_name = f"COTISALUD_{nom_clean}_{cls_clean}_{fecha_str}.pdf"
+                    guardar_propuesta(folio, res.loc[res['ID'] == op[sel]].iloc[0], cotizacion.perfil['Cobertura'], cotizacion.perfil['Continuidad'],
+                                      "Admin" if es_admin else "Asesor" if es_asesor else "Cliente")
+                    file_name = nombre_archivo_pdf(nombre_titular, cotizacion.clinicas, datetime.now())
 
                     st.download_button("Descargar PDF", pdf_res, file_name, "application/pdf")
 
+    # --- HISTORIAL DE LEADS (ADMIN) ---
+    if es_admin:
+        with st.expander("Historial de leads (Modo Admin)"):
+            almacen_leads = obtener_almacen_leads()
+            col_f1, col_f2, col_f3 = st.columns(3)
+            filtro_cob = col_f1.selectbox("Cobertura", ["Todas"] + COBERTURAS, key="hist_cob")
+            filtro_rol = col_f2.selectbox("Rol", ["Todos", "Cliente"], key="hist_rol")
+            filtros = {'cobertura': None if filtro_cob == "Todas" else filtro_cob, 'rol': None if filtro_rol == "Todos" else filtro_rol}
+            total_leads = almacen_leads.contar(**filtros)
+            n_paginas = max(1, -(-total_leads // 50))
+            pagina = col_f3.number_input(f"Página (de {n_paginas})", 1, n_paginas, 1, key="hist_pag")
+            st.caption(f"{total_leads} leads")
+            st.dataframe(almacen_leads.consultar(pagina=pagina, por_pagina=50, **filtros), hide_index=True)
+            if st.button("Preparar CSV"):
+                salida = StringIO()
+                almacen_leads.exportar_csv(salida, **filtros)
+                st.download_button("Descargar historial_leads.csv", salida.getvalue().encode('utf-8-sig'), "historial_leads.csv", "text/csv")
+
+    # --- ANALÍTICA DE LEADS (ADMIN) ---
+    # Todo sale de los resúmenes por día de historial_leads.db (no se leen los leads ni las propuestas)
+    if es_admin:
+        with st.expander("Analítica de leads (Modo Admin)"):
+            almacen_leads = obtener_almacen_leads()
+            col_a1, col_a2 = st.columns(2)
+            periodo = col_a1.selectbox("Periodo", ["Últimos 30 días", "Últimos 12 meses", "Todo"], key="ana_periodo")
+            filtro_cob_a = col_a2.selectbox("Cobertura", ["Todas"] + COBERTURAS, key="ana_cob")
+            dias_periodo = {"Últimos 30 días": 30, "Últimos 12 meses": 365}.get(periodo)
+            filtros_a = {'desde': datetime.now().date() - timedelta(days=dias_periodo) if dias_periodo else None,
+                         'cobertura': None if filtro_cob_a == "Todas" else filtro_cob_a}
+
+            totales = almacen_leads.resumen(por=(), **filtros_a).iloc[0]
+            col_t1, col_t2, col_t3 = st.columns(3)
+            col_t1.metric("Leads", f"{int(totales['Leads']):,}")
+            col_t2.metric("Asegurados", f"{int(totales['Asegurados']):,}")
+            col_t3.metric("Asegurados por lead", f"{totales['Asegurados'] / totales['Leads']:.2f}" if totales['Leads'] else "-")
+
+            por_mes = almacen_leads.resumen(por=('mes', 'cobertura'), **filtros_a)
+            if por_mes.empty:
+                st.caption("Sin leads en el periodo")
+            else:
+                st.bar_chart(por_mes.pivot_table(index='Mes', columns='Cobertura', values='Leads', aggfunc='sum', fill_value=0))
+                col_g1, col_g2 = st.columns(2)
+                tramos_a = almacen_leads.resumen(por=('tramo',), **filtros_a)
+                col_g1.dataframe(tramos_a.rename(columns={'Tramo_Edad': 'Edad titular'}), hide_index=True)
+                clinicas_a = almacen_leads.resumen(por=('clinica',), **filtros_a).sort_values('Leads', ascending=False).head(15)
+                clinicas_a['Clinica'] = clinicas_a['Clinica'].replace('', "(sin preferencia)")
+                col_g2.dataframe(clinicas_a.rename(columns={'Clinica': 'Clínica'}), hide_index=True)
+
+            planes_a = almacen_leads.resumen_planes(**filtros_a).sort_values('Propuestas', ascending=False, kind='stable').head(15)
+            st.write("Planes recomendados (PDF emitidos)")
+            if planes_a.empty: st.caption("Sin propuestas en el periodo")
+            else: st.dataframe(planes_a, hide_index=True)
+
+            if st.button("Preparar resúmenes CSV"):
+                col_e1, col_e2, col_e3 = st.columns(3)
+                for col_e, tabla, nombre in [(col_e1, 'resumen_dia', "resumen_leads_dia.csv"), (col_e2, 'resumen_clinica', "resumen_leads_clinica.csv"),
+                                             (col_e3, 'resumen_plan', "resumen_planes.csv")]:
+                    salida = StringIO()
+                    almacen_leads.exportar_resumen(salida, tabla=tabla)
+                    col_e.download_button(f"Descargar {nombre}", salida.getvalue().encode('utf-8-sig'), nombre, "text/csv")
+
+    # --- MÉTRICAS (ADMIN) ---
+    if es_admin:
+        with st.expander("Métricas (Modo Admin)"):
+            registro = metricas.REGISTRO
+            activo = st.toggle("Medir tiempos y contadores", value=registro.activo, key="met_activo")
+            if activo != registro.activo: metricas.activar(activo)
+            datos_met = registro.resumen()
+            if datos_met['tramos']:
+                st.dataframe(pd.DataFrame([{'Tramo': k, 'Llamadas': t['n'], 'Media ms': t['media'] * 1000, 'Máx ms': t['max'] * 1000, 'Total s': t['suma']}
+                                           for k, t in sorted(datos_met['tramos'].items())]), hide_index=True)
+            else:
+                st.caption("Sin tramos medidos todavía")
+            if datos_met['contadores']:
+                st.write(" | ".join(f"{k}: {v}" for k, v in sorted(datos_met['contadores'].items())))
+            col_m1, col_m2, col_m3 = st.columns(3)
+            col_m1.download_button("Prometheus", registro.prometheus(), "metricas.prom", "text/plain")
+            col_m2.download_button("JSON lines", registro.json_lineas(), "metricas.jsonl", "application/x-ndjson")
+            if col_m3.button("Reiniciar"): registro.limpiar()
+
+            # Perfil de una cotización con los datos actuales del formulario (sin pasar por la caché)
+            if st.button("Perfilar una cotización"):
+                _, informe = metricas.perfilar(buscar, catalogo, indice_clinicas, indice_precios, familia, sorted(clinicas), cont, cob, descuentos)
+                st.code(informe)
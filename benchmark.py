@@ -0,0 +1,271 @@
+"""Mide las etapas críticas del cotizador y compara contra una línea base.
+
+Uso: python benchmark.py [--escalas 1,10,100] [--iteraciones 300] [--iteraciones-pdf 20] [--sesiones 20]
+                         [--base benchmark_base.json] [--guardar-base] [--tolerancia 0.3] [--semilla 7]
+
+Cada escala arma un catálogo en una carpeta temporal: la 1 copia los archivos del repo y la N repite
+N veces los planes y las clínicas con nombres distintos. Por etapa se reporta p50/p95/p99 en ms y el
+pico de memoria asignada (tracemalloc) de una llamada. Con --sesiones se simulan usuarios en paralelo
+(un hilo por sesión, como el servidor de Streamlit) que comparten la foto de datos y la caché.
+Si alguna etapa empeora más que --tolerancia frente a la línea base, termina con código 1.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from datos import ARCHIVOS_DATOS, ARCHIVO_FOTO, AlmacenDatos, cargar_foto_fuentes, guardar_foto_binaria, leer_foto_binaria
+from motor import COBERTURAS, CONDICIONES, buscar, calcular_precio
+from tarifas import archivos_tarifa
+from campanas import cargar_campanas, compilar_campanas
+from cache_cotizaciones import CacheCotizaciones, clave_cotizacion
+from propuesta_pdf import generar_pdf, motivo_recomendacion
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+ARCHIVO_BASE = 'benchmark_base.json'
+# Diferencias menores a esto (ms) no cuentan como regresión: son ruido en etapas de microsegundos
+PISO_MS = 0.05
+
+# --- DATOS SINTÉTICOS ---
+def _escalar_nombre(nombre, k):
+    return nombre if k == 0 else f"{nombre} {k}"
+
+def preparar_catalogo(destino, escala):
+    """Escribe en `destino` los archivos de datos, con planes y clínicas repetidos `escala` veces."""
+    for nombre in ('logo.png',):
+        if os.path.exists(os.path.join(RAIZ, nombre)): shutil.copy(os.path.join(RAIZ, nombre), destino)
+    if escala == 1:
+        for nombre in ARCHIVOS_DATOS + [os.path.basename(r) for _, r in archivos_tarifa(RAIZ) if os.path.basename(r) not in ARCHIVOS_DATOS]:
+            if os.path.exists(os.path.join(RAIZ, nombre)): shutil.copy(os.path.join(RAIZ, nombre), destino)
+        return
+
+    def repetir(df, columnas_plan, clinicas=None):
+        copias = []
+        for k in range(escala):
+            c = df.copy()
+            for col in columnas_plan: c[col] = c[col].astype(str).map(lambda v: _escalar_nombre(v, k))
+            if clinicas: c[clinicas] = c[clinicas].fillna('').astype(str).map(
+                lambda txt: ", ".join(_escalar_nombre(x.strip(), k) for x in txt.split(',') if x.strip()))
+            copias.append(c)
+        return pd.concat(copias, ignore_index=True)
+
+    repetir(pd.read_csv(os.path.join(RAIZ, 'precios_2026.csv')), ['Plan']).to_csv(os.path.join(destino, 'precios_2026.csv'), index=False)
+    repetir(pd.read_csv(os.path.join(RAIZ, 'info_adicional.csv'), encoding='utf-8-sig'), ['Plan']).to_csv(os.path.join(destino, 'info_adicional.csv'), index=False)
+    repetir(pd.read_csv(os.path.join(RAIZ, 'campana_descuentos.csv')), ['Plan']).to_csv(os.path.join(destino, 'campana_descuentos.csv'), index=False)
+    redes = repetir(pd.read_excel(os.path.join(RAIZ, 'base_clinicas.xlsx'), sheet_name='REDES'), ['Plan'], 'Clinicas_Incluidas')
+    with pd.ExcelWriter(os.path.join(destino, 'base_clinicas.xlsx'), engine='openpyxl') as xls:
+        redes.to_excel(xls, sheet_name='REDES', index=False)
+
+def familias_aleatorias(rng, clinicas, n):
+    """Perfiles realistas: titular adulto, pareja de edad parecida e hijos, ~15% crónicos."""
+    perfiles = []
+    for _ in range(n):
+        edad = rng.randint(18, 75)
+        familia = [{'edad': edad, 'salud': 'Crónico' if rng.random() < 0.15 else 'Sano', 'rol': 'Titular'}]
+        if rng.random() < 0.5:
+            familia.append({'edad': max(18, min(99, edad + rng.randint(-6, 6))), 'salud': 'Crónico' if rng.random() < 0.15 else 'Sano', 'rol': 'Dependiente'})
+        for _ in range(rng.choice([0, 0, 1, 2, 3]) if edad < 60 else 0):
+            familia.append({'edad': rng.randint(0, 25), 'salud': 'Sano', 'rol': 'Dependiente'})
+        cobertura = rng.choices(COBERTURAS, weights=[2, 5, 3, 1])[0]
+        n_cli = 0 if cobertura == COBERTURAS[-1] and rng.random() < 0.7 else rng.choice([0, 1, 1, 2, 3])
+        perfiles.append({'familia': familia, 'clinicas': sorted(rng.sample(clinicas, min(n_cli, len(clinicas)))),
+                         'continuidad': rng.choices(CONDICIONES, weights=[7, 3])[0], 'cobertura': cobertura})
+    return perfiles
+
+# --- MEDICIÓN ---
+def percentiles(muestras_ms):
+    p50, p95, p99 = np.percentile(muestras_ms, [50, 95, 99]) if len(muestras_ms) else (0.0, 0.0, 0.0)
+    return {'n': len(muestras_ms), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+def medir(funcion, argumentos, repeticiones=3):
+    """Llama `funcion(*a)` con cada tupla de `argumentos` (más una de calentamiento); luego repite las primeras con tracemalloc.
+
+    Cada muestra es la mejor de `repeticiones` llamadas con el GC detenido, para que el ruido de la máquina
+    no se confunda con una regresión.
+    """
+    argumentos = list(argumentos)
+    funcion(*argumentos[0])
+    muestras = []
+    for a in argumentos:
+        mejor = float('inf')
+        for _ in range(repeticiones):
+            gc.disable()
+            try:
+                inicio = time.perf_counter()
+                funcion(*a)
+                mejor = min(mejor, time.perf_counter() - inicio)
+            finally:
+                gc.enable()
+        muestras.append(mejor * 1000)
+    pico = 0
+    tracemalloc.start()
+    try:
+        for a in argumentos[:5]:
+            tracemalloc.reset_peak()
+            funcion(*a)
+            pico = max(pico, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    return dict(percentiles(muestras), mem_kb=pico / 1024)
+
+@contextmanager
+def _en_carpeta(ruta):
+    anterior = os.getcwd()
+    os.chdir(ruta)
+    try: yield
+    finally: os.chdir(anterior)
+
+def _descuentos(foto, continuidad):
+    return foto.campanas.vector("Nuevo" if continuidad == "Nuevo" else "Continuidad")
+
+def _cotizar(foto, p):
+    return buscar(foto.catalogo, foto.indice_clinicas, foto.indice_precios, p['familia'], p['clinicas'],
+                  p['continuidad'], p['cobertura'], _descuentos(foto, p['continuidad']))
+
+def _cargar_campanas(indice_clinicas):
+    return compilar_campanas(cargar_campanas(), indice_clinicas)
+
+def _pdf(p, res):
+    perfil = {'Titular': f"Cliente ({p['familia'][0]['edad']} años)", 'Continuidad': p['continuidad'], 'Cobertura': p['cobertura'],
+              'Dependientes': ", ".join(f"Dep ({d['edad']}a)" for d in p['familia'][1:]) or "Ninguno"}
+    pdf = generar_pdf(perfil, res, res['ID'].iloc[0], motivo_recomendacion(p['clinicas'], p['continuidad']), 1000)
+    if isinstance(pdf, str): raise RuntimeError(pdf)
+
+def medir_escala(escala, iteraciones, iteraciones_pdf, rng):
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix=f"bench_{escala}x_") as carpeta:
+        preparar_catalogo(carpeta, escala)
+        with _en_carpeta(carpeta):
+            resultados['cargar_fuentes'] = medir(cargar_foto_fuentes, [()] * 3, repeticiones=1)
+            foto = cargar_foto_fuentes()
+            guardar_foto_binaria(foto, ARCHIVO_FOTO)
+            resultados['cargar_foto_binaria'] = medir(leer_foto_binaria, [()] * 10)
+            almacen = AlmacenDatos(ARCHIVOS_DATOS)
+            resultados['cargar_datos_base'] = medir(almacen.actual, [()] * iteraciones)
+            foto = almacen.actual()
+            resultados['cargar_campanas'] = medir(_cargar_campanas, [(foto.indice_clinicas,)] * 10)
+
+            perfiles = familias_aleatorias(rng, foto.clinicas_unicas, iteraciones)
+            planes = list(foto.indice_precios['offsets'])
+            resultados['calcular_precio'] = medir(calcular_precio, [(foto.indice_precios, *rng.choice(planes), p['familia']) for p in perfiles])
+            resultados['buscar'] = medir(_cotizar, [(foto, p) for p in perfiles])
+
+            con_planes = [(p, r) for p in perfiles[:iteraciones_pdf * 3] for r in [_cotizar(foto, p)] if not r.empty][:iteraciones_pdf]
+            if con_planes: resultados['generar_pdf'] = medir(_pdf, con_planes, repeticiones=1)
+            info = {'planes': len(planes), 'clinicas': len(foto.clinicas_unicas),
+                    'filas_pdf_p50': float(np.median([len(r) for _, r in con_planes])) if con_planes else 0.0}
+    return resultados, info
+
+def medir_sesiones(n_sesiones, acciones, rng):
+    """Usuarios simultáneos sobre los datos del repo: cada acción carga la foto, cotiza (con caché) y a veces pide el PDF."""
+    muestras = {'sesion_cotizar': [], 'sesion_pdf': []}
+    lock = threading.Lock()
+    with tempfile.TemporaryDirectory(prefix="bench_sesiones_") as carpeta:
+        preparar_catalogo(carpeta, 1)
+        with _en_carpeta(carpeta):
+            almacen = AlmacenDatos(ARCHIVOS_DATOS)
+            cache = CacheCotizaciones(max_items=512)
+            foto = almacen.actual()
+            # Perfiles repetidos entre sesiones, como en la práctica (mismas edades y clínicas populares)
+            comunes = familias_aleatorias(rng, foto.clinicas_unicas, max(10, n_sesiones * acciones // 4))
+            guiones = [[rng.choice(comunes) for _ in range(acciones)] for _ in range(n_sesiones)]
+
+            def sesion(guion):
+                propias = {'sesion_cotizar': [], 'sesion_pdf': []}
+                for i, p in enumerate(guion):
+                    inicio = time.perf_counter()
+                    f = almacen.actual()
+                    descuentos = f.campanas.descuentos("Nuevo" if p['continuidad'] == "Nuevo" else "Continuidad")
+                    clave = clave_cotizacion(p['familia'], p['clinicas'], p['continuidad'], p['cobertura'], descuentos)
+                    res = cache.obtener(clave, lambda: _cotizar(f, p), firma=f.firma)
+                    propias['sesion_cotizar'].append((time.perf_counter() - inicio) * 1000)
+                    if i % 5 == 4 and not res.empty:
+                        inicio = time.perf_counter()
+                        _pdf(p, res)
+                        propias['sesion_pdf'].append((time.perf_counter() - inicio) * 1000)
+                with lock:
+                    for k, v in propias.items(): muestras[k].extend(v)
+
+            inicio = time.perf_counter()
+            hilos = [threading.Thread(target=sesion, args=(g,)) for g in guiones]
+            for h in hilos: h.start()
+            for h in hilos: h.join()
+            duracion = time.perf_counter() - inicio
+
+    resultados = {k: percentiles(v) for k, v in muestras.items()}
+    info = {'sesiones': n_sesiones, 'acciones_por_segundo': n_sesiones * acciones / duracion, 'cache': cache.estadisticas()}
+    return resultados, info
+
+# --- LÍNEA BASE ---
+def comparar(actual, base, tolerancia):
+    """Lista de regresiones (texto) en p50/p95 frente a la línea base."""
+    regresiones = []
+    for clave, m in actual.items():
+        ref = base.get(clave)
+        if not ref: continue
+        for p in ('p50', 'p95'):
+            if m[p] > ref[p] * (1 + tolerancia) and m[p] - ref[p] > PISO_MS:
+                regresiones.append(f"{clave} {p}: {m[p]:.3f} ms (base {ref[p]:.3f} ms, +{(m[p] / ref[p] - 1) * 100:.0f}%)")
+    return regresiones
+
+def _imprimir(titulo, resultados, info):
+    print(f"\n== {titulo} ==  " + ", ".join(f"{k}: {v}" for k, v in info.items() if not isinstance(v, dict)))
+    print(f"{'etapa':<22}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'mem KB':>11}")
+    for etapa, m in resultados.items():
+        print(f"{etapa:<22}{m['n']:>6}{m['p50']:>11.3f}{m['p95']:>11.3f}{m['p99']:>11.3f}{m.get('mem_kb', float('nan')):>11.0f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de las etapas del cotizador.")
+    parser.add_argument('--escalas', default='1,10,100', help="Multiplicadores del catálogo, separados por comas")
+    parser.add_argument('--iteraciones', type=int, default=300)
+    parser.add_argument('--iteraciones-pdf', type=int, default=20)
+    parser.add_argument('--sesiones', type=int, default=20, help="Usuarios simultáneos (0 para omitir)")
+    parser.add_argument('--acciones', type=int, default=25, help="Cotizaciones por sesión")
+    parser.add_argument('--base', default=os.path.join(RAIZ, ARCHIVO_BASE))
+    parser.add_argument('--guardar-base', action='store_true', help="Guarda estos resultados como nueva línea base")
+    parser.add_argument('--tolerancia', type=float, default=0.3, help="Empeoramiento permitido (0.3 = 30%%)")
+    parser.add_argument('--semilla', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.semilla)
+    actual = {}
+    for escala in [int(e) for e in args.escalas.split(',') if e.strip()]:
+        resultados, info = medir_escala(escala, args.iteraciones, args.iteraciones_pdf, rng)
+        _imprimir(f"{escala}x", resultados, info)
+        actual.update({f"{escala}x/{etapa}": m for etapa, m in resultados.items()})
+    if args.sesiones > 0:
+        resultados, info = medir_sesiones(args.sesiones, args.acciones, rng)
+        _imprimir(f"{args.sesiones} sesiones", resultados, info)
+        print(f"acciones/s: {info['acciones_por_segundo']:.1f} | caché: {info['cache']['Tasa_Aciertos']:.0%} aciertos")
+        actual.update({f"sesiones/{etapa}": m for etapa, m in resultados.items()})
+
+    if args.guardar_base:
+        with open(args.base, 'w', encoding='utf-8') as f: json.dump(actual, f, indent=1, sort_keys=True)
+        print(f"\n✅ Línea base guardada en {args.base}")
+        return 0
+
+    if not os.path.exists(args.base):
+        print(f"\n⚠️ No hay línea base ({args.base}); usa --guardar-base")
+        return 0
+    with open(args.base, encoding='utf-8') as f: base = json.load(f)
+    regresiones = comparar(actual, base, args.tolerancia)
+    if regresiones:
+        print("\n❌ Regresiones frente a la línea base:")
+        for r in regresiones: print(f"   {r}")
+        return 1
+    print(f"\n✅ Sin regresiones frente a {args.base} (tolerancia {args.tolerancia:.0%})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
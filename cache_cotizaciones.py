@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+from metricas import contar
+
+# --- CACHÉ DE COTIZACIONES ---
+# Memoriza resultados de buscar por perfil normalizado; se vacía sola cuando cambia la foto de datos (su firma).
+
+def clave_cotizacion(familia, clinicas, continuidad, cobertura, descuentos):
+    """Forma canónica del perfil: el orden de la familia y de las clínicas no cambia la cotización."""
+    fam = tuple(sorted((int(p['edad']), p['salud']) for p in familia))
+    dsc = frozenset((k, v) for k, v in descuentos.items() if v)
+    return (fam, frozenset(clinicas), continuidad, cobertura, dsc)
+
+class CacheCotizaciones:
+    def __init__(self, max_items=512):
+        self.max_items = max_items
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+        self.invalidaciones = 0
+        self._items = OrderedDict()
+        self._firma = None
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, calcular, firma):
+        """Devuelve el resultado memorizado para `clave` o lo calcula con `calcular()` y lo guarda.
+
+        `firma` identifica los datos con que se calcula (FotoDatos.firma). Si mientras se calculaba la caché pasó
+        a otra foto, el resultado se devuelve pero no se guarda.
+        """
+        with self._lock:
+            if firma != self._firma:
+                self._items.clear()
+                if self._firma is not None: self.invalidaciones += 1
+                self._firma = firma
+            if clave in self._items:
+                self._items.move_to_end(clave)
+                self.aciertos += 1
+                contar('cache_aciertos')
+                return self._items[clave].copy()
+            self.fallos += 1
+            contar('cache_fallos')
+
+        res = calcular()
+        with self._lock:
+            if firma != self._firma: return res.copy()
+            self._items[clave] = res
+            self._items.move_to_end(clave)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self.descartes += 1
+        return res.copy()
+
+    def limpiar(self):
+        with self._lock:
+            self._items.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'Aciertos': self.aciertos,
+                'Fallos': self.fallos,
+                'Tasa_Aciertos': self.aciertos / total if total else 0.0,
+                'En_Cache': len(self._items),
+                'Capacidad': self.max_items,
+                'Descartes': self.descartes,
+                'Invalidaciones': self.invalidaciones,
+            }
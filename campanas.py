@@ -0,0 +1,165 @@
+import os
+import unicodedata
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from metricas import medido
+from motor import MESES
+
+# --- CAMPAÑAS ---
+# campana_descuentos.csv se compila una vez por carga en vectores de descuento alineados con
+# indice_clinicas['planes'] (el mismo orden que recorre buscar_base).
+#
+# Columnas: Aseguradora, Plan, Tipo_Cliente, Mes, Porcentaje_Descuento y, opcionales, Desde y Hasta
+# (dd/mm/aaaa, ambos incluidos). Una fila rige cuando coincide el mes (si tiene Mes) y la fecha está en
+# su rango (si tiene Desde/Hasta). Tipo_Cliente vacío o "Todos" aplica a Nuevo y Continuidad.
+# Si varias filas rigen para un mismo plan, tipo y día manda la última del archivo (como en el formato anterior,
+# donde una fila repetida pisaba a la anterior); no se suman. El descuento se topa en 100%.
+
+TIPOS_CLIENTE = ('Nuevo', 'Continuidad')
+COLUMNAS_CAMPANAS = ['Aseguradora', 'Plan', 'Tipo_Cliente', 'Mes', 'Desde', 'Hasta', 'Porcentaje']
+
+def _sin_tildes(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn').lower()
+
+_NUMERO_MES = {_sin_tildes(nombre): n for n, nombre in MESES.items()}
+_NUMERO_MES.update({'setiembre': 9})
+
+def numero_mes(valor):
+    """1-12 para 'Febrero', 'febrero', '2'...; 0 si está vacío; None si no se reconoce."""
+    texto = _sin_tildes(str(valor).strip())
+    if texto in ('', 'nan'): return 0
+    if texto.isdigit(): return int(texto) if 1 <= int(texto) <= 12 else None
+    return _NUMERO_MES.get(texto)
+
+def _ordinal(valor):
+    """dd/mm/aaaa (o aaaa-mm-dd) -> día ordinal; 0 si está vacío."""
+    texto = str(valor).strip()
+    if texto in ('', 'nan', 'NaT'): return 0
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try: return datetime.strptime(texto, formato).date().toordinal()
+        except ValueError: pass
+    raise ValueError(f"Fecha no válida en campana_descuentos.csv: {texto}")
+
+def _ordinal_o_none(valor):
+    try: return _ordinal(valor)
+    except ValueError: return None
+
+@medido('cargar_campanas')
+def cargar_campanas(ruta='campana_descuentos.csv'):
+    """Filas de campañas normalizadas (DataFrame con COLUMNAS_CAMPANAS): Mes 0-12, Desde/Hasta como día ordinal (0 = sin límite).
+
+    Las filas con un Mes o una fecha que no se reconoce se descartan (antes nunca coincidían con ningún mes).
+    """
+    if not os.path.exists(ruta): return pd.DataFrame(columns=COLUMNAS_CAMPANAS)
+    try:
+        df = pd.read_csv(ruta, sep=',', dtype=str, keep_default_na=False)
+        if 'Aseguradora' not in df.columns: df = pd.read_csv(ruta, sep=';', dtype=str, keep_default_na=False)
+        for col in ('Desde', 'Hasta', 'Mes', 'Tipo_Cliente'):
+            if col not in df.columns: df[col] = ''
+        filas = pd.DataFrame({
+            'Aseguradora': df['Aseguradora'].str.strip(),
+            'Plan': df['Plan'].str.strip(),
+            'Tipo_Cliente': df['Tipo_Cliente'].str.strip(),
+            'Mes': df['Mes'].map(numero_mes),
+            'Porcentaje': pd.to_numeric(df['Porcentaje_Descuento'], errors='coerce'),
+        })
+        filas['Desde'] = df['Desde'].map(_ordinal_o_none)
+        filas['Hasta'] = df['Hasta'].map(_ordinal_o_none)
+        validas = filas['Mes'].notna() & filas['Desde'].notna() & filas['Hasta'].notna()
+        filas = filas[validas].copy()
+        # Igual que int() del formato anterior: decimales truncados, valores no numéricos = 0
+        filas['Porcentaje'] = filas['Porcentaje'].fillna(0).astype(np.int64)
+        for col in ('Mes', 'Desde', 'Hasta'): filas[col] = filas[col].astype(np.int64)
+        return filas[COLUMNAS_CAMPANAS].reset_index(drop=True)
+    except Exception as e:
+        print(f"Error leyendo {ruta}: {e}")
+        return pd.DataFrame(columns=COLUMNAS_CAMPANAS)
+
+def _hoy(fecha):
+    if fecha is None: return date.today()
+    return fecha.date() if isinstance(fecha, datetime) else fecha
+
+class CampanasCompiladas:
+    """Descuentos vigentes por (tipo de cliente, día), como vectores alineados con `planes`.
+
+    Las filas sin fechas se vuelcan al compilar en una tabla tipo x mes x plan, con la fila del archivo de la que
+    salió cada valor; las que tienen Desde/Hasta quedan en arreglos que se filtran la primera vez que se pide un
+    día, y de las que rigen gana la de fila más alta. El vector de cada (tipo, día)
+    queda memorizado: para las cotizaciones siguientes es una búsqueda en un dict.
+    """
+
+    def __init__(self, filas, planes):
+        self.filas = filas
+        self.planes = list(planes)
+        self.posicion = {key: j for j, key in enumerate(self.planes)}
+        n = len(self.planes)
+
+        reglas = []
+        self.desconocidas = set()
+        for cia, plan, tipo, mes, desde, hasta, pct in zip(*(filas[c].tolist() for c in COLUMNAS_CAMPANAS)):
+            j = self.posicion.get((cia, plan))
+            if j is None:
+                self.desconocidas.add((cia, plan))
+                continue
+            if tipo in TIPOS_CLIENTE: tipos = [TIPOS_CLIENTE.index(tipo)]
+            elif tipo in ('', 'Todos'): tipos = list(range(len(TIPOS_CLIENTE)))
+            else: continue
+            reglas.append((len(reglas), j, tipos, mes, desde, hasta, pct))
+        self.desconocidas = sorted(self.desconocidas)
+
+        # Reglas sin fechas: tabla tipo x mes x plan (mes 0 sin uso), en orden de archivo (la última pisa)
+        self._por_mes = np.zeros((len(TIPOS_CLIENTE), 13, n), dtype=np.int64)
+        self._fila_mes = np.full((len(TIPOS_CLIENTE), 13, n), -1, dtype=np.int64)
+        for fila, j, tipos, mes, desde, hasta, pct in reglas:
+            if desde or hasta: continue
+            self._por_mes[tipos, mes or slice(1, None), j] = pct
+            self._fila_mes[tipos, mes or slice(1, None), j] = fila
+
+        # Reglas con fechas: arreglos paralelos que se filtran una vez por día (y luego quedan memorizados)
+        rangos = [r for r in reglas if r[4] or r[5]]
+        fila, plan, tipos, mes, desde, hasta, pct = zip(*rangos) if rangos else ((),) * 7
+        self._rango_fila = np.array(fila, dtype=np.int64)
+        self._rango_plan = np.array(plan, dtype=np.intp)
+        self._rango_tipos = np.array([[t in ts for t in range(len(TIPOS_CLIENTE))] for ts in tipos], dtype=bool).reshape(-1, len(TIPOS_CLIENTE))
+        self._rango_mes = np.array(mes, dtype=np.int64)
+        self._rango_desde = np.array(desde, dtype=np.int64)
+        self._rango_hasta = np.array([h or date.max.toordinal() for h in hasta], dtype=np.int64)
+        self._rango_pct = np.array(pct, dtype=np.int64)
+
+        self._vigentes = {}
+
+    def __len__(self):
+        return len(self.filas)
+
+    def vector(self, tipo_cliente, fecha=None):
+        """Descuento (%) de cada plan de `planes` para 'Nuevo' o 'Continuidad' en `fecha` (hoy por defecto). Solo lectura."""
+        dia = _hoy(fecha)
+        clave = (tipo_cliente, dia)
+        vec = self._vigentes.get(clave)
+        if vec is None:
+            t = TIPOS_CLIENTE.index(tipo_cliente)
+            hoy = dia.toordinal()
+            activas = self._rango_tipos[:, t] & (self._rango_desde <= hoy) & (hoy <= self._rango_hasta) \
+                & ((self._rango_mes == 0) | (self._rango_mes == dia.month))
+            vec = self._por_mes[t, dia.month].copy()
+            fila = self._fila_mes[t, dia.month]
+            # Última regla con fechas que rige para cada plan; pisa a la del mes si está más abajo en el archivo
+            activas = np.flatnonzero(activas)[::-1]
+            planes, primera = np.unique(self._rango_plan[activas], return_index=True)
+            ultimas = activas[primera]
+            gana = self._rango_fila[ultimas] > fila[planes]
+            vec[planes[gana]] = self._rango_pct[ultimas[gana]]
+            vec = np.minimum(vec, 100)
+            vec.setflags(write=False)
+            self._vigentes[clave] = vec
+        return vec
+
+    def descuentos(self, tipo_cliente, fecha=None):
+        """Lo mismo que vector() como dict {(Aseguradora, Plan): pct}, con todos los planes."""
+        return dict(zip(self.planes, self.vector(tipo_cliente, fecha).tolist()))
+
+def compilar_campanas(filas, indice_clinicas):
+    return CampanasCompiladas(filas, indice_clinicas['planes'])
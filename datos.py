@@ -0,0 +1,276 @@
+import os
+import json
+import struct
+import hashlib
+import zipfile
+import threading
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from metricas import medido
+from motor import cargar_fuentes, indexar_clinicas, indexar_catalogo, PlanCatalogo
+from tarifas import Anomalia, archivos_tarifa, indexar_tarifas, informe_anomalias
+from redes import ARCHIVO_REDES, leer_redes, tabla_redes, lista_clinicas, entradas_redes, comparar_redes, aplicar_cambios, informe_cambios
+from campanas import CampanasCompiladas, cargar_campanas, compilar_campanas
+
+# --- ALMACÉN DE DATOS ---
+# Una carga por proceso. Si cambia un archivo se recarga en segundo plano y se cambia
+# la foto completa de una vez; las cotizaciones en curso siguen con la foto que tomaron.
+
+# Las tarifas de otros años (precios_2027.csv...) no van en la lista: cargar_fuentes las busca en cada carga,
+# así que se suman cada vez que se calcula la firma o se revisan los archivos (ver archivos_vigilados)
+ARCHIVOS_DATOS = ['precios_2026.csv', 'base_clinicas.xlsx', 'info_adicional.csv', 'campana_descuentos.csv']
+ARCHIVO_FOTO = 'datos_cotizador.npz'
+VERSION_FOTO = 6
+
+class FotoDatos(NamedTuple):
+    df_precios: pd.DataFrame      # None si la foto se leyó de datos_cotizador.npz
+    df_redes: pd.DataFrame        # ídem
+    clinicas_unicas: list
+    indice_precios: dict
+    indice_clinicas: dict
+    catalogo: dict
+    campanas: CampanasCompiladas
+    anomalias_tarifa: dict        # {año: [Anomalia]} de validar_tarifa, al leer los CSV
+    firma: tuple
+    cargado: datetime
+
+def _estado_archivo(ruta):
+    try:
+        info = os.stat(ruta)
+        return (info.st_mtime_ns, info.st_size)
+    except OSError:
+        return None
+
+def _hash_archivo(ruta):
+    try:
+        with open(ruta, 'rb') as f: return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def archivos_vigilados(archivos):
+    """`archivos` más los precios_<año>.csv que haya ahora en la carpeta."""
+    return list(archivos) + [ruta for _, ruta in archivos_tarifa() if ruta not in archivos]
+
+def firma_archivos(archivos):
+    """(ruta, mtime, tamaño, sha1) de cada archivo vigilado (ver archivos_vigilados); None en los que no existen."""
+    return tuple((ruta, _estado_archivo(ruta), _hash_archivo(ruta)) for ruta in archivos_vigilados(archivos))
+
+def cargar_foto(archivos=ARCHIVOS_DATOS):
+    """FotoDatos desde datos_cotizador.npz si está al día; si no, desde las fuentes. None si faltan los archivos base."""
+    foto = leer_foto_binaria(ARCHIVO_FOTO, archivos)
+    if foto is not None: return foto
+    if os.path.exists(ARCHIVO_FOTO):
+        print(f"⚠️ {ARCHIVO_FOTO} desactualizado: se leen las fuentes. Ejecuta 'actualizar_db.py'.")
+    return cargar_foto_fuentes(archivos)
+
+@medido('cargar_fuentes')
+def cargar_foto_fuentes(archivos=ARCHIVOS_DATOS):
+    """Lee todas las fuentes y arma una FotoDatos. Devuelve None si faltan los archivos base."""
+    firma = firma_archivos(archivos)
+    datos = cargar_fuentes()
+    if datos is None: return None
+    df_precios, df_redes, clinicas_unicas, indice_precios, indice_clinicas, catalogo, anomalias = datos
+    return FotoDatos(df_precios, df_redes, clinicas_unicas, indice_precios, indice_clinicas, catalogo,
+                     compilar_campanas(cargar_campanas(), indice_clinicas), anomalias, firma, datetime.now())
+
+@medido('actualizar_redes')
+def actualizar_redes(foto, archivos=ARCHIVOS_DATOS):
+    """La foto con solo las redes de base_clinicas.xlsx puestas al día sobre su índice de clínicas.
+
+    Devuelve (foto nueva, CambiosRedes), o None si cambió otro archivo o el conjunto de planes (hace falta carga completa).
+    """
+    firma = firma_archivos(archivos)
+    cambiaron = [ruta for (ruta, _, h), (ruta_antes, _, h_antes) in zip(firma, foto.firma) if (ruta, h) != (ruta_antes, h_antes)]
+    if cambiaron != [ARCHIVO_REDES] or len(firma) != len(foto.firma) or not os.path.exists(ARCHIVO_REDES): return None
+
+    filas = leer_redes(ARCHIVO_REDES)
+    entradas = entradas_redes(filas)
+    cambios = comparar_redes(foto.indice_clinicas, entradas)
+    if cambios.requiere_recarga: return None
+
+    indice_clinicas = indexar_clinicas(*aplicar_cambios(foto.indice_clinicas, entradas, cambios)) if cambios.cambios else foto.indice_clinicas
+    nueva = foto._replace(df_redes=tabla_redes(filas) if foto.df_redes is not None else None, clinicas_unicas=lista_clinicas(filas),
+                          indice_clinicas=indice_clinicas, firma=firma, cargado=datetime.now())
+    return nueva, cambios
+
+# --- FOTO BINARIA (datos_cotizador.npz) ---
+# Un .npz sin comprimir con solo arreglos numéricos o de texto de ancho fijo. Se abre entero con mmap de
+# solo lectura: los procesos del mismo equipo comparten esas páginas (caché de archivos del sistema), y cada
+# uno arma en memoria propia solo los diccionarios chicos (planes, códigos de clínicas, catálogo).
+# Las tablas crudas (df_precios, df_redes) no se guardan: solo hacen falta para escribir la foto.
+
+CAMPOS_INDICE_CLINICAS = ['primera_red', 'tripletas', 'red_inicio', 'red_plan', 'red_tripleta', 'matriz']
+
+def _columnas_df(arrays, prefijo, df):
+    """Guarda cada columna por separado; los textos van como códigos + diccionario de valores."""
+    arrays[f'{prefijo}__columnas'] = np.array(list(df.columns), dtype=str)
+    for i, col in enumerate(df.columns):
+        serie = df[col]
+        arr = serie.to_numpy() if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie) else None
+        if arr is None or arr.dtype == object:
+            codigos, valores = pd.factorize(serie.astype(str))
+            arrays[f'{prefijo}__{i}__valores'] = np.asarray(valores, dtype=str)
+            arr = codigos.astype(np.int32)
+        arrays[f'{prefijo}__{i}'] = arr
+
+def _df_columnas(z, prefijo):
+    columnas = {}
+    for i, col in enumerate(z[f'{prefijo}__columnas'].tolist()):
+        arr = z[f'{prefijo}__{i}']
+        if f'{prefijo}__{i}__valores' in z: arr = z[f'{prefijo}__{i}__valores'][arr]
+        columnas[col] = arr
+    return pd.DataFrame(columnas)
+
+def _tabla(filas, ancho):
+    return np.array(filas, dtype=str).reshape(len(filas), ancho)
+
+def guardar_foto_binaria(foto, ruta=ARCHIVO_FOTO):
+    """Escribe la foto en `ruta` de forma atómica (archivo temporal + rename)."""
+    icl = foto.indice_clinicas
+    arrays = {
+        'version': np.array(VERSION_FOTO),
+        'firma': np.array(json.dumps(foto.firma)),
+        'clinicas_unicas': np.array(foto.clinicas_unicas, dtype=str),
+        'tarifa_planes': _tabla(list(foto.indice_precios['offsets']), 2),
+        'tarifa_anios': np.array(sorted(foto.indice_precios['tramos']), dtype=np.int64),
+        'red_planes': _tabla(icl['planes'], 2),
+        'red_clinicas': np.array(icl['clinicas'], dtype=str),
+        'tarifa_anomalias': _tabla([(str(anio),) + tuple(a) for anio, lista in foto.anomalias_tarifa.items() for a in lista], 5),
+    }
+    for anio, (clave, precio) in foto.indice_precios['tramos'].items():
+        arrays[f'tarifa__{anio}__clave'], arrays[f'tarifa__{anio}__precio'] = clave, precio
+    for campo in CAMPOS_INDICE_CLINICAS: arrays[f'red__{campo}'] = np.ascontiguousarray(icl[campo])
+
+    registros = list(foto.catalogo['planes'].values())
+    for campo in PlanCatalogo._fields:
+        arrays[f'catalogo__{campo}'] = np.array([getattr(r, campo) for r in registros], dtype=bool if campo == 'acepta_continuidad' else str)
+
+    _columnas_df(arrays, 'campanas', foto.campanas.filas)
+
+    tmp = ruta + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+def mapear_npz(ruta):
+    """{nombre: arreglo} de un .npz sin comprimir, todo sobre un único mmap de solo lectura (None si está comprimido)."""
+    with zipfile.ZipFile(ruta) as zf:
+        miembros = zf.infolist()
+        if any(info.compress_type != zipfile.ZIP_STORED for info in miembros): return None
+        base = np.memmap(ruta, dtype=np.uint8, mode='r')
+        arreglos = {}
+        with open(ruta, 'rb') as f:
+            for info in miembros:
+                f.seek(info.header_offset)
+                cabecera = f.read(30)
+                largo_nombre, largo_extra = struct.unpack('<HH', cabecera[26:30])
+                f.seek(info.header_offset + 30 + largo_nombre + largo_extra)
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0): forma, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+                else: forma, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+                arreglos[info.filename[:-len('.npy')]] = np.ndarray(forma, dtype=dtype, buffer=base, offset=f.tell(), order='F' if fortran else 'C')
+    return arreglos
+
+@medido('cargar_foto_binaria')
+def leer_foto_binaria(ruta=ARCHIVO_FOTO, archivos=ARCHIVOS_DATOS):
+    """FotoDatos desde la foto binaria, o None si no existe, es de otra versión o las fuentes cambiaron.
+
+    Los arreglos grandes (tramos de tarifa, índice de clínicas) quedan sobre el mmap del archivo.
+    """
+    if not os.path.exists(ruta): return None
+    firma = firma_archivos(archivos)
+    z = mapear_npz(ruta)
+    if z is None:
+        with np.load(ruta, allow_pickle=False) as npz: z = {nombre: npz[nombre] for nombre in npz.files}
+    if 'version' not in z or int(z['version']) != VERSION_FOTO: return None
+    guardada = json.loads(str(z['firma']))
+    if [(r, h) for r, _, h in guardada] != [(r, h) for r, _, h in firma]: return None
+
+    clinicas_unicas = z['clinicas_unicas'].tolist()
+    offsets = {(cia, plan): i for i, (cia, plan) in enumerate(z['tarifa_planes'].tolist())}
+    tramos = {anio: (z[f'tarifa__{anio}__clave'], z[f'tarifa__{anio}__precio']) for anio in z['tarifa_anios'].tolist()}
+    anomalias = {anio: [] for anio in tramos}
+    for anio, *campos in z['tarifa_anomalias'].tolist(): anomalias[int(anio)].append(Anomalia(*campos))
+
+    planes = [tuple(p) for p in z['red_planes'].tolist()]
+    indice_clinicas = indexar_clinicas(planes, z['red_clinicas'].tolist(), *(z[f'red__{campo}'] for campo in CAMPOS_INDICE_CLINICAS))
+
+    columnas = [z[f'catalogo__{campo}'].tolist() for campo in PlanCatalogo._fields]
+    registros = [PlanCatalogo(*valores) for valores in zip(*columnas)]
+    catalogo = indexar_catalogo({(r.aseguradora, r.plan): r for r in registros}, indice_clinicas)
+
+    campanas = compilar_campanas(_df_columnas(z, 'campanas'), indice_clinicas)
+
+    return FotoDatos(None, None, clinicas_unicas, indexar_tarifas(offsets, tramos),
+                     indice_clinicas, catalogo, campanas, anomalias, firma, datetime.now())
+
+def avisar_anomalias(foto, limite=20):
+    """Imprime las anomalías de tarifa de la foto (a lo más `limite` líneas)."""
+    lineas = informe_anomalias(foto.anomalias_tarifa)
+    for linea in lineas[:limite]: print(f"Aviso de tarifa: {linea}")
+    if len(lineas) > limite: print(f"Aviso de tarifa: ... y {len(lineas) - limite} más (ver actualizar_db.py)")
+
+class AlmacenDatos:
+    def __init__(self, archivos=ARCHIVOS_DATOS, cargar=cargar_foto):
+        self.archivos = list(archivos)
+        self._cargar = cargar
+        self._foto = None
+        self._estados = None
+        self._hilo = None
+        self._lock = threading.Lock()
+        self.error = None
+        self.recargas = 0
+        self.cambios_redes = None     # CambiosRedes de la última actualización de redes sin carga completa
+
+    def actual(self):
+        """Foto vigente. La primera llamada carga en línea; después solo se hace un stat por archivo."""
+        if self._foto is None:
+            self.recargar(bloqueante=True)
+        elif self._estados_archivos() != self._estados:
+            self.recargar()
+        return self._foto
+
+    def _estados_archivos(self):
+        # Con la ruta: una tarifa nueva en la carpeta también cuenta como cambio
+        return tuple((ruta, _estado_archivo(ruta)) for ruta in archivos_vigilados(self.archivos))
+
+    def recargar(self, bloqueante=False):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._reconstruir, name="recarga-datos", daemon=True)
+                self._hilo.start()
+            hilo = self._hilo
+        if bloqueante: hilo.join()
+
+    def _reconstruir(self):
+        estados = self._estados_archivos()
+        # Archivo guardado de nuevo sin cambios de contenido: basta con actualizar mtime/tamaño
+        if self._foto is not None:
+            hashes = tuple((ruta, h) for ruta, _, h in firma_archivos(self.archivos))
+            if hashes == tuple((ruta, h) for ruta, _, h in self._foto.firma):
+                self._estados = estados
+                return
+        try:
+            # Si solo cambiaron redes de planes existentes no hace falta releer todo
+            parcial = actualizar_redes(self._foto, self.archivos) if self._foto is not None else None
+            if parcial is not None:
+                foto, self.cambios_redes = parcial
+                for linea in informe_cambios(self.cambios_redes): print(f"Redes actualizadas: {linea}")
+            else:
+                foto = self._cargar(self.archivos)
+                if foto is not None: avisar_anomalias(foto)
+        except Exception as e:
+            self.error = e
+            self._estados = estados
+            print(f"Error recargando datos base: {e}")
+            return
+        self.error = None
+        self._estados = tuple((ruta, estado) for ruta, estado, _ in foto.firma) if foto is not None else estados
+        self._foto = foto
+        self.recargas += 1
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import threading
+
+from metricas import medido
+
+# --- FOLIOS ---
+# Secuencia en SQLite: BEGIN IMMEDIATE serializa a todos los hilos y procesos que comparten el archivo.
+# folio.txt se sigue escribiendo (temporal + fsync + rename) con el último folio reservado, y sirve
+# de semilla si la base no existe.
+
+class AsignadorFolios:
+    def __init__(self, ruta_db='folios.db', ruta_txt='folio.txt', bloque=1, inicial=1000):
+        self.ruta_db = ruta_db
+        self.ruta_txt = ruta_txt
+        self.bloque = max(1, int(bloque))
+        self.inicial = inicial
+        self._prox = 0
+        self._tope = -1
+        self._lock = threading.Lock()
+
+    def _semilla(self):
+        """Último folio emitido según folio.txt, o inicial - 1 si no hay archivo."""
+        try:
+            with open(self.ruta_txt, 'r') as f: return int(f.read().strip())
+        except FileNotFoundError:
+            return self.inicial - 1
+
+    def _escribir_txt(self, ultimo):
+        tmp = self.ruta_txt + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(ultimo))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.ruta_txt)
+
+    @medido('folio_reserva')
+    def reservar(self, n=1):
+        """Reserva `n` folios consecutivos y devuelve el primero. Los errores se propagan: nunca se repite un folio."""
+        con = sqlite3.connect(self.ruta_db, timeout=30, isolation_level=None)
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                con.execute("CREATE TABLE IF NOT EXISTS folio (id INTEGER PRIMARY KEY CHECK (id = 1), ultimo INTEGER NOT NULL)")
+                fila = con.execute("SELECT ultimo FROM folio WHERE id = 1").fetchone()
+                ultimo = fila[0] if fila else self._semilla()
+                nuevo = ultimo + n
+                con.execute("INSERT INTO folio (id, ultimo) VALUES (1, ?) ON CONFLICT(id) DO UPDATE SET ultimo = excluded.ultimo", (nuevo,))
+                self._escribir_txt(nuevo)
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        finally:
+            con.close()
+        return ultimo + 1
+
+    def siguiente(self):
+        """Próximo folio; con bloque > 1 solo toca disco una vez cada `bloque` folios."""
+        with self._lock:
+            if self._prox > self._tope:
+                inicio = self.reservar(self.bloque)
+                self._prox, self._tope = inicio, inicio + self.bloque - 1
+            folio = self._prox
+            self._prox += 1
+            return folio
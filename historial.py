@@ -0,0 +1,340 @@
+import os
+import csv
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from itertools import islice
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from metricas import contar, tramo
+from analitica import (ESQUEMA_RESUMEN, contar_leads, volcar, reconstruir, resumen, exportar_resumen, contar_propuestas, volcar_propuestas,
+                       reconstruir_propuestas, resumen_planes)
+
+# --- HISTORIAL DE LEADS ---
+# Las cotizaciones se encolan y un hilo las escribe por lotes en SQLite (modo WAL). Un lote que no se puede
+# escribir tras REINTENTOS_LOTE intentos va a <base>_pendientes.csv, que se importa al abrir el almacén.
+# La exportación mantiene las columnas de historial_leads.csv.
+# Por la misma cola van las propuestas PDF (plan recomendado, tabla propuestas; sus pendientes en
+# <base>_propuestas_pendientes.csv). Cada lote suma también a los resúmenes de analitica.py en la misma transacción.
+
+COLUMNAS_HISTORIAL = ['Fecha', 'Cliente', 'Correo', 'Celular', 'Edad_Titular', 'Salud', 'Cobertura_Interes',
+                      'Condicion', 'Clinicas_Preferidas', 'Total_Asegurados', 'Rol_Cotizador']
+COLUMNAS_PROPUESTAS = ['Fecha', 'Folio', 'Aseguradora', 'Plan', 'Cobertura', 'Condicion', 'Rol_Cotizador']
+_COLUMNAS = {'leads': COLUMNAS_HISTORIAL, 'propuestas': COLUMNAS_PROPUESTAS}
+FORMATO_FECHA_CSV = '%d/%m/%Y %H:%M:%S'
+FORMATO_FECHA_DB = '%Y-%m-%d %H:%M:%S'
+REINTENTOS_LOTE = 4
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY,
+    Fecha TEXT NOT NULL,
+    Cliente TEXT, Correo TEXT, Celular TEXT,
+    Edad_Titular INTEGER, Salud TEXT, Cobertura_Interes TEXT, Condicion TEXT,
+    Clinicas_Preferidas TEXT, Total_Asegurados INTEGER, Rol_Cotizador TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_leads_fecha ON leads (Fecha);
+CREATE INDEX IF NOT EXISTS idx_leads_cobertura ON leads (Cobertura_Interes, Fecha);
+CREATE INDEX IF NOT EXISTS idx_leads_rol ON leads (Rol_Cotizador, Fecha);
+CREATE TABLE IF NOT EXISTS propuestas (
+    id INTEGER PRIMARY KEY,
+    Fecha TEXT NOT NULL,
+    Folio INTEGER, Aseguradora TEXT NOT NULL, Plan TEXT NOT NULL,
+    Cobertura TEXT, Condicion TEXT, Rol_Cotizador TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_propuestas_fecha ON propuestas (Fecha);
+"""
+
+def _fila_resumen(fila):
+    """(día, cobertura, edad, clínicas, asegurados) de una fila de leads con Fecha en FORMATO_FECHA_DB."""
+    return fila[0][:10], fila[6], fila[4], fila[8], fila[9]
+
+def _fila_resumen_propuesta(fila):
+    """(día, cobertura, aseguradora, plan) de una fila de propuestas con Fecha en FORMATO_FECHA_DB."""
+    return fila[0][:10], fila[4], fila[2], fila[3]
+
+def _insertar(con, tabla, filas):
+    """Inserta filas de 'leads' o 'propuestas' y las suma a sus resúmenes (dentro de la transacción de `con`)."""
+    columnas = _COLUMNAS[tabla]
+    con.executemany(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})", filas)
+    if tabla == 'leads': volcar(con, contar_leads(map(_fila_resumen, filas)))
+    else: volcar_propuestas(con, contar_propuestas(map(_fila_resumen_propuesta, filas)))
+
+def _fecha_db(valor):
+    if isinstance(valor, datetime): return valor.strftime(FORMATO_FECHA_DB)
+    return datetime.strptime(str(valor), FORMATO_FECHA_CSV).strftime(FORMATO_FECHA_DB)
+
+class AlmacenLeads:
+    def __init__(self, ruta_db='historial_leads.db', intervalo=0.5, max_lote=500):
+        self.ruta_db = ruta_db
+        self.ruta_pendientes = os.path.splitext(ruta_db)[0] + '_pendientes.csv'
+        self.rutas_pendientes = {'leads': self.ruta_pendientes, 'propuestas': os.path.splitext(ruta_db)[0] + '_propuestas_pendientes.csv'}
+        self.intervalo = intervalo
+        self.max_lote = max_lote
+        self.escritos = 0
+        self.errores = 0
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+        with self._conexion() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_ESQUEMA + ESQUEMA_RESUMEN)
+        self._migrar_resumen()
+        self.recuperar_pendientes()
+        atexit.register(self.vaciar)
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta_db, timeout=30)
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    @contextmanager
+    def _conexion(self):
+        con = self._conectar()
+        try:
+            with con: yield con
+        finally:
+            con.close()
+
+    # --- ESCRITURA ---
+    def registrar(self, registro):
+        """Encola un lead (dict con COLUMNAS_HISTORIAL; Fecha como datetime o texto dd/mm/aaaa hh:mm:ss)."""
+        self._encolar('leads', registro)
+
+    def registrar_propuesta(self, registro):
+        """Encola una propuesta PDF emitida (dict con COLUMNAS_PROPUESTAS: folio y plan recomendado)."""
+        self._encolar('propuestas', registro)
+
+    def _encolar(self, tabla, registro):
+        fila = tuple(_fecha_db(registro['Fecha']) if col == 'Fecha' else registro.get(col) for col in _COLUMNAS[tabla])
+        self._cola.put((tabla, fila))
+        self._arrancar_escritor()
+
+    def _arrancar_escritor(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._escritor, name="escritor-leads", daemon=True)
+                self._hilo.start()
+
+    def _escritor(self):
+        con = self._conectar()
+        try:
+            while True:
+                try: lote = [self._cola.get(timeout=5)]
+                except queue.Empty:
+                    # Con el lock de registrar: o se ve el lead recién encolado o registrar arranca otro hilo
+                    with self._lock:
+                        if self._cola.empty():
+                            self._hilo = None
+                            return
+                    continue
+                # Junta lo que llegue durante `intervalo` para escribirlo en una sola transacción
+                limite = time.monotonic() + self.intervalo
+                while len(lote) < self.max_lote:
+                    restante = limite - time.monotonic()
+                    if restante <= 0: break
+                    try: lote.append(self._cola.get(timeout=restante))
+                    except queue.Empty: break
+                self._escribir(con, lote)
+        finally:
+            con.close()
+
+    def _escribir(self, con, lote):
+        por_tabla = {}
+        for tabla, fila in lote: por_tabla.setdefault(tabla, []).append(fila)
+        try:
+            for intento in range(REINTENTOS_LOTE):
+                try:
+                    with tramo('historial_lote'), con:
+                        for tabla, filas in por_tabla.items(): _insertar(con, tabla, filas)
+                    self.escritos += len(por_tabla.get('leads', ()))
+                    contar('leads_guardados', len(por_tabla.get('leads', ())))
+                    contar('propuestas_guardadas', len(por_tabla.get('propuestas', ())))
+                    return
+                except Exception as e:
+                    print(f"Error guardando historial (intento {intento + 1} de {REINTENTOS_LOTE}): {e}")
+                    if intento + 1 < REINTENTOS_LOTE: time.sleep(0.5 * 2 ** intento)
+            for tabla, filas in por_tabla.items(): self._guardar_pendientes(tabla, filas)
+        finally:
+            for _ in lote: self._cola.task_done()
+
+    def _guardar_pendientes(self, tabla, lote):
+        """Agrega el lote al archivo de pendientes de `tabla` (formato de historial_leads.csv) para importarlo después."""
+        ruta = self.rutas_pendientes[tabla]
+        if tabla == 'leads': self.errores += len(lote)
+        try:
+            nuevo = not os.path.exists(ruta)
+            with open(ruta, 'a', newline='', encoding='utf-8-sig' if nuevo else 'utf-8') as f:
+                escritor = csv.writer(f)
+                if nuevo: escritor.writerow(_COLUMNAS[tabla])
+                escritor.writerows((datetime.strptime(fila[0], FORMATO_FECHA_DB).strftime(FORMATO_FECHA_CSV),) + fila[1:] for fila in lote)
+                f.flush()
+                os.fsync(f.fileno())
+            contar(f'{tabla}_a_pendientes', len(lote))
+            print(f"⚠️ {len(lote)} {tabla} guardados en {ruta}")
+        except Exception as e:
+            contar(f'{tabla}_con_error', len(lote))
+            print(f"Error guardando {tabla} pendientes: {e}")
+
+    def recuperar_pendientes(self):
+        """Importa los leads y propuestas de los archivos de pendientes y los borra. Devuelve cuántos leads se importaron."""
+        importados = {}
+        for tabla, ruta in self.rutas_pendientes.items():
+            # Se renombra primero: si hay varios procesos, solo uno lo importa
+            tomado = ruta + '.importando'
+            try: os.replace(ruta, tomado)
+            except OSError: continue
+            try: importados[tabla] = self._importar(tomado, tabla)
+            except Exception as e:
+                os.replace(tomado, ruta)
+                print(f"Error importando {ruta}: {e}")
+                continue
+            os.remove(tomado)
+            print(f"✅ {importados[tabla]} {tabla} pendientes importados desde {ruta}")
+        return importados.get('leads', 0)
+
+    def vaciar(self, timeout=30):
+        """Espera (hasta `timeout` s; None = sin límite) a que todo lo encolado quede escrito. Devuelve True si se escribió todo."""
+        if self._cola.unfinished_tasks: self._arrancar_escritor()
+        with self._cola.all_tasks_done:
+            return self._cola.all_tasks_done.wait_for(lambda: not self._cola.unfinished_tasks, timeout)
+
+    # --- CONSULTA ---
+    def _filtros(self, desde=None, hasta=None, cobertura=None, rol=None):
+        condiciones, params = [], []
+        if desde is not None:
+            condiciones.append("Fecha >= ?"); params.append(desde.strftime(FORMATO_FECHA_DB))
+        if hasta is not None:
+            condiciones.append("Fecha < ?"); params.append(hasta.strftime(FORMATO_FECHA_DB))
+        if cobertura is not None:
+            condiciones.append("Cobertura_Interes = ?"); params.append(cobertura)
+        if rol is not None:
+            condiciones.append("Rol_Cotizador = ?"); params.append(rol)
+        return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), params
+
+    def contar(self, **filtros):
+        where, params = self._filtros(**filtros)
+        with self._conexion() as con:
+            return con.execute(f"SELECT COUNT(*) FROM leads{where}", params).fetchone()[0]
+
+    def consultar(self, pagina=1, por_pagina=50, **filtros):
+        """Página de leads (la más reciente primero) con las columnas del CSV histórico.
+
+        Filtros: desde/hasta (datetime, hasta excluido), cobertura, rol.
+        """
+        where, params = self._filtros(**filtros)
+        sql = f"SELECT {', '.join(COLUMNAS_HISTORIAL)} FROM leads{where} ORDER BY Fecha DESC, id DESC LIMIT ? OFFSET ?"
+        with self._conexion() as con:
+            filas = con.execute(sql, params + [por_pagina, (max(pagina, 1) - 1) * por_pagina]).fetchall()
+        df = pd.DataFrame(filas, columns=COLUMNAS_HISTORIAL)
+        df['Fecha'] = pd.to_datetime(df['Fecha'], format=FORMATO_FECHA_DB).dt.strftime(FORMATO_FECHA_CSV)
+        return df
+
+    def iterar(self, tam_bloque=5000, **filtros):
+        """Recorre los leads en orden cronológico, en bloques de tuplas (sin cargar todo en memoria)."""
+        where, params = self._filtros(**filtros)
+        con = self._conectar()
+        try:
+            cur = con.execute(f"SELECT {', '.join(COLUMNAS_HISTORIAL)} FROM leads{where} ORDER BY Fecha, id", params)
+            while True:
+                filas = cur.fetchmany(tam_bloque)
+                if not filas: return
+                yield [(datetime.strptime(f[0], FORMATO_FECHA_DB).strftime(FORMATO_FECHA_CSV),) + f[1:] for f in filas]
+        finally:
+            con.close()
+
+    def exportar_csv(self, destino, **filtros):
+        """Escribe el historial en el formato de historial_leads.csv. `destino` es una ruta o un archivo de texto abierto."""
+        archivo = open(destino, 'w', newline='', encoding='utf-8-sig') if isinstance(destino, str) else destino
+        try:
+            escritor = csv.writer(archivo)
+            escritor.writerow(COLUMNAS_HISTORIAL)
+            for filas in self.iterar(**filtros):
+                escritor.writerows(filas)
+        finally:
+            if archivo is not destino: archivo.close()
+
+    def importar_csv(self, ruta='historial_leads.csv', solo_si_vacio=False):
+        """Carga un historial_leads.csv existente. Devuelve cuántos leads se importaron.
+
+        Con `solo_si_vacio` no importa nada si la base ya tiene leads (migración única, segura entre procesos).
+        """
+        return self._importar(ruta, 'leads', solo_si_vacio)
+
+    def _importar(self, ruta, tabla, solo_si_vacio=False):
+        total = 0
+        columnas = _COLUMNAS[tabla]
+        con = self._conectar()
+        con.isolation_level = None
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            if solo_si_vacio and con.execute(f"SELECT 1 FROM {tabla} LIMIT 1").fetchone():
+                con.execute("ROLLBACK")
+                return 0
+            for bloque in pd.read_csv(ruta, encoding='utf-8-sig', dtype=str, keep_default_na=False, chunksize=5000):
+                filas = [tuple(_fecha_db(v) if col == 'Fecha' else v for col, v in zip(columnas, fila))
+                         for fila in bloque[columnas].itertuples(index=False)]
+                _insertar(con, tabla, filas)
+                total += len(filas)
+            con.execute("COMMIT")
+        except BaseException:
+            if con.in_transaction: con.execute("ROLLBACK")
+            raise
+        finally:
+            con.close()
+        return total
+
+    # --- ANALÍTICA ---
+    def _migrar_resumen(self):
+        """Base con leads de antes de los resúmenes: se arman una vez desde la tabla de leads."""
+        with self._conexion() as con:
+            if con.execute("SELECT 1 FROM resumen_dia LIMIT 1").fetchone() or not con.execute("SELECT 1 FROM leads LIMIT 1").fetchone(): return
+        self.reconstruir_resumen(solo_si_vacio=True)
+
+    def reconstruir_resumen(self, ruta_csv=None, solo_si_vacio=False, tam_bloque=5000):
+        """Rehace los resúmenes en una pasada desde las tablas de leads y propuestas. Devuelve cuántos leads se contaron.
+
+        Con `ruta_csv` primero se importa ese historial_leads.csv a la tabla (ver importar_csv); solo se admite con la
+        base sin leads (ValueError si no), así los resúmenes nunca cuentan leads que la tabla no tiene.
+        """
+        if ruta_csv is not None:
+            if self.contar(): raise ValueError(f"{self.ruta_db} ya tiene leads: {ruta_csv} solo se importa en una base vacía")
+            self.importar_csv(ruta_csv, solo_si_vacio=True)
+        con = self._conectar()
+        con.isolation_level = None
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            if solo_si_vacio and con.execute("SELECT 1 FROM resumen_dia LIMIT 1").fetchone():
+                con.execute("ROLLBACK")
+                return 0
+            cur = con.execute("SELECT Fecha, Cobertura_Interes, Edad_Titular, Clinicas_Preferidas, Total_Asegurados FROM leads")
+            filas = ((f[0][:10],) + f[1:] for f in cur)
+            total = reconstruir(con, iter(lambda: list(islice(filas, tam_bloque)), []))
+            cur = con.execute("SELECT Fecha, Cobertura, Aseguradora, Plan FROM propuestas")
+            reconstruir_propuestas(con, ((f[0][:10],) + f[1:] for f in cur))
+            con.execute("COMMIT")
+        except BaseException:
+            if con.in_transaction: con.execute("ROLLBACK")
+            raise
+        finally:
+            con.close()
+        return total
+
+    def resumen(self, por=('mes',), **filtros):
+        """Leads por las dimensiones de `por`, leídos de los resúmenes (ver analitica.resumen)."""
+        with self._conexion() as con:
+            return resumen(con, por, **filtros)
+
+    def resumen_planes(self, por=('aseguradora', 'plan'), **filtros):
+        """Propuestas por plan recomendado, leídas de resumen_plan (ver analitica.resumen_planes)."""
+        with self._conexion() as con:
+            return resumen_planes(con, por, **filtros)
+
+    def exportar_resumen(self, destino, tabla='resumen_dia'):
+        with self._conexion() as con:
+            exportar_resumen(con, destino, tabla)
@@ -0,0 +1,53 @@
+"""Importa un libro de redes de clínicas (p. ej. el que manda una aseguradora) y muestra qué cambia.
+
+Uso: python importar_redes.py nuevas_redes.xlsx [--hoja REDES] [--aplicar]
+
+El libro se lee en streaming y se compara con las redes de la foto vigente: clínicas que entran, salen o cambian
+de red por plan. Los planes del libro reemplazan sus redes en base_clinicas.xlsx; los que no vienen quedan igual.
+Con --aplicar se escribe base_clinicas.xlsx; la app y la API toman el cambio sin recargar todo si no hay planes
+nuevos ni quitados. Sin --aplicar solo se muestra el informe.
+"""
+import os
+import sys
+import time
+import argparse
+
+from datos import ARCHIVOS_DATOS, cargar_foto
+from redes import ARCHIVO_REDES, HOJA_REDES, leer_redes, fusionar_redes, entradas_redes, comparar_redes, escribir_redes, informe_cambios
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara un libro de redes con las vigentes y lo incorpora a base_clinicas.xlsx.")
+    parser.add_argument('archivo')
+    parser.add_argument('--hoja', default=HOJA_REDES)
+    parser.add_argument('--aplicar', action='store_true', help=f"escribe el resultado en {ARCHIVO_REDES}")
+    args = parser.parse_args(argv)
+
+    foto = cargar_foto(ARCHIVOS_DATOS)
+    if foto is None:
+        print(f"❌ Faltan precios_<año>.csv o {ARCHIVO_REDES}")
+        return 1
+
+    inicio = time.perf_counter()
+    try:
+        nuevas = leer_redes(args.archivo, args.hoja)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"❌ No se pudo leer {args.archivo}: {e}")
+        return 1
+    filas = fusionar_redes(leer_redes(ARCHIVO_REDES), nuevas)
+    cambios = comparar_redes(foto.indice_clinicas, entradas_redes(filas))
+    print(f"📥 {args.archivo}: {len(nuevas)} filas de {len({(f.aseguradora, f.plan) for f in nuevas})} planes ({time.perf_counter() - inicio:.2f} s)")
+    for linea in informe_cambios(cambios): print(f"   {linea}")
+
+    if not args.aplicar:
+        print("ℹ️ Sin --aplicar no se modifica nada")
+        return 0
+
+    tmp = ARCHIVO_REDES + '.tmp.xlsx'
+    escribir_redes(tmp, filas)
+    os.replace(tmp, ARCHIVO_REDES)
+    if cambios.requiere_recarga: print("⚠️ Cambió el conjunto de planes: la app recargará todos los datos")
+    print(f"✅ {ARCHIVO_REDES} actualizado ({len(filas)} filas). Ejecuta 'actualizar_db.py' para regenerar la foto binaria.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import os
+import io
+import bisect
+import json
+import time
+import pstats
+import cProfile
+import functools
+import threading
+
+# --- MÉTRICAS ---
+# Tramos cronometrados y contadores del proceso. Apagadas (por defecto) cada llamada solo revisa un
+# booleano; se encienden con COTIZADOR_METRICAS=1 o con activar().
+
+# Límites (segundos) del histograma de cada tramo, como los buckets de Prometheus
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _TramoNulo:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULO = _TramoNulo()
+
+class _Tramo:
+    __slots__ = ('registro', 'nombre', 'inicio')
+
+    def __init__(self, registro, nombre):
+        self.registro = registro
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registro.observar(self.nombre, time.perf_counter() - self.inicio)
+        return False
+
+class Registro:
+    def __init__(self, activo=False):
+        self.activo = activo
+        self.desde = time.time()
+        self._tramos = {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def tramo(self, nombre):
+        """Context manager que cronometra el bloque bajo `nombre`."""
+        return _Tramo(self, nombre) if self.activo else _NULO
+
+    def observar(self, nombre, segundos):
+        with self._lock:
+            t = self._tramos.get(nombre)
+            if t is None:
+                t = self._tramos[nombre] = {'n': 0, 'suma': 0.0, 'max': 0.0, 'buckets': [0] * (len(LIMITES) + 1)}
+            t['n'] += 1
+            t['suma'] += segundos
+            if segundos > t['max']: t['max'] = segundos
+            t['buckets'][bisect.bisect_left(LIMITES, segundos)] += 1
+
+    def contar(self, nombre, n=1):
+        if not self.activo: return
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + n
+
+    def limpiar(self):
+        with self._lock:
+            self._tramos.clear()
+            self._contadores.clear()
+            self.desde = time.time()
+
+    # --- CONSULTA Y EXPORTACIÓN ---
+    def resumen(self):
+        """{'tramos': {nombre: {n, suma, media, max, buckets}}, 'contadores': {nombre: n}} (copia)."""
+        with self._lock:
+            tramos = {k: dict(v, buckets=list(v['buckets']), media=v['suma'] / v['n']) for k, v in self._tramos.items()}
+            return {'tramos': tramos, 'contadores': dict(self._contadores)}
+
+    def prometheus(self, prefijo='cotizador'):
+        """Texto en formato de exposición de Prometheus (contadores e histogramas por tramo)."""
+        datos = self.resumen()
+        lineas = []
+        for nombre, valor in sorted(datos['contadores'].items()):
+            lineas += [f"# TYPE {prefijo}_{nombre}_total counter", f"{prefijo}_{nombre}_total {valor}"]
+        if datos['tramos']:
+            lineas.append(f"# TYPE {prefijo}_tramo_segundos histogram")
+        for nombre, t in sorted(datos['tramos'].items()):
+            acumulado = 0
+            for limite, cuenta in zip(LIMITES + ('+Inf',), t['buckets']):
+                acumulado += cuenta
+                lineas.append(f'{prefijo}_tramo_segundos_bucket{{tramo="{nombre}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{prefijo}_tramo_segundos_sum{{tramo="{nombre}"}} {t["suma"]:.6f}')
+            lineas.append(f'{prefijo}_tramo_segundos_count{{tramo="{nombre}"}} {t["n"]}')
+        return "\n".join(lineas) + "\n"
+
+    def json_lineas(self):
+        """Una línea JSON por tramo o contador, con la hora de la exportación."""
+        datos = self.resumen()
+        ahora = time.strftime('%Y-%m-%dT%H:%M:%S')
+        lineas = [json.dumps({'ts': ahora, 'tipo': 'contador', 'nombre': k, 'valor': v}) for k, v in sorted(datos['contadores'].items())]
+        lineas += [json.dumps({'ts': ahora, 'tipo': 'tramo', 'nombre': k, 'n': t['n'], 'suma_s': t['suma'], 'media_s': t['media'], 'max_s': t['max']})
+                   for k, t in sorted(datos['tramos'].items())]
+        return "\n".join(lineas) + "\n"
+
+REGISTRO = Registro(activo=os.environ.get('COTIZADOR_METRICAS', '') not in ('', '0'))
+
+def tramo(nombre):
+    return REGISTRO.tramo(nombre)
+
+def contar(nombre, n=1):
+    REGISTRO.contar(nombre, n)
+
+def activar(activo=True):
+    REGISTRO.activo = activo
+
+def medido(nombre):
+    """Decorador: cronometra cada llamada a la función bajo `nombre`."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not REGISTRO.activo: return funcion(*args, **kwargs)
+            with _Tramo(REGISTRO, nombre): return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+# --- PERFILADO ---
+def perfilar(funcion, *args, lineas=30, orden='cumulative', **kwargs):
+    """Ejecuta `funcion` una vez bajo cProfile. Devuelve (resultado, informe de texto de pstats)."""
+    perfil = cProfile.Profile()
+    resultado = perfil.runcall(funcion, *args, **kwargs)
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).strip_dirs().sort_stats(orden).print_stats(lineas)
+    return resultado, salida.getvalue()
@@ -0,0 +1,349 @@
+import os
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+from metricas import medido
+from tarifas import EDAD_MAXIMA, anio_vigente, archivos_tarifa, compilar_tarifas, leer_tarifa, precios_tarifa, validar_tarifa
+from redes import ARCHIVO_REDES, leer_redes, lista_clinicas, tabla_redes
+
+# --- MOTOR DE COTIZACIÓN ---
+# Sin dependencias de Streamlit: lo usan app.py y los procesos por lotes.
+
+COBERTURAS = ["Básica", "Integral", "Integral + Reembolso", "Integral + Cobertura Internacional"]
+CONDICIONES = ["Nuevo", "Vengo con continuidad"]
+
+
+class PlanCatalogo(NamedTuple):
+    """Datos fijos de un plan, armados una vez por carga (el nivel de cobertura viene de info_adicional.csv)."""
+    aseguradora: str
+    plan: str
+    nivel_cobertura: str
+    acepta_continuidad: bool
+    link_cartilla: str
+    link_carencia: str
+    int_ded_amb: str
+    int_reem_amb: str
+    int_ded_hosp: str
+    int_reem_hosp: str
+
+# --- CARGA DE DATOS ---
+def construir_indice_clinicas(df_redes):
+    """Índice invertido clínica -> planes que la cubren, con la red y coberturas de cada plan.
+
+    Para cada (clínica, plan) vale la primera red del plan que incluye la clínica. Todo queda en arreglos
+    (ver indexar_clinicas) para que la foto binaria los abra con mmap y los procesos compartan una copia.
+    """
+    planes, primera_red, tripletas, entradas = [], [], {}, {}
+    for j, ((cia, plan), grupo) in enumerate(df_redes.groupby(['Aseguradora', 'Plan'])):
+        planes.append((cia, plan))
+        filas = zip(grupo['Nombre_Red'], grupo['Cobertura_Amb'], grupo['Cobertura_Hosp'], grupo['Clinicas_Busqueda'])
+        for k, (red, amb, hosp, txt) in enumerate(filas):
+            t = tripletas.setdefault((str(red), str(amb), str(hosp)), len(tripletas))
+            if k == 0: primera_red.append(t)
+            for cli in str(txt).split(','):
+                entradas.setdefault((cli.strip(), j), t)
+
+    clinicas = sorted({cli for cli, _ in entradas})
+    codigos = {cli: i for i, cli in enumerate(clinicas)}
+    orden = sorted((codigos[cli], j, t) for (cli, j), t in entradas.items())
+    cod = np.array([i for i, _, _ in orden], dtype=np.int64)
+    return indexar_clinicas(
+        planes, clinicas, np.array(primera_red, dtype=np.int64), np.array(list(tripletas), dtype=str).reshape(len(tripletas), 3),
+        np.searchsorted(cod, np.arange(len(clinicas) + 1)), np.array([j for _, j, _ in orden], dtype=np.int64),
+        np.array([t for _, _, t in orden], dtype=np.int64))
+
+def indexar_clinicas(planes, clinicas, primera_red, tripletas, red_inicio, red_plan, red_tripleta, matriz=None):
+    """Arma el índice de clínicas a partir de sus arreglos (leídos de las fuentes o de la foto binaria).
+
+    `tripletas` tiene cada (Nombre_Red, Cobertura_Amb, Cobertura_Hosp) distinta una vez; `primera_red[j]` es la
+    del plan j. Las entradas (clínica, plan) van ordenadas por clínica: las de la clínica i están entre
+    red_inicio[i] y red_inicio[i+1], con el plan en `red_plan` y su tripleta en `red_tripleta`.
+    `matriz` (clínica x plan) marca las mismas entradas para filtrar planes por clínica.
+    """
+    if matriz is None:
+        matriz = np.zeros((len(clinicas), len(planes)), dtype=bool)
+        matriz[np.repeat(np.arange(len(clinicas)), np.diff(red_inicio)), red_plan] = True
+    return {'planes': planes, 'clinicas': clinicas, 'codigos': {cli: i for i, cli in enumerate(clinicas)}, 'primera_red': primera_red,
+            'tripletas': tripletas, 'red_inicio': red_inicio, 'red_plan': red_plan, 'red_tripleta': red_tripleta, 'matriz': matriz}
+
+def datos_red(indice_clinicas, j, cli=None):
+    """(Nombre_Red, Cobertura_Amb, Cobertura_Hosp) del plan j para la clínica `cli`; sin clínica, la primera red del plan."""
+    if cli is None:
+        t = indice_clinicas['primera_red'][j]
+    else:
+        i = indice_clinicas['codigos'][cli]
+        inicio, fin = indice_clinicas['red_inicio'][i], indice_clinicas['red_inicio'][i + 1]
+        t = indice_clinicas['red_tripleta'][inicio + np.searchsorted(indice_clinicas['red_plan'][inicio:fin], j)]
+    return tuple(indice_clinicas['tripletas'][t].tolist())
+
+def construir_catalogo(df_precios, indice_clinicas):
+    """Un PlanCatalogo por (Aseguradora, Plan) y máscaras por nivel de cobertura sobre indice_clinicas['planes']."""
+    planes = {}
+    for data in df_precios.drop_duplicates(subset=['Aseguradora', 'Plan']).to_dict('records'):
+        planes[(data['Aseguradora'], data['Plan'])] = PlanCatalogo(
+            aseguradora=data['Aseguradora'], plan=data['Plan'],
+            nivel_cobertura=str(data.get('Nivel_Cobertura', '-')).strip(),
+            acepta_continuidad=str(data.get('Acepta_Continuidad', '-')).strip().lower() not in ('false', '0', 'no'),
+            link_cartilla=data.get('Link_Cartilla', ''),
+            link_carencia=data.get('Link_Carencia', ''),
+            int_ded_amb=str(data.get('Int_Ded_Amb_Pre', '-')),
+            int_reem_amb=str(data.get('Int_Reem_Amb_Sin', '-')),
+            int_ded_hosp=str(data.get('Int_Ded_Hosp_Pre', '-')),
+            int_reem_hosp=str(data.get('Int_Reem_Hosp_Sin', '-')),
+        )
+    return indexar_catalogo(planes, indice_clinicas)
+
+def indexar_catalogo(planes, indice_clinicas):
+    # Solo entran a las máscaras los planes con red y tarifa
+    n = len(indice_clinicas['planes'])
+    mascara_cobertura, mascara_continuidad = {}, np.zeros(n, dtype=bool)
+    for j, key in enumerate(indice_clinicas['planes']):
+        reg = planes.get(key)
+        if reg is None: continue
+        mascara_cobertura.setdefault(reg.nivel_cobertura, np.zeros(n, dtype=bool))[j] = True
+        mascara_continuidad[j] = reg.acepta_continuidad
+
+    por_cobertura = {nivel: [indice_clinicas['planes'][j] for j in np.flatnonzero(m)] for nivel, m in mascara_cobertura.items()}
+    return {'planes': planes, 'por_cobertura': por_cobertura, 'mascara_cobertura': mascara_cobertura, 'mascara_continuidad': mascara_continuidad}
+
+def cargar_fuentes():
+    """Lee tarifas (todos los precios_<año>.csv), info adicional y redes. Devuelve None si faltan archivos; los errores de lectura se propagan.
+
+    Las tarifas se validan al leerlas: `anomalias` = {año: [Anomalia]} (no impiden la carga).
+    """
+    tarifas = {anio: leer_tarifa(ruta) for anio, ruta in archivos_tarifa()}
+    if not tarifas or not os.path.exists(ARCHIVO_REDES):
+        return None
+
+    # Una fila por plan y edad de todos los años; el año vigente primero (sus datos mandan en el catálogo)
+    vigente = anio_vigente(list(tarifas))
+    df_precios = pd.concat([tarifas[vigente]] + [df for anio, df in tarifas.items() if anio != vigente], ignore_index=True)
+
+    if os.path.exists('info_adicional.csv'):
+        try: df_int = pd.read_csv('info_adicional.csv')
+        except: df_int = pd.read_csv('info_adicional.csv', sep=';')
+
+        df_int['Aseguradora'] = df_int['Aseguradora'].astype(str).str.strip()
+        df_int['Plan'] = df_int['Plan'].astype(str).str.strip()
+        cols_drop = [c for c in df_int.columns if c in df_precios.columns and c not in ['Aseguradora','Plan']]
+        df_precios = df_precios.drop(columns=cols_drop, errors='ignore')
+        df_precios = pd.merge(df_precios, df_int, on=['Aseguradora','Plan'], how='left')
+
+    cols_seguras = ['Cob_Int_Amb', 'Cob_Int_Hosp', 'Link_Carencia', 'Link_Cartilla', 'Int_Ded_Amb_Pre', 'Int_Reem_Amb_Sin', 'Int_Ded_Hosp_Pre', 'Int_Reem_Hosp_Sin', 'Tiene_Int', 'Nivel_Cobertura', 'Acepta_Continuidad']
+    for col in cols_seguras:
+        if col not in df_precios.columns: df_precios[col] = "-"
+        df_precios[col] = df_precios[col].fillna("-")
+
+    # Misma lectura (streaming) que usa datos.actualizar_redes para aplicar solo los cambios de red
+    filas_redes = leer_redes(ARCHIVO_REDES)
+    df_redes = tabla_redes(filas_redes)
+    clinicas_unicas = lista_clinicas(filas_redes)
+
+    indice_precios = compilar_tarifas(tarifas)
+    anomalias = {anio: validar_tarifa(df) for anio, df in tarifas.items()}
+    indice_clinicas = construir_indice_clinicas(df_redes)
+    catalogo = construir_catalogo(df_precios, indice_clinicas)
+
+    return df_precios, df_redes, clinicas_unicas, indice_precios, indice_clinicas, catalogo, anomalias
+
+MESES = {1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
+         7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"}
+
+def _descuento(descuentos, j, key):
+    """Descuento de un plan: `descuentos` es un dict {(cia, plan): pct} o un vector alineado con indice_clinicas['planes']."""
+    if descuentos is None: return 0
+    if isinstance(descuentos, dict): return descuentos.get(key, 0)
+    return descuentos[j]
+
+# --- BÚSQUEDA ---
+def planes_elegibles(catalogo, cobertura, es_continuidad):
+    """Máscara (sobre indice_clinicas['planes']) de los planes del nivel pedido que admiten la condición del cliente. Solo lectura."""
+    mascara = catalogo['mascara_cobertura'].get(cobertura)
+    if mascara is None: return np.zeros_like(catalogo['mascara_continuidad'])
+    return mascara & catalogo['mascara_continuidad'] if es_continuidad else mascara
+
+def calcular_precio(indice, cia, plan, familia):
+    fila = indice['offsets'].get((cia, plan))
+    if fila is None: return None
+    edades = np.minimum([int(p['edad']) for p in familia], EDAD_MAXIMA)
+    salud = [0 if p['salud']=='Sano' else 1 for p in familia]
+    precios = precios_tarifa(indice, fila, edades, salud)
+    if not (precios > 0).all(): return None
+    return float(precios.sum())
+
+@medido('buscar')
+def buscar(catalogo, indice_clinicas, indice_precios, familia, clinicas_user, continuidad, cobertura, descuentos):
+    return aplicar_descuentos(buscar_base(catalogo, indice_clinicas, indice_precios, familia, clinicas_user, continuidad, cobertura), descuentos)
+
+@medido('buscar_base')
+def buscar_base(catalogo, indice_clinicas, indice_precios, familia, clinicas_user, continuidad, cobertura):
+    """Etapa de buscar que no depende de los descuentos: planes elegibles, precio de lista y coberturas.
+
+    Las columnas de precio salen sin descuento y en el orden de los candidatos; aplicar_descuentos completa el resultado.
+    Las coberturas van como datos (ver presentacion.py): Coberturas = ((clínica, red, amb, hosp), ...), con
+    clínica None si no se pidieron clínicas, e Int_Amb / Int_Hosp = (deducible, reembolso).
+    """
+    es_continuidad = (continuidad == "Vengo con continuidad")
+
+    # Nivel de cobertura + continuidad + todas las clínicas pedidas: intersección de máscaras
+    elegibles = planes_elegibles(catalogo, cobertura, es_continuidad)
+    for cli in set(clinicas_user):
+        i = indice_clinicas['codigos'].get(cli)
+        elegibles = elegibles & indice_clinicas['matriz'][i] if i is not None else np.zeros_like(elegibles)
+
+    posiciones, precios = [], []
+    for j in np.flatnonzero(elegibles).tolist():
+        base = calcular_precio(indice_precios, *indice_clinicas['planes'][j], familia)
+        if base is None: continue
+        posiciones.append(j)
+        precios.append(base)
+    return armar_base(catalogo, indice_clinicas, posiciones, precios, clinicas_user)
+
+def armar_base(catalogo, indice_clinicas, posiciones, precios, clinicas_user):
+    """Filas de buscar_base para los planes `posiciones` (sobre indice_clinicas['planes']) con su precio de lista.
+
+    Sirve también para rehacer un resultado guardado en forma compacta (ver sesiones.py) sin volver a cotizar.
+    """
+    candidatos = []
+    for j, base in zip(posiciones, precios):
+        cia, plan = indice_clinicas['planes'][j]
+        data = catalogo['planes'][(cia, plan)]
+
+        if not clinicas_user: coberturas = ((None, *datos_red(indice_clinicas, j)),)
+        else: coberturas = tuple((cli, *datos_red(indice_clinicas, j, cli)) for cli in clinicas_user)
+
+        candidatos.append({
+            'Aseguradora': cia, 'Plan': plan,
+            'Coberturas': coberturas,
+            'Int_Amb': (data.int_ded_amb, data.int_reem_amb),
+            'Int_Hosp': (data.int_ded_hosp, data.int_reem_hosp),
+            'Precio_Final': base,
+            'Precio_Lista': base,
+            'Ahorro_Soles': 0.0,
+            'Pct_Dscto': 0,
+            'Precio_Mensual': base/12,
+            'Link_Cartilla': data.link_cartilla,
+            'Link_Carencia': data.link_carencia,
+            'ID': f"{cia}-{plan}",
+            'Pos_Plan': j
+        })
+
+    if not candidatos: return pd.DataFrame()
+    return pd.DataFrame(candidatos)
+
+@medido('aplicar_descuentos')
+def aplicar_descuentos(base, descuentos):
+    """Precios con descuento sobre el resultado de buscar_base, ordenados por Precio_Final. No modifica `base`.
+
+    `descuentos` es un dict {(cia, plan): pct} o un vector de CampanasCompiladas (se indexa con Pos_Plan).
+    """
+    if base.empty: return base
+    res = base.copy()
+    if isinstance(descuentos, dict): dsc = np.array([descuentos.get(k, 0) for k in zip(res['Aseguradora'], res['Plan'])])
+    else: dsc = np.asarray(descuentos)[res['Pos_Plan'].to_numpy()]
+    lista = res['Precio_Lista'].to_numpy()
+    final = lista * (1 - dsc/100)
+    res['Precio_Final'] = final
+    res['Ahorro_Soles'] = lista - final
+    res['Pct_Dscto'] = dsc
+    res['Precio_Mensual'] = final/12
+    return res.sort_values('Precio_Final')
+
+# --- COTIZACIÓN POR LOTES ---
+COLUMNAS_LOTE = ['Lead', 'Aseguradora', 'Plan', 'ID', 'Precio_Lista', 'Pct_Dscto', 'Precio_Final', 'Ahorro_Soles', 'Precio_Mensual']
+
+def _lista(valor):
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)): return []
+    if isinstance(valor, str): return [v.strip() for v in valor.split(',') if v.strip()]
+    return list(valor)
+
+def familias_desde_historial(df_hist):
+    """Convierte historial_leads.csv al formato de buscar_lote.
+
+    El historial solo guarda la edad y salud del titular, así que cada lead se cotiza como titular solo.
+    """
+    return pd.DataFrame({
+        'Edades': [[e] for e in df_hist['Edad_Titular']],
+        'Salud': [[s] for s in df_hist['Salud']],
+        'Continuidad': df_hist['Condicion'].to_numpy(),
+        'Cobertura': df_hist['Cobertura_Interes'].to_numpy(),
+        'Clinicas': df_hist['Clinicas_Preferidas'].to_numpy(),
+    }, index=df_hist.index)
+
+@medido('buscar_lote')
+def buscar_lote(catalogo, indice_clinicas, indice_precios, familias, descuentos=None):
+    """Cotiza muchas familias contra todos los planes en una sola pasada.
+
+    `familias` tiene una fila por lead con las columnas Edades, Salud, Continuidad, Cobertura y
+    Clinicas (listas o textos separados por comas; una sola Salud vale para toda la familia).
+    `descuentos` va por tipo de cliente, como en campana_descuentos.csv:
+    {'Nuevo': {(cia, plan): pct}, 'Continuidad': {...}} (o el vector de CampanasCompiladas de cada tipo).
+    Devuelve una fila por (lead, plan compatible); la columna Lead es el índice de `familias`.
+    """
+    descuentos = descuentos or {}
+    n_leads = len(familias)
+
+    # Planes candidatos (con tarifa), en el mismo orden que buscar
+    planes = [(j, cia, plan, indice_precios['offsets'][(cia, plan)])
+              for j, (cia, plan) in enumerate(indice_clinicas['planes']) if (cia, plan) in indice_precios['offsets']]
+    if n_leads == 0 or not planes: return pd.DataFrame(columns=COLUMNAS_LOTE)
+
+    # Miembros de todas las familias en un solo vector, agrupados por lead
+    edades_fam = [_lista(x) for x in familias['Edades']]
+    salud_fam = [_lista(x) for x in familias['Salud']]
+    tam = np.array([len(e) for e in edades_fam], dtype=np.intp)
+    if (tam == 0).any(): raise ValueError("Cada familia debe tener al menos una edad")
+    for i, (e, s) in enumerate(zip(edades_fam, salud_fam)):
+        if len(s) == 1 and len(e) > 1: salud_fam[i] = s * len(e)
+        elif len(s) != len(e): raise ValueError(f"Edades y Salud no coinciden en la fila {i}")
+    edades = np.minimum(np.array([int(e) for fam in edades_fam for e in fam], dtype=np.intp), EDAD_MAXIMA)
+    salud = np.array([0 if s == 'Sano' else 1 for fam in salud_fam for s in fam], dtype=np.intp)
+    inicio = np.concatenate(([0], np.cumsum(tam)[:-1]))
+
+    # Clínicas pedidas como pares (lead, código); las desconocidas no las cubre ningún plan
+    vocab = indice_clinicas['codigos']
+    desconocida = len(vocab)
+    pares_lead, pares_cli = [], []
+    for i, clis in enumerate(familias['Clinicas']):
+        for c in set(_lista(clis)):
+            pares_lead.append(i)
+            pares_cli.append(vocab.get(c, desconocida))
+    pares_lead = np.array(pares_lead, dtype=np.intp)
+    pares_cli = np.array(pares_cli, dtype=np.intp)
+
+    # Reglas de cobertura/continuidad: se evalúan una vez por combinación distinta
+    es_cont = (familias['Continuidad'] == "Vengo con continuidad").to_numpy()
+    combos, cod_combo = np.unique(np.array([f"{c}|{int(e)}" for c, e in zip(familias['Cobertura'], es_cont)]), return_inverse=True)
+    columnas = [j for j, _, _, _ in planes]
+    reglas = np.array([planes_elegibles(catalogo, combo.rsplit('|', 1)[0], combo.endswith('|1'))[columnas] for combo in combos])
+
+    bloques = []
+    for k, (j, cia, plan, fila) in enumerate(planes):
+        ok = reglas[cod_combo, k]
+
+        if len(pares_cli):
+            cubre = np.append(indice_clinicas['matriz'][:, j], False)
+            faltantes = np.bincount(pares_lead, weights=~cubre[pares_cli], minlength=n_leads)
+            ok &= (faltantes == 0)
+
+        precios = precios_tarifa(indice_precios, fila, edades, salud)
+        ok &= np.minimum.reduceat(precios, inicio) > 0
+        if not ok.any(): continue
+
+        leads = np.flatnonzero(ok)
+        base = np.add.reduceat(precios, inicio)[leads]
+        dsc_nuevo = _descuento(descuentos.get('Nuevo'), j, (cia, plan))
+        dsc_cont = _descuento(descuentos.get('Continuidad'), j, (cia, plan))
+        dsc = np.where(es_cont[leads], dsc_cont, dsc_nuevo)
+        final = base * (1 - dsc/100)
+        bloques.append(pd.DataFrame({
+            'Pos': leads, 'Aseguradora': cia, 'Plan': plan, 'ID': f"{cia}-{plan}",
+            'Precio_Lista': base, 'Pct_Dscto': dsc, 'Precio_Final': final,
+            'Ahorro_Soles': base - final, 'Precio_Mensual': final/12,
+        }))
+
+    if not bloques: return pd.DataFrame(columns=COLUMNAS_LOTE)
+    res = pd.concat(bloques, ignore_index=True).sort_values(['Pos', 'Precio_Final'], kind='stable')
+    res.insert(0, 'Lead', familias.index.to_numpy()[res['Pos'].to_numpy()])
+    return res.drop(columns='Pos').reset_index(drop=True)
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import uuid
+import smtplib
+import threading
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from metricas import contar, tramo
+
+# --- NOTIFICACIONES ---
+# Los correos se guardan primero en una carpeta de spool y un hilo los envía después, así la
+# cotización no espera al servidor de correo y un reinicio no pierde avisos pendientes.
+# Un aviso que el servidor rechaza (o un archivo ilegible) va a <spool>/fallidos tras `max_intentos`, para no
+# trabar a los que vienen detrás; los errores de conexión no cuentan como intento de ese aviso.
+
+# Errores del propio mensaje: se anota el intento y se sigue con el siguiente. Cualquier otro error
+# (conexión, login, servidor caído) corta la pasada y se reintenta todo con espera exponencial.
+ERRORES_MENSAJE = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+CARPETA_FALLIDOS = 'fallidos'
+
+class TransporteSMTP:
+    """Conexión SMTP persistente: se reutiliza entre envíos y se reabre (con login) si el servidor la cerró."""
+
+    def __init__(self, servidor, puerto, usuario=None, clave=None, starttls=True, timeout=30):
+        self.servidor = servidor
+        self.puerto = puerto
+        self.usuario = usuario
+        self.clave = clave
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp = None
+
+    def _conexion(self):
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250: return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.cerrar()
+        smtp = smtplib.SMTP(self.servidor, self.puerto, timeout=self.timeout)
+        if self.starttls: smtp.starttls()
+        if self.usuario: smtp.login(self.usuario, self.clave)
+        self._smtp = smtp
+        return smtp
+
+    def enviar(self, remitente, destinatarios, mensaje):
+        self._conexion().sendmail(remitente, destinatarios, mensaje)
+
+    def cerrar(self):
+        if self._smtp is None: return
+        try: self._smtp.quit()
+        except Exception: pass
+        self._smtp = None
+
+def armar_mensaje(remitente, destinatario, asunto, cuerpo):
+    msg = MIMEMultipart()
+    msg['From'] = remitente
+    msg['To'] = destinatario
+    msg['Subject'] = asunto
+    msg.attach(MIMEText(cuerpo, 'plain'))
+    return msg.as_string()
+
+class DespachadorNotificaciones:
+    """Envía en segundo plano los correos del spool.
+
+    Los avisos que llegan dentro de `ventana` segundos salen juntos por la misma conexión; si el envío
+    falla se reintenta con espera exponencial (hasta `espera_maxima`). `transporte` es cualquier objeto con
+    enviar(remitente, destinatarios, mensaje) y cerrar(), por ejemplo un TransporteSMTP hacia un servidor local de pruebas.
+    """
+
+    def __init__(self, transporte, remitente, destinatario, carpeta_spool='spool_correos',
+                 ventana=2.0, espera_inicial=5.0, espera_maxima=300.0, inactividad=60.0, max_intentos=5, antiguedad=600):
+        self.transporte = transporte
+        self.remitente = remitente
+        self.destinatario = destinatario
+        self.carpeta = carpeta_spool
+        self.ventana = ventana
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.inactividad = inactividad
+        self.max_intentos = max_intentos
+        self.antiguedad = antiguedad
+        self.fallidos = os.path.join(carpeta_spool, CARPETA_FALLIDOS)
+        self.enviados = 0
+        self.fallos = 0
+        self.descartados = 0
+        self.ultimo_error = None
+        self._aviso = threading.Event()
+        self._parar = threading.Event()
+        os.makedirs(self.fallidos, exist_ok=True)
+        self._recuperar_reclamados()
+        self._hilo = threading.Thread(target=self._trabajar, name="despachador-correos", daemon=True)
+        self._hilo.start()
+
+    # --- SPOOL ---
+    def encolar(self, asunto, cuerpo):
+        """Guarda el aviso en el spool (escritura atómica) y despierta al hilo de envío."""
+        nombre = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:8]}.json"
+        ruta = os.path.join(self.carpeta, nombre)
+        with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'asunto': asunto, 'cuerpo': cuerpo, 'intentos': 0}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta + '.tmp', ruta)
+        self._aviso.set()
+
+    def pendientes(self):
+        return sorted(n for n in os.listdir(self.carpeta) if n.endswith('.json'))
+
+    def _recuperar_reclamados(self):
+        """Vuelve al spool lo que quedó a medias hace más de `antiguedad` s: archivos reclamados por un envío que
+        no terminó (proceso caído) y .tmp de encolar. Un .tmp que no se puede leer se borra."""
+        ahora = time.time()
+        for n in os.listdir(self.carpeta):
+            if '.json.' not in n: continue
+            ruta = os.path.join(self.carpeta, n)
+            try:
+                if ahora - os.path.getmtime(ruta) <= self.antiguedad: continue
+                if n.endswith('.tmp'):
+                    try:
+                        with open(ruta, encoding='utf-8') as f: json.load(f)
+                    except ValueError:
+                        os.remove(ruta)
+                        continue
+                os.replace(ruta, ruta.rsplit('.json.', 1)[0] + '.json')
+            except OSError:
+                pass
+
+    def _reclamar(self, nombre):
+        """Renombra el archivo para que otro proceso que comparta el spool no lo envíe también."""
+        origen = os.path.join(self.carpeta, nombre)
+        destino = f"{origen}.{os.getpid()}"
+        try:
+            os.replace(origen, destino)
+            os.utime(destino)
+            return destino
+        except OSError:
+            return None
+
+    # --- ENVÍO ---
+    def _trabajar(self):
+        espera = self.espera_inicial
+        while not self._parar.is_set():
+            if not self.pendientes():
+                if not self._aviso.wait(timeout=self.inactividad):
+                    self.transporte.cerrar()
+                self._aviso.clear()
+                continue
+            # Ventana corta para juntar los avisos que lleguen casi a la vez
+            time.sleep(self.ventana)
+            self._aviso.clear()
+            self._recuperar_reclamados()
+            if self._enviar_pendientes():
+                espera = self.espera_inicial
+            else:
+                self._parar.wait(timeout=espera)
+                espera = min(espera * 2, self.espera_maxima)
+
+    def _enviar_pendientes(self):
+        """Una pasada por el spool. Devuelve False si algún aviso falló (la pasada se corta solo por errores de conexión)."""
+        todo_bien = True
+        for nombre in self.pendientes():
+            ruta = self._reclamar(nombre)
+            if ruta is None: continue
+            try:
+                with open(ruta, encoding='utf-8') as f: datos = json.load(f)
+                mensaje = armar_mensaje(self.remitente, self.destinatario, datos['asunto'], datos['cuerpo'])
+            except (ValueError, KeyError, TypeError) as e:
+                self._descartar(ruta, f"archivo ilegible: {e}")
+                continue
+            try:
+                with tramo('smtp_envio'):
+                    self.transporte.enviar(self.remitente, [self.destinatario], mensaje)
+            except Exception as e:
+                self.fallos += 1
+                contar('correos_fallidos')
+                self.ultimo_error = e
+                print(f"Error enviando correo: {e}")
+                todo_bien = False
+                if isinstance(e, ERRORES_MENSAJE):
+                    datos['intentos'] = datos.get('intentos', 0) + 1
+                    if datos['intentos'] >= self.max_intentos: self._descartar(ruta, f"{datos['intentos']} intentos, último error: {e}", datos)
+                    else: self._devolver(ruta, datos)
+                    continue
+                self.transporte.cerrar()
+                self._devolver(ruta)
+                return False
+            os.remove(ruta)
+            self.enviados += 1
+            contar('correos_enviados')
+        return todo_bien
+
+    def _devolver(self, ruta, datos=None):
+        destino = ruta.rsplit('.json.', 1)[0] + '.json'
+        if datos:
+            with open(ruta, 'w', encoding='utf-8') as f: json.dump(datos, f, ensure_ascii=False)
+        os.replace(ruta, destino)
+
+    def _descartar(self, ruta, motivo, datos=None):
+        """Mueve el aviso a la carpeta de fallidos (no se reintenta más)."""
+        if datos:
+            with open(ruta, 'w', encoding='utf-8') as f: json.dump(datos, f, ensure_ascii=False)
+        destino = os.path.join(self.fallidos, os.path.basename(ruta).rsplit('.json.', 1)[0] + '.json')
+        os.replace(ruta, destino)
+        self.descartados += 1
+        contar('correos_descartados')
+        print(f"⚠️ Correo movido a {destino} ({motivo})")
+
+    def vaciar(self, timeout=30):
+        """Espera (hasta `timeout` s) a que el spool quede vacío. Devuelve True si se envió todo."""
+        self._aviso.set()
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            if not any(n.endswith('.json') or '.json.' in n for n in os.listdir(self.carpeta)): return True
+            time.sleep(0.05)
+        return False
+
+    def detener(self):
+        self._parar.set()
+        self._aviso.set()
+        self._hilo.join(timeout=5)
+        self.transporte.cerrar()
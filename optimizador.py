@@ -0,0 +1,227 @@
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+from metricas import medido
+from motor import COBERTURAS, EDAD_MAXIMA, planes_elegibles, _descuento
+from tarifas import precios_tarifa
+
+# --- OPTIMIZADOR DE PÓLIZAS ---
+# buscar cotiza a toda la familia en un mismo plan. Aquí los miembros se reparten entre varias pólizas
+# (p. ej. los mayores de 60 en un plan y los hijos en otro), todas con las clínicas pedidas y al menos el
+# nivel de cobertura pedido, y se devuelve el frente de Pareto costo / nivel de cobertura.
+#
+# Reglas: a lo más `max_polizas` planes distintos y cada póliza con un titular (un mayor de edad; si la
+# familia no tiene ninguno, el primer miembro). El puntaje de cobertura suma, por miembro, cuántos niveles
+# de COBERTURAS está por encima del pedido (0 = todos en el nivel pedido).
+#
+# Búsqueda: ramificación y poda sobre los conjuntos de planes (en orden de precio para toda la familia).
+# Cada conjunto se resuelve exacto con una programación dinámica (miembro x pólizas con titular x puntaje);
+# una rama se poda si, aun eligiendo cada miembro por su cuenta entre los planes que le quedan, no mejora
+# el frente para ningún puntaje.
+
+MAX_POLIZAS = 3
+EDAD_TITULAR = 18
+
+class Poliza(NamedTuple):
+    pos_plan: int            # posición en indice_clinicas['planes']
+    aseguradora: str
+    plan: str
+    nivel_cobertura: str
+    miembros: tuple          # índices en `familia`
+    precio_lista: float
+    precio_final: float
+
+class Asignacion(NamedTuple):
+    precio_final: float
+    puntaje: int
+    polizas: tuple           # de Poliza
+
+def _planes_candidatos(catalogo, indice_clinicas, indice_precios, clinicas_user, continuidad, cobertura):
+    """Planes con tarifa que cubren todas las clínicas y admiten la condición, de nivel >= cobertura: (posiciones, niveles)."""
+    es_continuidad = (continuidad == "Vengo con continuidad")
+    cubre = np.ones(len(indice_clinicas['planes']), dtype=bool)
+    for cli in set(clinicas_user):
+        i = indice_clinicas['codigos'].get(cli)
+        cubre = cubre & indice_clinicas['matriz'][i] if i is not None else np.zeros_like(cubre)
+
+    posiciones, niveles = [], []
+    for nivel, nombre in enumerate(COBERTURAS[COBERTURAS.index(cobertura):]):
+        for j in np.flatnonzero(planes_elegibles(catalogo, nombre, es_continuidad) & cubre).tolist():
+            if indice_clinicas['planes'][j] not in indice_precios['offsets']: continue
+            posiciones.append(j)
+            niveles.append(nivel)
+    return np.array(posiciones, dtype=np.intp), np.array(niveles, dtype=np.intp)
+
+def _no_dominados(precios, niveles):
+    """Máscara de los planes que no sobran: sobra p si otro plan tiene nivel >= y precio <= para cada miembro.
+
+    Cambiar p por ese plan en cualquier asignación no sube el costo ni baja el puntaje. Entre planes idénticos queda el primero.
+    """
+    k = len(niveles)
+    domina = (precios[:, None, :] <= precios[None, :, :]).all(axis=2) & (niveles[:, None] >= niveles[None, :])
+    empate = domina & domina.T
+    domina &= ~empate | (np.arange(k)[:, None] < np.arange(k)[None, :])
+    np.fill_diagonal(domina, False)
+    return ~domina.any(axis=0)
+
+def _curva(minimos):
+    """Costo mínimo de cada puntaje si cada miembro eligiera por su cuenta, con `minimos` = miembro x nivel (cota inferior)."""
+    curva = np.zeros(1)
+    for fila in minimos:
+        nueva = np.full(len(curva) + len(fila) - 1, np.inf)
+        for nivel, costo in enumerate(fila):
+            if costo < np.inf: nueva[nivel:nivel + len(curva)] = np.minimum(nueva[nivel:nivel + len(curva)], curva + costo)
+        curva = nueva
+    return curva
+
+def _resolver(precios, niveles, titulares, conjunto, largo):
+    """Tablas de la programación dinámica de un conjunto de planes: tablas[i][mascara, puntaje] = costo mínimo de los
+    primeros i miembros, donde `mascara` marca las pólizas del conjunto que ya tienen titular."""
+    completas = 1 << len(conjunto)
+    con_bit = [np.array([m for m in range(completas) if m >> b & 1], dtype=np.intp) for b in range(len(conjunto))]
+    tabla = np.full((completas, largo), np.inf)
+    tabla[0, 0] = 0.0
+    tablas = [tabla]
+    for m in range(len(precios)):
+        nueva = np.full_like(tabla, np.inf)
+        for b, p in enumerate(conjunto):
+            costo = precios[m, p]
+            if costo == np.inf: continue
+            nivel = niveles[p]
+            movida = np.full_like(tabla, np.inf)
+            movida[:, nivel:] = tabla[:, :largo - nivel] + costo
+            if titulares[m]:
+                idx = con_bit[b]
+                nueva[idx] = np.minimum(nueva[idx], np.minimum(movida[idx], movida[idx ^ (1 << b)]))
+            else:
+                nueva = np.minimum(nueva, movida)
+        tabla = nueva
+        tablas.append(tabla)
+    return tablas
+
+def _reconstruir(tablas, precios, niveles, titulares, conjunto, puntaje):
+    """Plan (índice en `conjunto`) de cada miembro para el óptimo con todas las pólizas con titular y ese puntaje."""
+    mascara, eleccion = (1 << len(conjunto)) - 1, []
+    for m in range(len(precios) - 1, -1, -1):
+        objetivo = tablas[m + 1][mascara, puntaje]
+        for b, p in enumerate(conjunto):
+            costo, nivel = precios[m, p], niveles[p]
+            if costo == np.inf or nivel > puntaje: continue
+            previas = [mascara] if not titulares[m] else ([mascara, mascara ^ (1 << b)] if mascara >> b & 1 else [])
+            previa = next((q for q in previas if tablas[m][q, puntaje - nivel] + costo == objetivo), None)
+            if previa is not None: break
+        eleccion.append(b)
+        mascara, puntaje = previa, puntaje - nivel
+    return eleccion[::-1]
+
+def frente_pareto(precios, niveles, titulares, max_polizas=MAX_POLIZAS):
+    """Frente costo / puntaje sobre una matriz de precios (miembro x plan, inf = no asegurable).
+
+    Devuelve [(costo, puntaje, ((plan, (miembros...)), ...)), ...] ordenado por costo, con planes como columnas de `precios`.
+    """
+    n, k = precios.shape
+    n_niveles = int(niveles.max()) + 1 if k else 1
+    largo = n * (n_niveles - 1) + 1
+    if k == 0 or not titulares.any(): return []
+
+    # Mínimo de cada miembro por nivel entre los planes desde la posición q en adelante (cota de las ramas)
+    desde = np.full((k + 1, n, n_niveles), np.inf)
+    for q in range(k - 1, -1, -1):
+        desde[q] = desde[q + 1]
+        desde[q, :, niveles[q]] = np.minimum(desde[q, :, niveles[q]], precios[:, q])
+
+    mejores = {}                           # puntaje -> (costo, conjunto, eleccion)
+    cota = np.full(largo, np.inf)          # cota[s] = menor costo encontrado con puntaje >= s
+
+    def actualizar(conjunto):
+        nonlocal cota
+        tablas = _resolver(precios, niveles, titulares, conjunto, largo)
+        final = tablas[-1][-1]
+        for s in np.flatnonzero(final < cota).tolist():
+            if final[s] < mejores.get(s, (np.inf,))[0]:
+                mejores[s] = (float(final[s]), conjunto, _reconstruir(tablas, precios, niveles, titulares, conjunto, s))
+        costos = np.full(largo, np.inf)
+        for s, (c, _, _) in mejores.items(): costos[s] = c
+        cota = np.minimum.accumulate(costos[::-1])[::-1]
+
+    def ramificar(conjunto, minimos):
+        for q in range(conjunto[-1] + 1 if conjunto else 0, k):
+            # Solo abre póliza un plan que asegure a algún titular
+            if not (precios[titulares, q] < np.inf).any(): continue
+            hijo = conjunto + [q]
+            minimos_hijo = minimos.copy()
+            minimos_hijo[:, niveles[q]] = np.minimum(minimos_hijo[:, niveles[q]], precios[:, q])
+            if len(hijo) == max_polizas:
+                if not (_curva(minimos_hijo) >= cota).all(): actualizar(hijo)
+                continue
+            if (_curva(np.minimum(minimos_hijo, desde[q + 1])) >= cota).all(): continue
+            # El conjunto mismo solo se resuelve si su propia cota puede mejorar el frente
+            if not (_curva(minimos_hijo) >= cota).all(): actualizar(hijo)
+            ramificar(hijo, minimos_hijo)
+
+    ramificar([], np.full((n, n_niveles), np.inf))
+
+    frente, mejor_puntaje = [], -1
+    for s in sorted(mejores, key=lambda s: (mejores[s][0], -s)):
+        if s <= mejor_puntaje: continue
+        mejor_puntaje = s
+        costo, conjunto, eleccion = mejores[s]
+        polizas = tuple((conjunto[b], tuple(m for m in range(n) if eleccion[m] == b)) for b in range(len(conjunto)))
+        frente.append((costo, s, tuple(p for p in polizas if p[1])))
+    return frente
+
+@medido('optimizar')
+def optimizar(catalogo, indice_clinicas, indice_precios, familia, clinicas_user, continuidad, cobertura, descuentos, max_polizas=MAX_POLIZAS):
+    """Frente de Pareto de asignaciones miembro -> plan (lista de Asignacion, de la más barata a la de más cobertura).
+
+    Incluye las de un solo plan para toda la familia, así que la primera nunca cuesta más que la primera fila de buscar.
+    `descuentos` como en aplicar_descuentos (dict o vector de CampanasCompiladas).
+    """
+    if cobertura not in COBERTURAS or not familia: return []
+    posiciones, niveles = _planes_candidatos(catalogo, indice_clinicas, indice_precios, clinicas_user, continuidad, cobertura)
+    if not len(posiciones): return []
+
+    edades = np.minimum([int(p['edad']) for p in familia], EDAD_MAXIMA)
+    salud = np.array([0 if p['salud'] == 'Sano' else 1 for p in familia])
+    filas = np.array([indice_precios['offsets'][indice_clinicas['planes'][j]] for j in posiciones.tolist()])
+    lista = precios_tarifa(indice_precios, filas[:, None], edades[None, :], salud[None, :])
+    lista = np.where(lista > 0, lista, np.inf)
+    dsc = np.array([_descuento(descuentos, j, indice_clinicas['planes'][j]) for j in posiciones.tolist()])
+    final = lista * (1 - dsc[:, None]/100)
+
+    titulares = edades >= EDAD_TITULAR
+    if not titulares.any(): titulares[0] = True
+
+    # Fuera los planes dominados; el resto en orden de precio para toda la familia (las ramas baratas podan antes)
+    utiles = np.flatnonzero(_no_dominados(final, niveles))
+    total = np.where(np.isinf(final[utiles]), 1e12, final[utiles]).sum(axis=1)
+    utiles = utiles[np.argsort(total, kind='stable')]
+
+    asignaciones = []
+    for costo, puntaje, polizas in frente_pareto(final[utiles].T, niveles[utiles], titulares, max_polizas):
+        detalle = []
+        for q, miembros in polizas:
+            p = utiles[q]
+            cia, plan = indice_clinicas['planes'][posiciones[p]]
+            detalle.append(Poliza(int(posiciones[p]), cia, plan, catalogo['planes'][(cia, plan)].nivel_cobertura, miembros,
+                                  float(lista[p, list(miembros)].sum()), float(final[p, list(miembros)].sum())))
+        asignaciones.append(Asignacion(costo, puntaje, tuple(detalle)))
+    return asignaciones
+
+def tabla_asignaciones(asignaciones, familia):
+    """DataFrame para mostrar el frente: una fila por asignación, con el detalle de pólizas en texto."""
+    nombres = ["Titular"] + [f"Dep {i}" for i in range(1, len(familia))]
+    filas = []
+    for a in asignaciones:
+        filas.append({
+            'Polizas': "\n".join(f"{p.aseguradora} {p.plan}: " + ", ".join(f"{nombres[m]} ({familia[m]['edad']}a)" for m in p.miembros)
+                                 for p in a.polizas),
+            'N_Polizas': len(a.polizas),
+            'Puntaje_Cobertura': a.puntaje,
+            'Nivel_Minimo': min((p.nivel_cobertura for p in a.polizas), key=COBERTURAS.index),
+            'Precio_Lista': sum(p.precio_lista for p in a.polizas),
+            'Precio_Final': a.precio_final,
+            'Precio_Mensual': a.precio_final/12,
+        })
+    return pd.DataFrame(filas)
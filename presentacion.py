@@ -0,0 +1,56 @@
+# --- PRESENTACIÓN DE RESULTADOS ---
+# buscar deja las coberturas como datos: Coberturas = ((clínica, red, amb, hosp), ...) con clínica None
+# cuando no se filtró por clínicas (primera red del plan), e Int_Amb / Int_Hosp = (deducible, reembolso).
+# Aquí se pasan a texto solo las filas que se muestran: HTML de ReportLab (PDF, API) o texto plano (tabla).
+
+CAMPOS_COBERTURA = {'red': 1, 'amb': 2, 'hosp': 3}
+_ETIQUETAS = {'red': 'Red', 'amb': 'Amb', 'hosp': 'Hosp'}
+
+# Columnas de texto de versiones anteriores de buscar, que la API sigue devolviendo
+COLUMNAS_HTML = {'Txt_Clin_Red': ('Coberturas', 'red'), 'Txt_Cob_Amb': ('Coberturas', 'amb'), 'Txt_Cob_Hosp': ('Coberturas', 'hosp'),
+                 'Int_Amb_Full': ('Int_Amb', None), 'Int_Hosp_Full': ('Int_Hosp', None)}
+
+ORDENES_TABLA = {"Precio final": 'Precio_Final', "Precio de lista": 'Precio_Lista', "Descuento": 'Pct_Dscto',
+                 "Aseguradora": 'Aseguradora', "Plan": 'Plan'}
+
+def html_cobertura(coberturas, campo):
+    """Una línea '• <b>Clínica</b>: valor' por clínica ('• <b>Red:</b> valor' sin clínicas), unidas con <br/>."""
+    i = CAMPOS_COBERTURA[campo]
+    return "<br/>".join(f"• <b>{c[0]}</b>: {c[i]}" if c[0] is not None else f"• <b>{_ETIQUETAS[campo]}:</b> {c[i]}" for c in coberturas)
+
+def texto_cobertura(coberturas, campo):
+    i = CAMPOS_COBERTURA[campo]
+    return "\n".join(f"{c[0]}: {c[i]}" if c[0] is not None else f"{_ETIQUETAS[campo]}: {c[i]}" for c in coberturas)
+
+def html_internacional(valores):
+    ded, reemb = valores
+    return f"<b>Ded:</b> {ded}<br/><b>Reemb:</b> {reemb}"
+
+def texto_internacional(valores):
+    ded, reemb = valores
+    return f"Ded: {ded}\nReemb: {reemb}"
+
+def columnas_html(res):
+    """Copia de `res` con las columnas Txt_* / Int_*_Full en HTML, como las devolvía buscar antes."""
+    res = res.copy()
+    for col, (origen, campo) in COLUMNAS_HTML.items():
+        if campo: res[col] = [html_cobertura(c, campo) for c in res[origen]]
+        else: res[col] = [html_internacional(v) for v in res[origen]]
+    return res
+
+def pagina_resultados(res, orden='Precio_Final', descendente=False, pagina=1, por_pagina=25):
+    """Filas de la página pedida (desde 1) con `res` ordenado por `orden`; los empates mantienen el orden de `res`."""
+    inicio = (pagina - 1) * por_pagina
+    return res.sort_values(orden, ascending=not descendente, kind='stable').iloc[inicio:inicio + por_pagina]
+
+def tabla_asesor(filas, internacional):
+    """Tabla en texto plano para la vista del asesor (solo las filas recibidas)."""
+    tabla = filas[['Aseguradora', 'Plan']].copy()
+    if internacional:
+        tabla['Int_Amb_Full'] = [texto_internacional(v) for v in filas['Int_Amb']]
+        tabla['Int_Hosp_Full'] = [texto_internacional(v) for v in filas['Int_Hosp']]
+    else:
+        tabla['Txt_Cob_Amb'] = [texto_cobertura(c, 'amb') for c in filas['Coberturas']]
+        tabla['Txt_Cob_Hosp'] = [texto_cobertura(c, 'hosp') for c in filas['Coberturas']]
+    for col in ('Precio_Lista', 'Pct_Dscto', 'Precio_Final'): tabla[col] = filas[col]
+    return tabla
@@ -0,0 +1,259 @@
+import os
+import re
+import time
+import threading
+from io import BytesIO
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as ImageRL
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+
+from metricas import contar, medido
+from presentacion import html_cobertura, html_internacional
+
+# --- PDF ---
+# Estilos y logo (ya reducido) se arman una vez por proceso. Los flowables guardan estado al maquetar, así que
+# cada propuesta arma los suyos, también los bloques de texto fijo (son baratos).
+
+AZUL = colors.HexColor("#2456A6"); DORADO_FONDO = colors.HexColor("#FFF2CC"); DORADO_BORDE = colors.HexColor("#D6B656")
+VERDE = colors.HexColor("#28A745"); ROJO = colors.HexColor("#D32F2F"); GRIS = colors.HexColor("#6E7A8A"); AZUL_CLARO = colors.HexColor("#E6F3FF")
+
+LOGO_ANCHO, LOGO_ALTO = 4.5*cm, 1.6*cm
+LOGO_DPI = 300
+
+def _cargar_logo(ruta):
+    """Logo reducido a LOGO_DPI para el tamaño con que se imprime (PNG en memoria): evita recomprimir la imagen original en cada PDF."""
+    if not os.path.exists(ruta): return None
+    from PIL import Image as PILImage
+    with PILImage.open(ruta) as original:
+        img = original.copy()
+    escala = min(LOGO_ANCHO / img.width, LOGO_ALTO / img.height)
+    ancho_pt, alto_pt = img.width * escala, img.height * escala
+    max_px = (round(ancho_pt / 72 * LOGO_DPI), round(alto_pt / 72 * LOGO_DPI))
+    if img.width > max_px[0] or img.height > max_px[1]:
+        img = img.resize(max_px, PILImage.LANCZOS)
+    png = BytesIO()
+    img.save(png, format='PNG')
+    return png.getvalue(), ancho_pt, alto_pt
+
+class MotorPDF:
+    def __init__(self, ruta_logo="logo.png"):
+        estilos = getSampleStyleSheet()
+        self.st_tit = ParagraphStyle('T', parent=estilos['Heading1'], fontName='Helvetica-Bold', fontSize=14, textColor=AZUL, leading=16)
+        self.st_sub = ParagraphStyle('S', parent=estilos['Normal'], fontName='Helvetica-Bold', fontSize=11, textColor=AZUL)
+        self.st_norm = ParagraphStyle('N', parent=estilos['Normal'], fontSize=9, textColor=GRIS, leading=11)
+        self.st_bold = ParagraphStyle('B', parent=self.st_norm, fontName='Helvetica-Bold', textColor=AZUL)
+        self.st_analysis = ParagraphStyle('Analysis', parent=self.st_norm, leading=14, fontSize=9)
+        self.st_th = ParagraphStyle('TH', parent=estilos['Normal'], fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, alignment=1)
+        self.st_td = ParagraphStyle('TD', parent=estilos['Normal'], fontSize=7.5, textColor=colors.black, leading=9)
+        self.st_td_b = ParagraphStyle('TDB', parent=self.st_td, fontName='Helvetica-Bold', textColor=AZUL)
+        self.st_folio = ParagraphStyle('F', parent=self.st_norm, alignment=2)
+        self.st_aviso = ParagraphStyle('W', parent=self.st_norm, textColor=AZUL)
+        self.st_aviso_cont = ParagraphStyle('W', parent=self.st_norm, textColor=VERDE)
+        self.st_btn = ParagraphStyle('Btn', parent=self.st_norm, textColor=colors.white, alignment=1, fontName='Helvetica-Bold', fontSize=10)
+        self.st_nota = ParagraphStyle('D', parent=self.st_norm, fontSize=7)
+        self.logo = _cargar_logo(ruta_logo)
+
+    def _bloques_fijos(self):
+        """Bloques de texto fijo de la propuesta, nuevos en cada documento."""
+        if self.logo is not None:
+            png, ancho, alto = self.logo
+            img = ImageRL(BytesIO(png), width=ancho, height=alto)
+        else:
+            img = Paragraph("", self.st_norm)
+
+        t_warn = Table([[Paragraph("<b>IMPORTANTE:</b> Al ser un seguro nuevo, aplican periodos de carencia (30 días) y espera. Por favor revise el enlace de carencias en la tabla superior.", self.st_aviso)]], colWidths=[18*cm])
+        t_warn.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), AZUL_CLARO), ('BOX', (0,0), (-1,-1), 0.5, AZUL), ('PADDING', (0,0), (-1,-1), 8)]))
+        t_cont = Table([[Paragraph("<b>BENEFICIO DE CONTINUIDAD:</b> Para gozar del beneficio de continuidad debe haber estado asegurado dentro de los últimos 90 días con una póliza de salud EPS o Individual.", self.st_aviso_cont)]], colWidths=[18*cm])
+        t_cont.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), colors.HexColor("#E8F5E9")), ('BOX', (0,0), (-1,-1), 0.5, VERDE), ('PADDING', (0,0), (-1,-1), 8)]))
+
+        t_btns = Table([[Paragraph('<a href="https://wa.link/czc7jg">¡QUIERO MI ASESORÍA GRATUITA!</a>', self.st_btn), "", Paragraph('<a href="https://wa.link/zwdc6r">¡QUIERO CONTRATAR AHORA!</a>', self.st_btn)]], colWidths=[7*cm, 1*cm, 7*cm], rowHeights=[1.2*cm])
+        t_btns.setStyle(TableStyle([('BACKGROUND', (0,0), (0,0), AZUL), ('BACKGROUND', (2,0), (2,0), VERDE), ('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('ROUNDED', (0,0), (-1,-1), 8)]))
+
+        return {
+            'logo': img,
+            'header': Paragraph("""<b>YQ CORREDORES DE SEGUROS</b><br/>Propuesta de seguro de salud""", self.st_tit),
+            'intro': Paragraph("En YQ Corredores de Seguros, entendemos la importancia de proteger tu salud. Te presentamos esta cotización personalizada con precios de campaña exclusivos.", self.st_norm),
+            'perfil': Paragraph("TU PERFIL", self.st_sub),
+            'lbl_titular': Paragraph("<b>Titular:</b>", self.st_bold),
+            'lbl_cobertura': Paragraph("<b>Cobertura:</b>", self.st_bold),
+            'lbl_dependientes': Paragraph("<b>Dependientes:</b>", self.st_bold),
+            'lbl_condicion': Paragraph("<b>Condición:</b>", self.st_bold),
+            'th_int': [Paragraph(h, self.st_th) for h in ['Plan', 'Clínicas / Redes', 'Int. Amb', 'Int. Hosp', 'Mensual', 'Anual']],
+            'th_nac': [Paragraph(h, self.st_th) for h in ['Plan', 'Clínicas / Redes', 'Cob. Ambulatoria', 'Cob. Hospitalaria', 'Mensual', 'Anual']],
+            'aviso_nuevo': t_warn,
+            'aviso_continuidad': t_cont,
+            'cta': Paragraph("¿Listo para estar protegido?", self.st_sub),
+            'botones': t_btns,
+            'nota': Paragraph("Nota: Precios referenciales sujetos a evaluación médica. Incluyen IGV. Esta cotización tiene una validez máxima de 7 días y/o hasta finalizar campaña vigente (lo que ocurra primero).", self.st_nota),
+        }
+
+    def generar(self, perfil, df, id_sel, razon, folio):
+        try:
+            est = self._bloques_fijos()
+            buffer = BytesIO()
+            doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=15, leftMargin=15, topMargin=20, bottomMargin=20)
+            st_td, st_td_b = self.st_td, self.st_td_b
+            # Perfil y motivo son texto del usuario: escapados para que '<' o '&' no se lean como marcado de ReportLab
+            perfil = {k: escape(str(v)) for k, v in perfil.items()}
+            razon = escape(razon) if razon else razon
+
+            elements = []
+            txt_folio = f"<b>Folio:</b> {folio}<br/><b>Fecha:</b> {datetime.now().strftime('%d/%m/%Y')}"
+            p_folio = Paragraph(txt_folio, self.st_folio)
+            t_head = Table([[est['logo'], est['header'], p_folio]], colWidths=[5*cm, 9*cm, 4*cm])
+            t_head.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'MIDDLE')]))
+            elements.append(t_head)
+            elements.append(Spacer(1, 15))
+
+            elements.append(est['intro'])
+            elements.append(Spacer(1, 10))
+
+            elements.append(est['perfil'])
+            elements.append(Spacer(1, 5))
+            data_perfil = [
+                [est['lbl_titular'], Paragraph(perfil['Titular'], self.st_norm),
+                 est['lbl_cobertura'], Paragraph(perfil['Cobertura'], self.st_norm)],
+                [est['lbl_dependientes'], Paragraph(perfil['Dependientes'], self.st_norm),
+                 est['lbl_condicion'], Paragraph(perfil['Continuidad'], self.st_norm)]
+            ]
+            t_perf = Table(data_perfil, colWidths=[2.5*cm, 6.5*cm, 2.5*cm, 6.5*cm])
+            t_perf.setStyle(TableStyle([('LINEBELOW', (0,0), (-1,-1), 0.5, colors.lightgrey), ('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('PADDING', (0,0), (-1,-1), 5)]))
+            elements.append(t_perf)
+            elements.append(Spacer(1, 20))
+
+            es_int = "Internacional" in perfil['Cobertura']
+            if es_int:
+                data = [est['th_int']]
+                anchos = [3.0*cm, 4.2*cm, 3.7*cm, 3.5*cm, 1.4*cm, 2.2*cm]
+            else:
+                data = [est['th_nac']]
+                anchos = [3.0*cm, 4.2*cm, 4.2*cm, 3.0*cm, 1.4*cm, 2.2*cm]
+
+            estilos_t = [('BACKGROUND', (0,0), (-1,0), AZUL), ('GRID', (0,0), (-1,-1), 0.5, colors.grey), ('VALIGN', (0,0), (-1,-1), 'TOP'), ('PADDING', (0,0), (-1,-1), 4)]
+            plan_sel = None
+            # Una sola pasada por los resultados: filas de la tabla y resaltado del recomendado
+            for i, row in enumerate(df.to_dict('records')):
+                rec = (row['ID'] == id_sel)
+                txt_p = f"<b>{row['Aseguradora']}</b><br/>{row['Plan']}"
+                if rec:
+                    txt_p = "⭐ RECOMENDADO ⭐<br/>" + txt_p
+                    if plan_sel is None: plan_sel = row['Plan']
+                    estilos_t.append(('BACKGROUND', (0, i+1), (-1, i+1), DORADO_FONDO))
+                    estilos_t.append(('BOX', (0, i+1), (-1, i+1), 1.5, DORADO_BORDE))
+
+                links = []
+                if row['Link_Cartilla'] and str(row['Link_Cartilla']).startswith('http'):
+                    links.append(f"<a href='{row['Link_Cartilla']}' color='blue'><u>Cartilla</u></a>")
+                if perfil['Continuidad'] == "Nuevo" and row['Link_Carencia'] and str(row['Link_Carencia']).startswith('http'):
+                    links.append(f"<a href='{row['Link_Carencia']}' color='red'><u>Carencias</u></a>")
+
+                if links: txt_p += "<br/>" + " | ".join(links)
+
+                precio_anual = f"S/ {row['Precio_Final']:,.2f}"
+                if row['Pct_Dscto'] > 0:
+                    precio_anual = f"<strike color='grey'>S/ {row['Precio_Lista']:,.0f}</strike><br/><b>{precio_anual}</b><br/><font color='red' size='7'>Ahorras S/ {row['Ahorro_Soles']:,.0f}</font>"
+                precio_mensual = f"S/ {row['Precio_Mensual']:,.0f}"
+
+                # Coberturas a HTML de ReportLab solo aquí, al armar la fila
+                if es_int: txt_amb, txt_hosp = html_internacional(row['Int_Amb']), html_internacional(row['Int_Hosp'])
+                else: txt_amb, txt_hosp = html_cobertura(row['Coberturas'], 'amb'), html_cobertura(row['Coberturas'], 'hosp')
+                data.append([Paragraph(txt_p, st_td), Paragraph(html_cobertura(row['Coberturas'], 'red'), st_td), Paragraph(txt_amb, st_td), Paragraph(txt_hosp, st_td), Paragraph(precio_mensual, st_td_b), Paragraph(precio_anual, st_td_b)])
+
+            t = Table(data, colWidths=anchos, repeatRows=1)
+            t.setStyle(TableStyle(estilos_t))
+            elements.append(t)
+
+            elements.append(Spacer(1, 10))
+            if perfil['Continuidad'] == "Nuevo":
+                elements.append(est['aviso_nuevo'])
+            elif perfil['Continuidad'] == "Vengo con continuidad":
+                elements.append(est['aviso_continuidad'])
+
+            elements.append(Spacer(1, 20))
+            if razon:
+                if plan_sel is None: raise IndexError(f"El plan {id_sel} no está en la tabla")
+                elements.append(Paragraph(f"¿POR QUÉ RECOMENDAMOS EL PLAN {str(plan_sel).upper()}?", self.st_sub))
+                elements.append(Spacer(1, 15))
+                t_box = Table([[Paragraph(f"<b>ANÁLISIS DEL EXPERTO:</b><br/><br/>{razon}", self.st_analysis)]], colWidths=[18*cm])
+                t_box.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), DORADO_FONDO), ('BOX', (0,0), (-1,-1), 1, DORADO_BORDE), ('PADDING', (0,0), (-1,-1), 12)]))
+                elements.append(t_box)
+                elements.append(Spacer(1, 25))
+
+            elements.append(est['cta'])
+            elements.append(Spacer(1, 5))
+            elements.append(est['botones'])
+            elements.append(Spacer(1, 30))
+            elements.append(est['nota'])
+
+            doc.build(elements)
+            buffer.seek(0)
+            contar('pdf_generados')
+            return buffer
+        except Exception as e:
+            contar('pdf_errores')
+            return f"ERROR PDF: {str(e)}"
+
+def motivo_recomendacion(clinicas, continuidad):
+    """Texto por defecto del análisis del experto."""
+    clin_txt = ", ".join(clinicas)
+    if not clin_txt: clin_txt = "su red de afiliados"
+    txt_motivo = f"Este plan es el que tiene mejor precio considerando las clínicas que prefiere ({clin_txt}) y sus beneficios."
+    if continuidad == "Nuevo": txt_motivo += " Recuerde revisar los periodos de carencia."
+    return txt_motivo
+
+def _limpiar_nombre(texto, defecto=''):
+    palabras = str(texto).strip().split()
+    return re.sub(r'[^\w-]', '', palabras[0]) if palabras else defecto
+
+def nombre_archivo_pdf(nombre, clinicas, fecha):
+    """COTISALUD_<nombre>_<clínicas>_<ddmmaa_hhmm>.pdf, solo con caracteres válidos en un nombre de archivo."""
+    nom_clean = _limpiar_nombre(nombre, 'Cliente') or 'Cliente'
+    cls_clean = "_".join(filter(None, (_limpiar_nombre(c) for c in clinicas)))
+    return f"COTISALUD_{nom_clean}_{cls_clean}_{fecha.strftime('%d%m%y_%H%M')}.pdf"
+
+_motor = None
+_motor_lock = threading.Lock()
+
+def obtener_motor_pdf():
+    global _motor
+    with _motor_lock:
+        if _motor is None: _motor = MotorPDF()
+        return _motor
+
+@medido('pdf')
+def generar_pdf(perfil, df, id_sel, razon, folio):
+    """Propuesta en PDF (BytesIO), o un texto 'ERROR PDF: ...' si falla."""
+    return obtener_motor_pdf().generar(perfil, df, id_sel, razon, folio)
+
+# --- MICRO-BENCHMARK ---
+def medir_rendimiento(filas=(5, 20, 40), repeticiones=20):
+    """Propuestas por segundo para tablas de 5, 20 y 40 planes, con resultados reales de buscar."""
+    import pandas as pd
+    from datos import cargar_foto
+    from motor import buscar
+
+    foto = cargar_foto()
+    res = buscar(foto.catalogo, foto.indice_clinicas, foto.indice_precios, [{'edad': 40, 'salud': 'Sano'}, {'edad': 8, 'salud': 'Sano'}],
+                 [], "Nuevo", "Integral", {})
+    perfil = {'Titular': "Cliente Prueba (40 años)", 'Dependientes': "Dep (8a)", 'Continuidad': "Nuevo", 'Cobertura': "Integral"}
+    generar_pdf(perfil, res, res['ID'].iloc[0], "Calentamiento", 0)
+
+    medidas = {}
+    for n in filas:
+        df = pd.concat([res] * (n // len(res) + 1), ignore_index=True).head(n)
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            pdf = generar_pdf(perfil, df, df['ID'].iloc[0], "Plan con mejor precio para sus clínicas.", 1000)
+            if isinstance(pdf, str): raise RuntimeError(pdf)
+        seg = (time.perf_counter() - inicio) / repeticiones
+        medidas[n] = {'ms_por_pdf': seg * 1000, 'pdf_por_segundo': 1 / seg, 'bytes': len(pdf.getvalue())}
+    return medidas
+
+if __name__ == '__main__':
+    for n, m in medir_rendimiento().items():
+        print(f"{n:>3} planes: {m['ms_por_pdf']:7.1f} ms/PDF | {m['pdf_por_segundo']:6.1f} PDF/s | {m['bytes'] / 1024:6.1f} KB")
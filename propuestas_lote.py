@@ -0,0 +1,187 @@
+"""Genera propuestas en PDF para los leads del historial, sin pasar por la interfaz.
+
+Uso: python propuestas_lote.py [--dias 30 | --desde dd/mm/aaaa --hasta dd/mm/aaaa] [--cobertura ...] [--rol Cliente]
+                               [--salida propuestas | --salida propuestas.zip] [--procesos N]
+
+Cada lead se cotiza con la tarifa y las campañas vigentes del día y se le asigna un folio de un bloque reservado
+al inicio. Los PDF se arman en varios procesos y solo el proceso principal escribe (en una carpeta o un
+.zip), con un número acotado de PDF en memoria. Los leads que fallan quedan en <salida>_fallos.csv.
+"""
+import os
+import sys
+import csv
+import time
+import zipfile
+import argparse
+from itertools import islice
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from datos import ARCHIVOS_DATOS, cargar_foto
+from folios import AsignadorFolios
+from historial import AlmacenLeads, COLUMNAS_HISTORIAL
+from motor import buscar
+from tarifas import anio_vigente, tarifa_del_anio
+from propuesta_pdf import generar_pdf, motivo_recomendacion, nombre_archivo_pdf
+
+COLUMNAS_FALLOS = ['Folio', 'Fecha', 'Cliente', 'Correo', 'Celular', 'Error']
+
+# --- TRABAJADOR ---
+# Cada proceso abre la foto de datos una vez (la tarifa va con mmap) y toma la tarifa y los descuentos del día.
+_foto = None
+_descuentos = None
+_precios = None
+
+def _iniciar_trabajador(archivos, fecha):
+    global _foto, _descuentos, _precios
+    _foto = cargar_foto(archivos)
+    if _foto is None: raise RuntimeError("Faltan precios_<año>.csv o base_clinicas.xlsx")
+    _descuentos = {tipo: _foto.campanas.vector(tipo, fecha) for tipo in ('Nuevo', 'Continuidad')}
+    _precios = tarifa_del_anio(_foto.indice_precios, anio_vigente(list(_foto.indice_precios['tramos']), fecha))
+
+def _clinicas_lead(texto):
+    return [c.strip() for c in str(texto or '').split(',') if c.strip()]
+
+def propuesta_lead(folio, lead):
+    """PDF de un lead (dict con COLUMNAS_HISTORIAL). Devuelve (nombre_archivo, bytes); los errores se propagan."""
+    edad, salud = int(lead['Edad_Titular']), lead['Salud']
+    cont, cob = lead['Condicion'], lead['Cobertura_Interes']
+    clinicas = _clinicas_lead(lead['Clinicas_Preferidas'])
+    familia = [{'edad': edad, 'salud': salud, 'rol': 'Titular'}]
+
+    tipo_cliente = "Nuevo" if cont == "Nuevo" else "Continuidad"
+    res = buscar(_foto.catalogo, _foto.indice_clinicas, _precios, familia, sorted(clinicas), cont, cob, _descuentos[tipo_cliente])
+    if res.empty: raise ValueError(f"Sin planes de cobertura '{cob}' para sus clínicas")
+
+    # El historial guarda solo al titular: las propuestas no incluyen a los dependientes
+    n_dep = int(lead['Total_Asegurados'] or 1) - 1
+    perfil = {'Titular': f"{lead['Cliente']} ({edad} años)", 'Dependientes': f"{n_dep} (no incluidos)" if n_dep > 0 else "Ninguno",
+              'Continuidad': cont, 'Cobertura': cob}
+    pdf = generar_pdf(perfil, res, res['ID'].iloc[0], motivo_recomendacion(clinicas, cont), folio)
+    if isinstance(pdf, str): raise RuntimeError(pdf)
+    return f"{folio}_{nombre_archivo_pdf(lead['Cliente'], clinicas, datetime.now())}", pdf.getvalue()
+
+def _tarea(folio, lead):
+    try: return folio, lead, propuesta_lead(folio, lead), None
+    except Exception as e: return folio, lead, None, f"{type(e).__name__}: {e}"
+
+# --- SALIDA ---
+class SalidaCarpeta:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        os.makedirs(ruta, exist_ok=True)
+
+    def escribir(self, nombre, datos):
+        with open(os.path.join(self.ruta, nombre), 'wb') as f: f.write(datos)
+
+    def cerrar(self):
+        pass
+
+class SalidaZip:
+    def __init__(self, ruta):
+        # Los PDF ya vienen comprimidos: se guardan sin volver a comprimir
+        self._zip = zipfile.ZipFile(ruta, 'w', compression=zipfile.ZIP_STORED)
+
+    def escribir(self, nombre, datos):
+        self._zip.writestr(nombre, datos)
+
+    def cerrar(self):
+        self._zip.close()
+
+# --- LOTE ---
+def generar_lote(leads, total, folio_inicial, salida, ruta_fallos, procesos=None, archivos=ARCHIVOS_DATOS, fecha=None, en_vuelo=None, aviso=None):
+    """Genera un PDF por lead (iterable de dicts) con folios consecutivos desde `folio_inicial`.
+
+    Como mucho `en_vuelo` leads están a la vez en proceso o en memoria. `aviso(hechos, total, fallos)` se
+    llama a medida que se escriben los PDF. Devuelve (generados, fallos).
+    """
+    procesos = procesos or os.cpu_count() or 1
+    en_vuelo = en_vuelo or procesos * 4
+    fecha = fecha or date.today()
+    generados = fallos = 0
+    pendientes = set()
+
+    with open(ruta_fallos, 'w', newline='', encoding='utf-8-sig') as f_fallos, \
+            ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador, initargs=(archivos, fecha)) as pool:
+        reporte = csv.writer(f_fallos)
+        reporte.writerow(COLUMNAS_FALLOS)
+
+        def recoger(listos):
+            nonlocal generados, fallos
+            for fut in listos:
+                folio, lead, resultado, error = fut.result()
+                if error is None:
+                    salida.escribir(*resultado)
+                    generados += 1
+                else:
+                    reporte.writerow([folio, lead['Fecha'], lead['Cliente'], lead['Correo'], lead['Celular'], error])
+                    fallos += 1
+            if aviso: aviso(generados + fallos, total, fallos)
+
+        for i, lead in enumerate(leads):
+            if len(pendientes) >= en_vuelo:
+                listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                recoger(listos)
+            pendientes.add(pool.submit(_tarea, folio_inicial + i, lead))
+        while pendientes:
+            listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            recoger(listos)
+    return generados, fallos
+
+def _leer_fecha(texto):
+    return datetime.strptime(texto, '%d/%m/%Y')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera propuestas en PDF para los leads del historial.")
+    parser.add_argument('--dias', type=int, default=30, help="Leads de los últimos N días (si no se indica --desde)")
+    parser.add_argument('--desde', type=_leer_fecha, help="dd/mm/aaaa")
+    parser.add_argument('--hasta', type=_leer_fecha, help="dd/mm/aaaa (incluido)")
+    parser.add_argument('--cobertura')
+    parser.add_argument('--rol')
+    parser.add_argument('--salida', default='propuestas', help="Carpeta o archivo .zip")
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--db', default='historial_leads.db')
+    args = parser.parse_args(argv)
+
+    filtros = {
+        'desde': args.desde or (datetime.now() - timedelta(days=args.dias)),
+        'hasta': (args.hasta + timedelta(days=1)) if args.hasta else datetime.now(),
+        'cobertura': args.cobertura,
+        'rol': args.rol,
+    }
+    almacen = AlmacenLeads(args.db)
+    total = almacen.contar(**filtros)
+    if total == 0:
+        print("⚠️ No hay leads para esos filtros")
+        return 0
+
+    # Un solo bloque de folios para todo el lote
+    folio_inicial = AsignadorFolios('folios.db', 'folio.txt').reservar(total)
+    print(f"⏳ {total} leads, folios {folio_inicial} a {folio_inicial + total - 1}")
+
+    leads = (dict(zip(COLUMNAS_HISTORIAL, fila)) for bloque in almacen.iterar(**filtros) for fila in bloque)
+    es_zip = args.salida.lower().endswith('.zip')
+    salida = SalidaZip(args.salida) if es_zip else SalidaCarpeta(args.salida)
+    ruta_fallos = (args.salida[:-4] if es_zip else args.salida.rstrip('/\\')) + '_fallos.csv'
+
+    inicio = time.perf_counter()
+    ultimo = [0.0]
+    def aviso(hechos, total, fallos):
+        ahora = time.perf_counter()
+        if hechos == total or ahora - ultimo[0] >= 2:
+            ultimo[0] = ahora
+            print(f"⏳ {hechos}/{total} ({hechos / (ahora - inicio):.1f} PDF/s, {fallos} con error)", flush=True)
+
+    try:
+        generados, fallos = generar_lote(islice(leads, total), total, folio_inicial, salida, ruta_fallos, procesos=args.procesos, aviso=aviso)
+    finally:
+        salida.cerrar()
+
+    print(f"✅ {generados} propuestas en {args.salida} ({time.perf_counter() - inicio:.1f} s)")
+    if fallos:
+        print(f"⚠️ {fallos} leads con error: ver {ruta_fallos}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""Rehace los resúmenes de analítica de leads (por día, cobertura, clínica y tramo de edad) y de planes recomendados.
+
+Uso: python reconstruir_analitica.py [--csv historial_leads.csv] [--db historial_leads.db] [--exportar resumen.csv]
+
+Los resúmenes se rehacen desde las tablas de leads y propuestas de la base, en una sola pasada en streaming: en
+memoria solo quedan los contadores. Con --csv antes se importa ese archivo a la tabla, solo si la base no tiene leads (así los
+resúmenes y la tabla no se separan). La app mantiene los resúmenes al día sola; esto hace falta tras editar el
+historial a mano o para migrar un CSV antiguo.
+"""
+import os
+import sys
+import time
+import argparse
+
+from historial import AlmacenLeads
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rehace los resúmenes de analítica de leads.")
+    parser.add_argument('--csv', help="historial_leads.csv a importar antes (solo con la base sin leads)")
+    parser.add_argument('--db', default='historial_leads.db')
+    parser.add_argument('--exportar', help="escribe además el resumen por día en este CSV")
+    args = parser.parse_args(argv)
+
+    if args.csv and not os.path.exists(args.csv):
+        print(f"❌ No existe {args.csv}")
+        return 1
+
+    almacen = AlmacenLeads(args.db)
+    if args.csv and (existentes := almacen.contar()):
+        print(f"❌ {args.db} ya tiene {existentes} leads: --csv solo se usa con la base vacía")
+        return 1
+    inicio = time.perf_counter()
+    try:
+        total = almacen.reconstruir_resumen(args.csv)
+    except (KeyError, ValueError) as e:
+        print(f"❌ No se pudo leer {args.csv or args.db}: {e}")
+        return 1
+    dias = almacen.resumen(por=('dia',))
+    print(f"✅ {total} leads resumidos en {len(dias)} días ({time.perf_counter() - inicio:.2f} s)")
+
+    if args.exportar:
+        almacen.exportar_resumen(args.exportar)
+        print(f"📄 Resumen por día en {args.exportar}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
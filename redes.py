@@ -0,0 +1,207 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+# --- REDES DE CLÍNICAS ---
+# La hoja REDES de base_clinicas.xlsx se lee en modo streaming (openpyxl read-only): fila por fila, sin
+# armar el libro en memoria. Para cada plan vale, por clínica, la primera red que la incluye (igual que
+# motor.construir_indice_clinicas), así que una red se resume en {clínica: (Nombre_Red, Cob_Amb, Cob_Hosp)}.
+#
+# Cuando solo cambian redes de planes que ya existen, comparar_redes arma el diff contra el índice vigente y
+# aplicar_cambios rehace solo las entradas de esos planes sobre los arreglos del índice (ver datos.actualizar_redes).
+# Si aparecen o desaparecen planes cambian las posiciones de todo (catálogo, tarifas, campañas): carga completa.
+
+ARCHIVO_REDES = 'base_clinicas.xlsx'
+HOJA_REDES = 'REDES'
+COLUMNAS_REDES = ['Aseguradora', 'Plan', 'Nombre_Red', 'Cobertura_Amb', 'Cobertura_Hosp', 'Clinicas_Incluidas']
+
+class FilaRed(NamedTuple):
+    """Una fila de la hoja REDES; Aseguradora y Plan sin espacios, el resto como viene en la celda."""
+    aseguradora: str
+    plan: str
+    nombre_red: object
+    cobertura_amb: object
+    cobertura_hosp: object
+    clinicas_incluidas: object
+
+class CambioPlan(NamedTuple):
+    aseguradora: str
+    plan: str
+    agregadas: list          # [(clínica, red)]
+    quitadas: list           # [(clínica, red)]
+    cambiadas: list          # [(clínica, (red, amb, hosp) antes, después)]
+    primera_red: tuple       # (antes, después) si cambió la red que se muestra sin clínicas; None si no
+
+class CambiosRedes(NamedTuple):
+    planes_nuevos: list
+    planes_quitados: list
+    cambios: list            # de CambioPlan, solo los planes con cambios
+    clinicas_nuevas: list
+    clinicas_quitadas: list
+
+    @property
+    def requiere_recarga(self):
+        """True si aparecen o desaparecen planes: no se puede aplicar sobre el índice vigente."""
+        return bool(self.planes_nuevos or self.planes_quitados)
+
+def _texto(valor):
+    # Igual que pandas (read_excel + astype(str)): celda vacía = 'nan'
+    return 'nan' if valor is None else str(valor)
+
+def leer_redes(ruta=ARCHIVO_REDES, hoja=HOJA_REDES):
+    """Filas de la hoja de redes (lista de FilaRed), leídas en streaming. Las filas vacías se saltan."""
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = wb[hoja].iter_rows(values_only=True)
+        cabecera = [str(c).strip() if c is not None else '' for c in next(filas, ())]
+        faltan = [c for c in COLUMNAS_REDES if c not in cabecera]
+        if faltan: raise ValueError(f"La hoja {hoja} de {ruta} no tiene las columnas {faltan}")
+        posiciones = [cabecera.index(c) for c in COLUMNAS_REDES]
+        salida = []
+        for fila in filas:
+            valores = [fila[i] if i < len(fila) else None for i in posiciones]
+            if all(v is None for v in valores): continue
+            salida.append(FilaRed(_texto(valores[0]).strip(), _texto(valores[1]).strip(), *valores[2:]))
+        return salida
+    finally:
+        wb.close()
+
+def tabla_redes(filas):
+    """DataFrame de las filas con las columnas que usa construir_indice_clinicas."""
+    df = pd.DataFrame([[f.aseguradora, f.plan, _texto(f.nombre_red), _texto(f.cobertura_amb), _texto(f.cobertura_hosp), f.clinicas_incluidas]
+                       for f in filas], columns=COLUMNAS_REDES)
+    df['Clinicas_Busqueda'] = ['' if f.clinicas_incluidas is None else str(f.clinicas_incluidas) for f in filas]
+    return df
+
+def lista_clinicas(filas):
+    """Clínicas para el buscador (las de Clinicas_Incluidas, sin repetir y ordenadas)."""
+    return sorted({c.strip() for f in filas if f.clinicas_incluidas is not None for c in str(f.clinicas_incluidas).split(',')})
+
+def entradas_redes(filas):
+    """{(cia, plan): (tripleta de la primera red, {clínica: tripleta})} con la primera red que incluye cada clínica."""
+    entradas = {}
+    for f in filas:
+        tripleta = (_texto(f.nombre_red), _texto(f.cobertura_amb), _texto(f.cobertura_hosp))
+        primera, mapa = entradas.setdefault((f.aseguradora, f.plan), (tripleta, {}))
+        txt = '' if f.clinicas_incluidas is None else str(f.clinicas_incluidas)
+        for cli in txt.split(','):
+            mapa.setdefault(cli.strip(), tripleta)
+    return entradas
+
+def entradas_indice(indice_clinicas):
+    """Lo mismo que entradas_redes, leído del índice de clínicas vigente."""
+    tripletas = [tuple(t) for t in indice_clinicas['tripletas'].tolist()]
+    entradas = {key: (tripletas[t], {}) for key, t in zip(indice_clinicas['planes'], indice_clinicas['primera_red'].tolist())}
+    clinica = np.repeat(np.arange(len(indice_clinicas['clinicas'])), np.diff(indice_clinicas['red_inicio']))
+    for i, j, t in zip(clinica.tolist(), indice_clinicas['red_plan'].tolist(), indice_clinicas['red_tripleta'].tolist()):
+        entradas[indice_clinicas['planes'][j]][1][indice_clinicas['clinicas'][i]] = tripletas[t]
+    return entradas
+
+def comparar_redes(indice_clinicas, entradas):
+    """CambiosRedes entre el índice vigente y las redes nuevas (`entradas` de entradas_redes)."""
+    vigentes = entradas_indice(indice_clinicas)
+    cambios = []
+    for key in indice_clinicas['planes']:
+        if key not in entradas: continue
+        (primera_antes, antes), (primera_despues, despues) = vigentes[key], entradas[key]
+        agregadas = [(cli, t[0]) for cli, t in despues.items() if cli not in antes]
+        quitadas = [(cli, t[0]) for cli, t in antes.items() if cli not in despues]
+        cambiadas = [(cli, antes[cli], t) for cli, t in despues.items() if cli in antes and antes[cli] != t]
+        primera = (primera_antes, primera_despues) if primera_antes != primera_despues else None
+        if agregadas or quitadas or cambiadas or primera:
+            cambios.append(CambioPlan(*key, sorted(agregadas), sorted(quitadas), sorted(cambiadas), primera))
+
+    clinicas_antes = set(indice_clinicas['clinicas'])
+    clinicas_despues = {cli for _, mapa in entradas.values() for cli in mapa}
+    return CambiosRedes(sorted(set(entradas) - set(indice_clinicas['planes'])), sorted(set(indice_clinicas['planes']) - set(entradas)),
+                        cambios, sorted(clinicas_despues - clinicas_antes), sorted(clinicas_antes - clinicas_despues))
+
+def aplicar_cambios(indice_clinicas, entradas, cambios):
+    """Argumentos de motor.indexar_clinicas con las entradas de los planes cambiados rehechas y el resto intacto.
+
+    No modifica `indice_clinicas` (las cotizaciones en curso siguen con el índice que tomaron).
+    """
+    planes = indice_clinicas['planes']
+    posicion = {key: j for j, key in enumerate(planes)}
+    cambiados = np.array(sorted(posicion[(c.aseguradora, c.plan)] for c in cambios.cambios), dtype=np.int64)
+
+    # Tripletas nuevas al final: las entradas que no cambian conservan su código
+    codigos = {tuple(t): i for i, t in enumerate(indice_clinicas['tripletas'].tolist())}
+    primera_red = np.array(indice_clinicas['primera_red'], dtype=np.int64)
+    nuevas = []
+    for j in cambiados.tolist():
+        primera, mapa = entradas[planes[j]]
+        primera_red[j] = codigos.setdefault(primera, len(codigos))
+        nuevas += [(cli, j, codigos.setdefault(t, len(codigos))) for cli, t in mapa.items()]
+    tripletas = np.array(list(codigos), dtype=str).reshape(len(codigos), 3)
+
+    # Entradas de los planes sin cambios + las nuevas, con los códigos de la nueva lista de clínicas
+    viejas = np.array(indice_clinicas['clinicas'], dtype=str)
+    clinica = np.repeat(np.arange(len(viejas)), np.diff(indice_clinicas['red_inicio']))
+    quedan = ~np.isin(indice_clinicas['red_plan'], cambiados)
+    clinicas = sorted(set(viejas[np.unique(clinica[quedan])].tolist()) | {cli for cli, _, _ in nuevas})
+    lista = np.array(clinicas, dtype=str)
+
+    cod = np.concatenate([np.searchsorted(lista, viejas[clinica[quedan]]), np.searchsorted(lista, np.array([c for c, _, _ in nuevas], dtype=str))])
+    plan = np.concatenate([indice_clinicas['red_plan'][quedan], np.array([j for _, j, _ in nuevas], dtype=np.int64)])
+    tripleta = np.concatenate([indice_clinicas['red_tripleta'][quedan], np.array([t for _, _, t in nuevas], dtype=np.int64)])
+    orden = np.lexsort((plan, cod))
+    cod = cod[orden]
+    return (planes, clinicas, primera_red, tripletas, np.searchsorted(cod, np.arange(len(clinicas) + 1)),
+            plan[orden].astype(np.int64), tripleta[orden].astype(np.int64))
+
+def fusionar_redes(base, nuevas):
+    """Filas de `base` con las redes de cada plan que trae `nuevas` reemplazadas (en el lugar del plan); los planes nuevos van al final."""
+    por_plan = {}
+    for f in nuevas: por_plan.setdefault((f.aseguradora, f.plan), []).append(f)
+    salida, puestos = [], set()
+    for f in base:
+        key = (f.aseguradora, f.plan)
+        if key not in por_plan: salida.append(f)
+        elif key not in puestos:
+            salida += por_plan[key]
+            puestos.add(key)
+    for key, filas in por_plan.items():
+        if key not in puestos: salida += filas
+    return salida
+
+def escribir_redes(ruta, filas, origen=ARCHIVO_REDES, hoja=HOJA_REDES):
+    """Escribe `filas` como hoja de redes en `ruta` (modo write-only); las demás hojas de `origen` se copian tal cual (solo valores)."""
+    wb = Workbook(write_only=True)
+    original = load_workbook(origen, read_only=True, data_only=True)
+    try:
+        for nombre in original.sheetnames:
+            ws = wb.create_sheet(nombre)
+            if nombre == hoja:
+                ws.append(COLUMNAS_REDES)
+                for f in filas: ws.append(list(f))
+            else:
+                for fila in original[nombre].iter_rows(values_only=True): ws.append(list(fila))
+        if hoja not in original.sheetnames:
+            ws = wb.create_sheet(hoja)
+            ws.append(COLUMNAS_REDES)
+            for f in filas: ws.append(list(f))
+    finally:
+        original.close()
+    wb.save(ruta)
+
+def informe_cambios(cambios, limite=20):
+    """Líneas de texto del diff, con a lo más `limite` clínicas listadas por plan y tipo de cambio."""
+    def lista(items):
+        texto = ", ".join(items[:limite])
+        return texto + (f" y {len(items) - limite} más" if len(items) > limite else "")
+
+    lineas = []
+    for cia, plan in cambios.planes_nuevos: lineas.append(f"Plan nuevo: {cia} - {plan}")
+    for cia, plan in cambios.planes_quitados: lineas.append(f"Plan sin red: {cia} - {plan}")
+    for c in cambios.cambios:
+        nombre = f"{c.aseguradora} - {c.plan}"
+        if c.agregadas: lineas.append(f"{nombre}: +{len(c.agregadas)} clínicas ({lista([f'{cli} [{red}]' for cli, red in c.agregadas])})")
+        if c.quitadas: lineas.append(f"{nombre}: -{len(c.quitadas)} clínicas ({lista([f'{cli} [{red}]' for cli, red in c.quitadas])})")
+        if c.cambiadas: lineas.append(f"{nombre}: {len(c.cambiadas)} clínicas cambian de red o cobertura ({lista([f'{cli} [{a[0]} -> {d[0]}]' for cli, a, d in c.cambiadas])})")
+        if c.primera_red: lineas.append(f"{nombre}: la primera red pasa de {c.primera_red[0][0]} a {c.primera_red[1][0]}")
+    if cambios.clinicas_nuevas: lineas.append(f"Clínicas nuevas en el buscador: {lista(cambios.clinicas_nuevas)}")
+    if cambios.clinicas_quitadas: lineas.append(f"Clínicas que ya no cubre ningún plan: {lista(cambios.clinicas_quitadas)}")
+    return lineas or ["Sin cambios en las redes"]
@@ -0,0 +1,102 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+from motor import armar_base, aplicar_descuentos
+
+# --- SESIONES ---
+# La última cotización de cada sesión no queda como DataFrame en la memoria del proceso: se guarda compacta
+# (planes, precios de lista y descuentos, unos pocos números por fila) en SQLite bajo el id de la sesión y el
+# DataFrame se rehace con la foto de datos compartida.
+# El registro no lleva el nombre del cliente: ese dato queda solo en la memoria de la sesión (ver app.py).
+
+class CotizacionCompacta(NamedTuple):
+    """Lo mínimo para rehacer el resultado de buscar con la misma foto de datos (ver expandir)."""
+    foto: str                # huella de la foto de datos con la que se cotizó
+    clinicas: list           # en el orden en que se eligieron
+    continuidad: str
+    cobertura: str
+    tipo_cliente: str
+    posiciones: list         # Pos_Plan de cada fila, en el orden de buscar_base
+    precios: list            # Precio_Lista de cada fila
+    descuentos: list         # Pct_Dscto aplicado a cada fila
+    perfil: dict             # dependientes, continuidad y cobertura para el PDF (sin 'Titular')
+
+    def a_json(self):
+        return json.dumps(self._asdict(), ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def desde_json(cls, texto):
+        datos = json.loads(texto)
+        # Registros anteriores traían nombre_cliente (y 'Titular' en el perfil): se ignoran
+        datos['perfil'].pop('Titular', None)
+        return cls(**{campo: datos[campo] for campo in cls._fields})
+
+def huella_foto(foto):
+    """Identifica la foto de datos por el contenido de sus archivos (sha1 de cada uno)."""
+    return hashlib.sha1("|".join(str(h) for _, _, h in foto.firma).encode()).hexdigest()[:16]
+
+def compactar(foto, base, res, clinicas, continuidad, cobertura, tipo_cliente, perfil):
+    """CotizacionCompacta de `base` (buscar_base) con los descuentos que muestra `res` (aplicar_descuentos)."""
+    if base.empty: posiciones, precios, descuentos = [], [], []
+    else:
+        posiciones = base['Pos_Plan'].tolist()
+        precios = base['Precio_Lista'].tolist()
+        pct = dict(zip(res['Pos_Plan'].tolist(), res['Pct_Dscto'].tolist()))
+        descuentos = [pct[j] for j in posiciones]
+    return CotizacionCompacta(huella_foto(foto), list(clinicas), continuidad, cobertura, tipo_cliente,
+                              posiciones, precios, descuentos, {k: v for k, v in perfil.items() if k != 'Titular'})
+
+def expandir(cot, foto):
+    """(base, resultados) como los dejó la cotización, o None si la foto de datos cambió desde entonces."""
+    if cot.foto != huella_foto(foto): return None
+    # buscar_base recibe las clínicas ordenadas (ver la clave de la caché en app.py)
+    base = armar_base(foto.catalogo, foto.indice_clinicas, cot.posiciones, cot.precios, sorted(cot.clinicas))
+    vector = np.zeros(len(foto.indice_clinicas['planes']), dtype=np.int64)
+    vector[cot.posiciones] = cot.descuentos
+    return base, aplicar_descuentos(base, vector)
+
+class AlmacenSesiones:
+    """Cotizaciones por id de sesión en SQLite (WAL), compartidas por todos los procesos del equipo."""
+
+    def __init__(self, ruta_db='sesiones.db', vigencia_horas=12):
+        self.ruta_db = ruta_db
+        self.vigencia = vigencia_horas * 3600
+        self._ultima_limpieza = 0.0
+        self._local = threading.local()
+        con = self._con()
+        con.execute("PRAGMA journal_mode=WAL")
+        with con:
+            con.execute("CREATE TABLE IF NOT EXISTS sesiones (id TEXT PRIMARY KEY, datos TEXT NOT NULL, actualizado REAL NOT NULL)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_sesiones_actualizado ON sesiones (actualizado)")
+
+    def _con(self):
+        # Una conexión por hilo: Streamlit atiende cada sesión en su propio hilo
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.ruta_db, timeout=30)
+            con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def guardar(self, sesion, cot):
+        ahora = time.time()
+        con = self._con()
+        with con:
+            con.execute("INSERT INTO sesiones (id, datos, actualizado) VALUES (?, ?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET datos = excluded.datos, actualizado = excluded.actualizado", (sesion, cot.a_json(), ahora))
+            # Las sesiones vencidas se borran de vez en cuando, al guardar
+            if ahora - self._ultima_limpieza > 600:
+                self._ultima_limpieza = ahora
+                con.execute("DELETE FROM sesiones WHERE actualizado < ?", (ahora - self.vigencia,))
+
+    def obtener(self, sesion):
+        """CotizacionCompacta de la sesión, o None si no hay o venció."""
+        fila = self._con().execute("SELECT datos, actualizado FROM sesiones WHERE id = ?", (sesion,)).fetchone()
+        if fila is None or time.time() - fila[1] > self.vigencia: return None
+        return CotizacionCompacta.desde_json(fila[0])
+
@@ -0,0 +1,175 @@
+import os
+import re
+from datetime import date
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# --- TARIFAS ---
+# precios_<año>.csv trae una fila por plan y edad (0-81); casi todas las edades seguidas comparten precio.
+# Se compila en tramos: para cada (plan, salud) la edad en que empieza cada precio distinto. Todos los tramos
+# van en dos arreglos ordenados por clave = (fila del plan * 2 + salud) * TRAMO + edad de inicio, así que el
+# precio de cualquier (plan, edad, salud) es una búsqueda binaria (ver precios_tarifa).
+#
+# Las edades mayores a EDAD_MAXIMA se cotizan con el precio de EDAD_MAXIMA; precio 0 = el plan no asegura esa edad.
+# Varios años (precios_2026.csv, precios_2027.csv...) se cargan juntos con las mismas filas de plan.
+# Cada carga desde los CSV valida las tarifas (validar_tarifa); las anomalías viajan en la foto de datos.
+
+EDAD_MAXIMA = 81
+COLUMNAS_SALUD = ['Precio_Sano', 'Precio_Cronico']
+TRAMO = EDAD_MAXIMA + 1
+_PATRON_TARIFA = re.compile(r'^precios_(\d{4})\.csv$')
+
+class Anomalia(NamedTuple):
+    aseguradora: str
+    plan: str
+    tipo: str        # edad_invalida, duplicada, hueco, precio_cero, edad_limite, baja_con_edad, cronico_menor
+    detalle: str
+
+def archivos_tarifa(carpeta='.'):
+    """[(año, ruta)] de los precios_<año>.csv de `carpeta`, por año."""
+    try: nombres = os.listdir(carpeta)
+    except OSError: return []
+    encontrados = [(int(m.group(1)), n) for n in nombres if (m := _PATRON_TARIFA.match(n))]
+    return [(anio, n if carpeta == '.' else os.path.join(carpeta, n)) for anio, n in sorted(encontrados)]
+
+def anio_vigente(anios, fecha=None):
+    """El último año de tarifa que ya empezó en `fecha` (hoy por defecto); si todos son futuros, el primero."""
+    anio = (fecha or date.today()).year
+    anteriores = [a for a in anios if a <= anio]
+    return max(anteriores) if anteriores else min(anios)
+
+def leer_tarifa(ruta):
+    try: df = pd.read_csv(ruta, sep=',')
+    except: df = pd.read_csv(ruta, sep=';')
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+    df['Aseguradora'] = df['Aseguradora'].astype(str).str.strip()
+    df['Plan'] = df['Plan'].astype(str).str.strip()
+    return df
+
+def _filas_validas(df):
+    df = df[['Aseguradora', 'Plan', 'Edad'] + COLUMNAS_SALUD].copy()
+    df['Edad'] = pd.to_numeric(df['Edad'], errors='coerce')
+    df = df[df['Edad'].between(0, EDAD_MAXIMA)]
+    # Igual que el filtro original: ante edades repetidas manda la primera fila del archivo
+    return df.drop_duplicates(subset=['Aseguradora', 'Plan', 'Edad'], keep='first')
+
+def tabla_densa(df, offsets):
+    """Arreglo (plan x edad 0-81 x salud) con los precios de `df`, con las filas de `offsets`; 0.0 = sin precio."""
+    df = _filas_validas(df)
+    densa = np.zeros((len(offsets), TRAMO, len(COLUMNAS_SALUD)), dtype=np.float64)
+    df = df[[k in offsets for k in zip(df['Aseguradora'], df['Plan'])]]
+    if not df.empty:
+        filas = np.array([offsets[k] for k in zip(df['Aseguradora'], df['Plan'])], dtype=np.intp)
+        edades = df['Edad'].to_numpy(dtype=np.intp)
+        for j, col in enumerate(COLUMNAS_SALUD):
+            densa[filas, edades, j] = pd.to_numeric(df[col], errors='coerce').fillna(0.0).to_numpy()
+    return densa
+
+def comprimir(densa):
+    """(clave, precio) de los tramos de una tabla densa: una entrada por cada edad en que cambia el precio."""
+    series = densa.transpose(0, 2, 1).reshape(-1, TRAMO)          # fila = plan * 2 + salud
+    cambia = np.ones(series.shape, dtype=bool)
+    cambia[:, 1:] = series[:, 1:] != series[:, :-1]
+    serie, edad = np.nonzero(cambia)
+    return (serie * TRAMO + edad).astype(np.int64), series[serie, edad]
+
+def indexar_tarifas(offsets, tramos, anio=None):
+    """Índice de precios: tramos = {año: (clave, precio)}; la clave y el precio de arriba son los de `anio` (el vigente por defecto)."""
+    anio = anio if anio is not None else anio_vigente(list(tramos))
+    clave, precio = tramos[anio]
+    return {'offsets': offsets, 'clave': clave, 'precio': precio, 'anio': anio, 'tramos': tramos}
+
+def tarifa_del_anio(indice_precios, anio):
+    """El mismo índice con los precios de otro año cargado (ValueError si no está)."""
+    if anio not in indice_precios['tramos']: raise ValueError(f"No hay tarifa {anio} (cargadas: {sorted(indice_precios['tramos'])})")
+    return indexar_tarifas(indice_precios['offsets'], indice_precios['tramos'], anio)
+
+def compilar_tarifas(tarifas):
+    """Índice de precios de {año: DataFrame}. Los planes van en el orden del año vigente y luego los que solo están en otros años."""
+    anios = sorted(tarifas)
+    vigente = anio_vigente(anios)
+    offsets = {}
+    for anio in [vigente] + [a for a in anios if a != vigente]:
+        for key in tarifas[anio][['Aseguradora', 'Plan']].drop_duplicates().itertuples(index=False):
+            offsets.setdefault(tuple(key), len(offsets))
+    tramos = {anio: comprimir(tabla_densa(tarifas[anio], offsets)) for anio in anios}
+    return indexar_tarifas(offsets, tramos, vigente)
+
+def precios_tarifa(indice_precios, filas, edades, salud):
+    """Precio de cada (fila de plan, edad, salud) con búsqueda binaria en los tramos; los argumentos se combinan como en numpy."""
+    claves = (np.asarray(filas) * len(COLUMNAS_SALUD) + np.asarray(salud)) * TRAMO + np.minimum(edades, EDAD_MAXIMA)
+    return indice_precios['precio'][np.searchsorted(indice_precios['clave'], claves, side='right') - 1]
+
+# --- VALIDACIÓN ---
+def _rangos(edades):
+    """'0-17, 25, 60-64' para una lista ordenada de edades."""
+    partes, inicio = [], None
+    for i, e in enumerate(edades):
+        if inicio is None: inicio = e
+        if i + 1 == len(edades) or edades[i + 1] != e + 1:
+            partes.append(str(inicio) if inicio == e else f"{inicio}-{e}")
+            inicio = None
+    return ", ".join(partes)
+
+def validar_tarifa(df):
+    """Anomalías de una tarifa (DataFrame de leer_tarifa), por plan, en el orden del archivo."""
+    anomalias = []
+    claves = list(zip(df['Aseguradora'], df['Plan']))
+    offsets = {k: i for i, k in enumerate(dict.fromkeys(claves))}
+    # Una sola tabla densa para todos los planes; los chequeos por plan recorren solo sus filas
+    fila = np.array([offsets[k] for k in claves], dtype=np.intp)
+    edades_num = pd.to_numeric(df['Edad'], errors='coerce')
+    edades = edades_num.to_numpy(dtype=np.float64)
+    valida = (edades >= 0) & (edades <= EDAD_MAXIMA) & (edades % 1 == 0)
+    densa = tabla_densa(df[valida], offsets)
+    repetida = np.zeros(len(df), dtype=bool)
+    repetida[valida] = pd.DataFrame({'f': fila[valida], 'e': edades[valida]}).duplicated().to_numpy()
+    presente = np.zeros((len(offsets), TRAMO), dtype=bool)
+    presente[fila[valida], edades[valida].astype(np.intp)] = True
+    fuera_por_plan = edades_num[~valida].groupby(fila[~valida], sort=False).agg(list).to_dict()
+    repetidas_por_plan = pd.Series(edades[repetida].astype(np.intp)).groupby(fila[repetida]).agg(lambda s: sorted(set(s))).to_dict()
+
+    for (cia, plan), i in offsets.items():
+        def anotar(tipo, detalle): anomalias.append(Anomalia(cia, plan, tipo, detalle))
+
+        fuera = fuera_por_plan.get(i, [])
+        if fuera: anotar('edad_invalida', f"{len(fuera)} filas con Edad fuera de 0-{EDAD_MAXIMA} (se ignoran): {', '.join(map(str, fuera[:5]))}")
+        if i in repetidas_por_plan: anotar('duplicada', f"edades repetidas (vale la primera fila): {_rangos(repetidas_por_plan[i])}")
+
+        faltan = np.flatnonzero(~presente[i]).tolist()
+        if faltan: anotar('hueco', f"sin fila para las edades {_rangos(faltan)} (no se cotizan)")
+
+        for j, col in enumerate(COLUMNAS_SALUD):
+            serie = densa[i, :, j]
+            ceros = np.flatnonzero((serie <= 0) & presente[i]).tolist()
+            if len(ceros) == TRAMO - len(faltan) and ceros:
+                anotar('precio_cero', f"{col} = 0 en todas las edades")
+                continue
+            # Ceros hasta EDAD_MAXIMA: el plan no asegura desde esa edad (edad límite de ingreso)
+            limite = TRAMO
+            while limite > 0 and serie[limite - 1] <= 0: limite -= 1
+            if ceros and ceros[-1] >= limite: anotar('edad_limite', f"{col} = 0 desde los {limite} años")
+            interiores = [e for e in ceros if e < limite]
+            if interiores: anotar('precio_cero', f"{col} = 0 en las edades {_rangos(interiores)}")
+
+            con_precio = np.flatnonzero(serie > 0)
+            bajas = np.flatnonzero(serie[con_precio[1:]] < serie[con_precio[:-1]]).tolist()
+            for k in bajas:
+                a, b = con_precio[k], con_precio[k + 1]
+                anotar('baja_con_edad', f"{col} baja de {serie[a]:,.2f} ({a} años) a {serie[b]:,.2f} ({b} años)")
+
+        ambos = (densa[i, :, 0] > 0) & (densa[i, :, 1] > 0)
+        menor = np.flatnonzero(ambos & (densa[i, :, 1] < densa[i, :, 0])).tolist()
+        if menor: anotar('cronico_menor', f"Precio_Cronico menor que Precio_Sano en las edades {_rangos(menor)}")
+    return anomalias
+
+def informe_anomalias(anomalias):
+    """Líneas de aviso de {año: [Anomalia]}; los planes con edad límite van resumidos en una línea por año."""
+    lineas = []
+    for anio, lista in sorted(anomalias.items()):
+        limites = {(a.aseguradora, a.plan) for a in lista if a.tipo == 'edad_limite'}
+        lineas += [f"precios_{anio}.csv: {a.aseguradora} - {a.plan}: {a.detalle}" for a in lista if a.tipo != 'edad_limite']
+        if limites: lineas.append(f"precios_{anio}.csv: {len(limites)} planes con edad límite (precio 0 hasta la edad máxima; no se cotizan)")
+    return lineas
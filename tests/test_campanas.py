@@ -0,0 +1,53 @@
+"""Campañas que se superponen: manda la última fila del archivo que rige (no se suman) y el descuento se topa en 100%."""
+from datetime import date
+
+import pytest
+
+from campanas import CampanasCompiladas, cargar_campanas
+
+PLANES = [('Cia', 'A'), ('Cia', 'B'), ('Cia', 'C')]
+
+def _campanas(tmp_path, filas):
+    ruta = tmp_path / 'campana_descuentos.csv'
+    lineas = ["Aseguradora,Plan,Tipo_Cliente,Mes,Desde,Hasta,Porcentaje_Descuento"] + [",".join(map(str, f)) for f in filas]
+    ruta.write_text("\n".join(lineas) + "\n", encoding='utf-8')
+    return CampanasCompiladas(cargar_campanas(str(ruta)), PLANES)
+
+def test_fila_repetida_pisa_a_la_anterior(tmp_path):
+    campanas = _campanas(tmp_path, [('Cia', 'A', 'Nuevo', 'Febrero', '', '', 10),
+                                    ('Cia', 'A', 'Nuevo', 'Febrero', '', '', 15)])
+    assert campanas.descuentos('Nuevo', date(2026, 2, 10)) == {('Cia', 'A'): 15, ('Cia', 'B'): 0, ('Cia', 'C'): 0}
+    assert campanas.vector('Continuidad', date(2026, 2, 10)).tolist() == [0, 0, 0]
+    assert campanas.vector('Nuevo', date(2026, 3, 10)).tolist() == [0, 0, 0]
+
+def test_campanas_superpuestas_manda_la_ultima(tmp_path):
+    campanas = _campanas(tmp_path, [
+        ('Cia', 'A', 'Todos', '', '', '', 5),                          # todo el año, ambos tipos
+        ('Cia', 'A', 'Nuevo', 'Febrero', '', '', 20),                  # febrero pisa a la anual para Nuevo
+        ('Cia', 'A', 'Nuevo', '', '10/02/2026', '20/02/2026', 30),     # rango dentro de febrero pisa a ambas
+        ('Cia', 'B', 'Nuevo', '', '01/02/2026', '28/02/2026', 40),
+        ('Cia', 'B', 'Nuevo', 'Febrero', '', '', 25),                  # más abajo que el rango: gana el mes
+        ('Cia', 'C', 'Todos', '', '01/01/2026', '31/03/2026', 12),
+        ('Cia', 'C', 'Todos', '', '15/02/2026', '15/02/2026', 18),     # dos rangos: gana el de más abajo
+    ])
+    assert campanas.vector('Nuevo', date(2026, 1, 15)).tolist() == [5, 0, 12]
+    assert campanas.vector('Nuevo', date(2026, 2, 5)).tolist() == [20, 25, 12]
+    assert campanas.vector('Nuevo', date(2026, 2, 15)).tolist() == [30, 25, 18]
+    assert campanas.vector('Nuevo', date(2026, 2, 21)).tolist() == [20, 25, 12]
+    assert campanas.vector('Continuidad', date(2026, 2, 15)).tolist() == [5, 0, 18]
+    assert campanas.vector('Nuevo', date(2026, 4, 1)).tolist() == [5, 0, 0]
+
+def test_descuento_topado_en_100(tmp_path):
+    campanas = _campanas(tmp_path, [('Cia', 'A', 'Nuevo', 'Febrero', '', '', 150),
+                                    ('Cia', 'B', 'Nuevo', '', '01/02/2026', '', 120),
+                                    ('Cia', 'C', 'Nuevo', 'Febrero', '', '', 60),
+                                    ('Cia', 'C', 'Nuevo', '', '01/02/2026', '28/02/2026', 70)])
+    # Dos campañas de 60 y 70 no suman 130: rige la última
+    assert campanas.vector('Nuevo', date(2026, 2, 10)).tolist() == [100, 100, 70]
+
+def test_vector_memorizado_es_de_solo_lectura(tmp_path):
+    campanas = _campanas(tmp_path, [('Cia', 'A', 'Nuevo', 'Febrero', '', '', 10)])
+    vec = campanas.vector('Nuevo', date(2026, 2, 1))
+    assert campanas.vector('Nuevo', date(2026, 2, 1)) is vec
+    with pytest.raises(ValueError):
+        vec[0] = 50
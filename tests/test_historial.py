@@ -0,0 +1,51 @@
+"""Propuestas PDF en historial_leads.db: el resumen por plan recomendado se acumula con cada lote y se rehace igual desde la tabla."""
+import csv
+from datetime import date, datetime
+from io import StringIO
+
+from historial import AlmacenLeads
+
+def _propuesta(folio, aseguradora, plan, cobertura='Integral', dia=15):
+    return {'Fecha': datetime(2026, 3, dia, 10, folio % 60), 'Folio': folio, 'Aseguradora': aseguradora, 'Plan': plan,
+            'Cobertura': cobertura, 'Condicion': 'Nuevo', 'Rol_Cotizador': 'API'}
+
+def _registrar(almacen):
+    propuestas = [_propuesta(1, 'Cia A', 'Plan 1'), _propuesta(2, 'Cia A', 'Plan 1'), _propuesta(3, 'Cia B', 'Plan 2', 'Básica'),
+                  _propuesta(4, 'Cia A', 'Plan 1', 'Básica', dia=2), _propuesta(5, 'Cia B', 'Plan 2', dia=20)]
+    for p in propuestas: almacen.registrar_propuesta(p)
+    almacen.registrar({'Fecha': datetime(2026, 3, 15, 9, 0), 'Cliente': 'Ana', 'Edad_Titular': 40, 'Cobertura_Interes': 'Integral',
+                       'Condicion': 'Nuevo', 'Clinicas_Preferidas': '', 'Total_Asegurados': 1, 'Rol_Cotizador': 'Cliente'})
+    assert almacen.vaciar()
+
+def _tabla(df):
+    return {tuple(fila[:-1]): fila[-1] for fila in df.itertuples(index=False)}
+
+def test_resumen_por_plan_recomendado(tmp_path):
+    almacen = AlmacenLeads(str(tmp_path / 'historial.db'))
+    _registrar(almacen)
+    assert _tabla(almacen.resumen_planes()) == {('Cia A', 'Plan 1'): 3, ('Cia B', 'Plan 2'): 2}
+    assert _tabla(almacen.resumen_planes(por=('cobertura', 'plan'), desde=date(2026, 3, 10))) == {
+        ('Básica', 'Plan 2'): 1, ('Integral', 'Plan 1'): 2, ('Integral', 'Plan 2'): 1}
+    assert _tabla(almacen.resumen_planes(por=(), cobertura='Básica')) == {(): 2}
+    # Los leads van por su lado: las propuestas no cuentan como leads
+    assert int(almacen.resumen(por=()).iloc[0]['Leads']) == 1
+
+def test_reconstruir_da_el_mismo_resumen_por_plan(tmp_path):
+    almacen = AlmacenLeads(str(tmp_path / 'historial.db'))
+    _registrar(almacen)
+    antes = StringIO()
+    almacen.exportar_resumen(antes, tabla='resumen_plan')
+    assert almacen.reconstruir_resumen() == 1
+    despues = StringIO()
+    almacen.exportar_resumen(despues, tabla='resumen_plan')
+    assert despues.getvalue() == antes.getvalue()
+    filas = list(csv.reader(StringIO(antes.getvalue())))
+    assert filas[0] == ['Dia', 'Cobertura', 'Aseguradora', 'Plan', 'Propuestas']
+    assert sum(int(f[-1]) for f in filas[1:]) == 5
+
+def test_propuestas_pendientes_se_importan(tmp_path):
+    ruta = str(tmp_path / 'historial.db')
+    almacen = AlmacenLeads(ruta)
+    # Como si la base hubiera fallado al escribir el lote
+    almacen._guardar_pendientes('propuestas', [('2026-03-15 10:01:00', 1, 'Cia A', 'Plan 1', 'Integral', 'Nuevo', 'API')])
+    assert _tabla(AlmacenLeads(ruta).resumen_planes()) == {('Cia A', 'Plan 1'): 1}
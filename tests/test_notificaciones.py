@@ -0,0 +1,121 @@
+"""Despachador de notificaciones contra un servidor SMTP local (aiosmtpd) en el mismo proceso.
+
+Requiere pytest y aiosmtpd (requirements-dev.txt).
+"""
+import os
+import json
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from notificaciones import CARPETA_FALLIDOS, DespachadorNotificaciones, TransporteSMTP
+
+class Buzon:
+    """Handler de aiosmtpd: guarda los mensajes; rechaza con `codigo_rechazo` los primeros `rechazos` y los que digan RECHAZAR."""
+
+    def __init__(self, rechazos=0, codigo_rechazo='451 Intente luego'):
+        self.rechazos = rechazos
+        self.codigo_rechazo = codigo_rechazo
+        self.mensajes = []
+
+    async def handle_DATA(self, server, session, envelope):
+        texto = envelope.content.decode('utf-8', errors='replace')
+        if self.rechazos > 0 or 'RECHAZAR' in texto:
+            self.rechazos -= 1
+            return self.codigo_rechazo
+        self.mensajes.append(texto)
+        return '250 OK'
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def puerto():
+    return _puerto_libre()
+
+def _servidor(buzon, puerto):
+    controlador = Controller(buzon, hostname='127.0.0.1', port=puerto)
+    controlador.start()
+    return controlador
+
+def _despachador(carpeta, puerto, **opciones):
+    transporte = TransporteSMTP('127.0.0.1', puerto, starttls=False, timeout=5)
+    valores = dict(ventana=0.05, espera_inicial=0.1, espera_maxima=0.5, inactividad=1.0)
+    valores.update(opciones)
+    return DespachadorNotificaciones(transporte, 'cotizador@test', 'ventas@test', carpeta_spool=str(carpeta), **valores)
+
+def test_spool_sobrevive_reinicio(tmp_path, puerto):
+    # Sin servidor: los avisos quedan en el spool y se detiene el proceso
+    despachador = _despachador(tmp_path, puerto)
+    despachador.encolar("Lead 1", "uno")
+    despachador.encolar("Lead 2", "dos")
+    assert not despachador.vaciar(timeout=0.5)
+    despachador.detener()
+    assert len([n for n in os.listdir(tmp_path) if '.json' in n]) == 2
+
+    # "Reinicio": servidor arriba y un despachador nuevo sobre el mismo spool
+    buzon = Buzon()
+    servidor = _servidor(buzon, puerto)
+    try:
+        despachador = _despachador(tmp_path, puerto)
+        assert despachador.vaciar(timeout=10)
+        despachador.detener()
+    finally:
+        servidor.stop()
+    assert sorted('Lead 1' in m for m in buzon.mensajes) == [False, True]
+    assert len(buzon.mensajes) == 2
+
+def test_reintenta_tras_caida_y_rechazo_temporal(tmp_path, puerto):
+    despachador = _despachador(tmp_path, puerto)
+    despachador.encolar("Lead", "cuerpo")
+    assert not despachador.vaciar(timeout=0.5)
+    assert despachador.fallos > 0
+
+    # El servidor aparece y además rechaza el primer DATA (451): se reintenta hasta que pasa
+    buzon = Buzon(rechazos=1)
+    servidor = _servidor(buzon, puerto)
+    try:
+        assert despachador.vaciar(timeout=10)
+        despachador.detener()
+    finally:
+        servidor.stop()
+    assert len(buzon.mensajes) == 1
+    assert despachador.enviados == 1
+    assert os.listdir(tmp_path / CARPETA_FALLIDOS) == []
+
+def test_aviso_rechazado_no_traba_a_los_demas(tmp_path, puerto):
+    buzon = Buzon(codigo_rechazo='554 Rechazado')
+    servidor = _servidor(buzon, puerto)
+    try:
+        despachador = _despachador(tmp_path, puerto, max_intentos=3)
+        despachador.encolar("RECHAZAR", "siempre falla")
+        with open(tmp_path / '00000000_corrupto.json', 'w', encoding='utf-8') as f: f.write('{no es json')
+        despachador.encolar("Lead bueno", "pasa")
+        assert despachador.vaciar(timeout=10)
+        despachador.detener()
+    finally:
+        servidor.stop()
+    assert len(buzon.mensajes) == 1 and 'Lead bueno' in buzon.mensajes[0]
+    fallidos = sorted(os.listdir(tmp_path / CARPETA_FALLIDOS))
+    assert len(fallidos) == 2 and fallidos[0] == '00000000_corrupto.json'
+    with open(tmp_path / CARPETA_FALLIDOS / fallidos[1], encoding='utf-8') as f: assert json.load(f)['intentos'] == 3
+
+def test_recupera_reclamados_y_tmp_viejos(tmp_path, puerto):
+    buzon = Buzon()
+    servidor = _servidor(buzon, puerto)
+    try:
+        despachador = _despachador(tmp_path, puerto, antiguedad=0)
+        # Un envío que otro proceso reclamó y no terminó, y un .tmp completo de un encolar interrumpido
+        for nombre in ('1_a.json.99999', '2_b.json.tmp'):
+            with open(tmp_path / nombre, 'w', encoding='utf-8') as f: json.dump({'asunto': nombre, 'cuerpo': 'x', 'intentos': 0}, f)
+        with open(tmp_path / '3_c.json.tmp', 'w', encoding='utf-8') as f: f.write('{"asun')
+        despachador.encolar("Lead", "nuevo")
+        assert despachador.vaciar(timeout=10)
+        despachador.detener()
+    finally:
+        servidor.stop()
+    assert len(buzon.mensajes) == 3
+    assert [n for n in os.listdir(tmp_path) if n != CARPETA_FALLIDOS] == []
@@ -0,0 +1,127 @@
+"""Frente de Pareto del optimizador contra la enumeración exhaustiva de asignaciones, en instancias chicas al azar."""
+import os
+import itertools
+
+import numpy as np
+import pytest
+
+from optimizador import MAX_POLIZAS, frente_pareto, optimizar
+
+def _asignaciones_validas(precios, niveles, titulares, max_polizas):
+    """(costo, puntaje) de cada asignación miembro -> plan que cumple las reglas del optimizador."""
+    n, k = precios.shape
+    for eleccion in itertools.product(range(k), repeat=n):
+        usados = set(eleccion)
+        if len(usados) > max_polizas: continue
+        if any(not any(titulares[m] for m in range(n) if eleccion[m] == q) for q in usados): continue
+        costo = sum(precios[m, eleccion[m]] for m in range(n))
+        if np.isinf(costo): continue
+        yield costo, sum(int(niveles[q]) for q in eleccion)
+
+def _frente_exhaustivo(precios, niveles, titulares, max_polizas):
+    mejores = {}
+    for costo, puntaje in _asignaciones_validas(precios, niveles, titulares, max_polizas):
+        mejores[puntaje] = min(costo, mejores.get(puntaje, np.inf))
+    frente, mejor_puntaje = [], -1
+    for puntaje in sorted(mejores, key=lambda s: (mejores[s], -s)):
+        if puntaje > mejor_puntaje:
+            mejor_puntaje = puntaje
+            frente.append((mejores[puntaje], puntaje))
+    return frente
+
+def _instancia(rng, max_miembros=5, max_planes=4):
+    n, k = int(rng.integers(1, max_miembros + 1)), int(rng.integers(1, max_planes + 1))
+    precios = rng.integers(50, 200, (n, k)).astype(float)
+    precios[rng.random((n, k)) < 0.15] = np.inf       # miembros que un plan no asegura
+    niveles = rng.integers(0, 3, k)
+    titulares = rng.random(n) < 0.5
+    if not titulares.any(): titulares[0] = True
+    return precios, niveles, titulares
+
+def _revisar_polizas(frente, precios, niveles, titulares, max_polizas):
+    """Cada punto del frente trae pólizas que cubren a todos, con titular, y que suman su costo y puntaje."""
+    n = precios.shape[0]
+    for costo, puntaje, polizas in frente:
+        assert len(polizas) <= max_polizas
+        assert sorted(m for _, miembros in polizas for m in miembros) == list(range(n))
+        assert all(titulares[list(miembros)].any() for _, miembros in polizas)
+        assert sum(precios[m, q] for q, miembros in polizas for m in miembros) == pytest.approx(costo)
+        assert sum(int(niveles[q]) * len(miembros) for q, miembros in polizas) == puntaje
+
+@pytest.mark.parametrize('max_polizas', [1, 2, MAX_POLIZAS, 5])
+def test_frente_igual_a_enumeracion(max_polizas):
+    rng = np.random.default_rng(max_polizas)
+    for _ in range(80):
+        precios, niveles, titulares = _instancia(rng)
+        frente = frente_pareto(precios, niveles, titulares, max_polizas)
+        _revisar_polizas(frente, precios, niveles, titulares, max_polizas)
+        esperado = _frente_exhaustivo(precios, niveles, titulares, max_polizas)
+        assert [(pytest.approx(c), s) for c, s, _ in frente] == esperado
+
+def test_mejor_cobertura_dentro_de_un_presupuesto():
+    # Con el frente se responde "la mayor cobertura que cabe en S/ X": debe coincidir con la enumeración
+    rng = np.random.default_rng(7)
+    for _ in range(60):
+        precios, niveles, titulares = _instancia(rng)
+        frente = frente_pareto(precios, niveles, titulares)
+        validas = list(_asignaciones_validas(precios, niveles, titulares, MAX_POLIZAS))
+        costos = sorted({c for c, _ in validas})
+        presupuestos = [costos[0] - 1] + costos + [c + 0.5 for c in costos] if costos else [100.0]
+        for presupuesto in presupuestos:
+            del_frente = max((s for c, s, _ in frente if c <= presupuesto), default=None)
+            exhaustivo = max((s for c, s in validas if c <= presupuesto), default=None)
+            assert del_frente == exhaustivo
+
+def test_max_polizas_uno_es_el_mejor_plan_unico():
+    rng = np.random.default_rng(3)
+    for _ in range(60):
+        precios, niveles, titulares = _instancia(rng)
+        frente = frente_pareto(precios, niveles, titulares, 1)
+        assert all(len(polizas) == 1 for _, _, polizas in frente)
+        # Un plan único solo vale si asegura a todos; la más barata es la de menor total entre ellos
+        totales = [precios[:, q].sum() for q in range(precios.shape[1]) if np.isfinite(precios[:, q]).all()]
+        assert (frente[0][0] if frente else None) == (pytest.approx(min(totales)) if totales else None)
+
+def test_mas_polizas_nunca_encarece():
+    rng = np.random.default_rng(11)
+    for _ in range(60):
+        precios, niveles, titulares = _instancia(rng)
+        anterior = None
+        for max_polizas in range(1, 5):
+            frente = frente_pareto(precios, niveles, titulares, max_polizas)
+            actual = {s: c for c, s, _ in frente}
+            if anterior:
+                # Todo punto con menos pólizas sigue alcanzable: el frente nuevo lo iguala o lo domina
+                for s, c in anterior.items():
+                    assert any(s2 >= s and c2 <= c + 1e-9 for s2, c2 in actual.items())
+            anterior = actual
+
+def test_casos_sin_solucion():
+    precios = np.array([[100.0, np.inf], [np.inf, np.inf]])       # el segundo miembro no tiene plan
+    assert frente_pareto(precios, np.array([0, 1]), np.array([True, True])) == []
+    assert frente_pareto(np.zeros((2, 0)), np.zeros(0, dtype=int), np.array([True, False])) == []
+    # El único plan que asegura al menor no asegura al titular: con una póliza por titular no hay reparto posible
+    precios = np.array([[100.0, np.inf], [np.inf, 50.0]])
+    assert frente_pareto(precios, np.array([0, 0]), np.array([True, False])) == []
+    # Con dos titulares sí se reparten en dos pólizas, pero no con una sola
+    assert [(c, s) for c, s, _ in frente_pareto(precios, np.array([0, 0]), np.array([True, True]))] == [(150.0, 0)]
+    assert frente_pareto(precios, np.array([0, 0]), np.array([True, True]), 1) == []
+
+@pytest.fixture
+def foto(monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from datos import cargar_foto
+    foto = cargar_foto()
+    if foto is None: pytest.skip("Faltan los archivos de datos")
+    return foto
+
+def test_optimizar_no_supera_al_mejor_plan_unico(foto):
+    from motor import buscar
+    familia = [{'edad': 66, 'salud': 'Sano'}, {'edad': 63, 'salud': 'Crónico'}, {'edad': 40, 'salud': 'Sano'}, {'edad': 8, 'salud': 'Sano'}]
+    descuentos = foto.campanas.vector('Nuevo')
+    res = buscar(foto.catalogo, foto.indice_clinicas, foto.indice_precios, familia, [], 'Nuevo', 'Integral', descuentos)
+    asignaciones = optimizar(foto.catalogo, foto.indice_clinicas, foto.indice_precios, familia, [], 'Nuevo', 'Integral', descuentos)
+    assert asignaciones and not res.empty
+    assert asignaciones[0].precio_final <= res['Precio_Final'].iloc[0] + 0.005
+    assert all(len(a.polizas) <= MAX_POLIZAS for a in asignaciones)
+    assert [a.puntaje for a in asignaciones] == sorted({a.puntaje for a in asignaciones})
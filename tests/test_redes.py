@@ -0,0 +1,117 @@
+"""Actualización incremental de redes: aplicar el diff debe dar el mismo índice de clínicas que una carga completa."""
+import os
+import random
+import shutil
+
+import numpy as np
+import pytest
+
+from motor import buscar, construir_indice_clinicas, datos_red, indexar_clinicas
+from redes import (ARCHIVO_REDES, FilaRed, aplicar_cambios, comparar_redes, entradas_indice, entradas_redes, escribir_redes,
+                   fusionar_redes, leer_redes, tabla_redes)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _mismo_indice(incremental, completo):
+    """Mismas clínicas, entradas (clínica, plan) y redes; los códigos de tripleta pueden diferir."""
+    assert incremental['planes'] == completo['planes']
+    assert incremental['clinicas'] == completo['clinicas']
+    assert np.array_equal(incremental['matriz'], completo['matriz'])
+    assert entradas_indice(incremental) == entradas_indice(completo)
+    for j in range(len(completo['planes'])):
+        assert datos_red(incremental, j) == datos_red(completo, j)
+        for cli in np.array(completo['clinicas'])[completo['matriz'][:, j]].tolist():
+            assert datos_red(incremental, j, cli) == datos_red(completo, j, cli)
+
+def _filas_al_azar(rng, planes, clinicas):
+    filas = []
+    for cia, plan in planes:
+        for _ in range(rng.randint(1, 3)):
+            incluidas = None if rng.random() < 0.05 else ", ".join(rng.sample(clinicas, rng.randint(1, min(12, len(clinicas)))))
+            filas.append(FilaRed(cia, plan, f"Red {rng.randint(1, 4)}", f"{rng.choice([70, 80, 90])}%", rng.choice(['A', 'B']), incluidas))
+    return filas
+
+def test_diff_encadenado_igual_a_carga_completa():
+    rng = random.Random(4)
+    clinicas = [f"Clínica {i}" for i in range(60)]
+    planes = [(f"Cia {i % 3}", f"Plan {i}") for i in range(15)]
+    filas = _filas_al_azar(rng, planes, clinicas)
+    indice = construir_indice_clinicas(tabla_redes(filas))
+    for _ in range(25):
+        # Redes nuevas para algunos planes: entran y salen clínicas (a veces clínicas que nadie más tenía) y cambian redes
+        extra = [f"Nueva {rng.randint(0, 9)}"]
+        filas = fusionar_redes(filas, _filas_al_azar(rng, rng.sample(planes, rng.randint(1, 4)), clinicas[:rng.randint(5, 60)] + extra))
+        entradas = entradas_redes(filas)
+        cambios = comparar_redes(indice, entradas)
+        assert not cambios.requiere_recarga
+        incremental = indexar_clinicas(*aplicar_cambios(indice, entradas, cambios))
+        _mismo_indice(incremental, construir_indice_clinicas(tabla_redes(filas)))
+        indice = incremental
+
+def test_diff_informa_altas_y_bajas():
+    base = [FilaRed('Cia', 'A', 'Red 1', '80%', 'A', 'Uno, Dos'), FilaRed('Cia', 'B', 'Red 1', '80%', 'A', 'Dos, Tres')]
+    indice = construir_indice_clinicas(tabla_redes(base))
+    filas = fusionar_redes(base, [FilaRed('Cia', 'B', 'Red 2', '90%', 'B', 'Dos, Cuatro')])
+    cambios = comparar_redes(indice, entradas_redes(filas))
+    assert cambios.clinicas_nuevas == ['Cuatro'] and cambios.clinicas_quitadas == ['Tres']
+    [cambio] = cambios.cambios
+    assert (cambio.plan, cambio.agregadas, cambio.quitadas) == ('B', [('Cuatro', 'Red 2')], [('Tres', 'Red 1')])
+    assert cambio.cambiadas == [('Dos', ('Red 1', '80%', 'A'), ('Red 2', '90%', 'B'))]
+    incremental = indexar_clinicas(*aplicar_cambios(indice, entradas_redes(filas), cambios))
+    _mismo_indice(incremental, construir_indice_clinicas(tabla_redes(filas)))
+    assert 'Tres' not in incremental['codigos']
+
+    # Un plan que aparece o desaparece cambia las posiciones de todo: no se aplica sobre el índice
+    assert comparar_redes(indice, entradas_redes(base + [FilaRed('Cia', 'C', 'Red 1', '80%', 'A', 'Uno')])).requiere_recarga
+    assert comparar_redes(indice, entradas_redes(base[:1])).requiere_recarga
+
+@pytest.fixture
+def carpeta_datos(tmp_path, monkeypatch):
+    from datos import ARCHIVOS_DATOS
+    for nombre in ARCHIVOS_DATOS:
+        if not os.path.exists(os.path.join(RAIZ, nombre)): pytest.skip(f"Falta {nombre}")
+        shutil.copy(os.path.join(RAIZ, nombre), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def _reescribir_redes(filas):
+    tmp = ARCHIVO_REDES + '.tmp.xlsx'
+    escribir_redes(tmp, filas)
+    os.replace(tmp, ARCHIVO_REDES)
+
+def test_actualizar_redes_igual_a_recarga(carpeta_datos):
+    from datos import ARCHIVOS_DATOS, actualizar_redes, cargar_foto_fuentes
+    foto = cargar_foto_fuentes(ARCHIVOS_DATOS)
+    filas = leer_redes()
+
+    # Un plan gana una clínica nueva y una existente; otro pierde todas las suyas salvo la primera
+    plan_a, plan_b = filas[0], next(f for f in filas if (f.aseguradora, f.plan) != (filas[0].aseguradora, filas[0].plan))
+    clinicas_b = [c.strip() for c in str(plan_b.clinicas_incluidas).split(',')]
+    otra = next(c for c in foto.clinicas_unicas if c not in str(plan_a.clinicas_incluidas))
+    nuevas = [plan_a._replace(clinicas_incluidas=f"{plan_a.clinicas_incluidas}, Clínica de Prueba, {otra}"),
+              plan_b._replace(clinicas_incluidas=clinicas_b[0])]
+    _reescribir_redes(fusionar_redes(filas, nuevas))
+
+    parcial = actualizar_redes(foto, ARCHIVOS_DATOS)
+    assert parcial is not None
+    incremental, cambios = parcial
+    assert 'Clínica de Prueba' in cambios.clinicas_nuevas
+    completa = cargar_foto_fuentes(ARCHIVOS_DATOS)
+    _mismo_indice(incremental.indice_clinicas, completa.indice_clinicas)
+    assert incremental.clinicas_unicas == completa.clinicas_unicas
+    assert incremental.firma == completa.firma
+
+    familia = [{'edad': 45, 'salud': 'Sano'}, {'edad': 12, 'salud': 'Sano'}]
+    for clinicas in ([], ['Clínica de Prueba'], [otra], clinicas_b[:2]):
+        for cobertura in ('Básica', 'Integral'):
+            args = (familia, clinicas, 'Nuevo', cobertura, {})
+            a = buscar(incremental.catalogo, incremental.indice_clinicas, incremental.indice_precios, *args)
+            b = buscar(completa.catalogo, completa.indice_clinicas, completa.indice_precios, *args)
+            assert a.equals(b)
+
+def test_plan_nuevo_pide_carga_completa(carpeta_datos):
+    from datos import ARCHIVOS_DATOS, actualizar_redes, cargar_foto_fuentes
+    foto = cargar_foto_fuentes(ARCHIVOS_DATOS)
+    filas = leer_redes()
+    _reescribir_redes(filas + [filas[0]._replace(plan='Plan Inexistente')])
+    assert actualizar_redes(foto, ARCHIVOS_DATOS) is None
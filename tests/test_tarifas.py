@@ -0,0 +1,102 @@
+"""Tarifas compiladas en tramos (ida y vuelta contra la tabla densa) y validación de un CSV armado a mano."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from tarifas import (COLUMNAS_SALUD, EDAD_MAXIMA, TRAMO, compilar_tarifas, comprimir, indexar_tarifas, leer_tarifa, precios_tarifa,
+                     tabla_densa, tarifa_del_anio, validar_tarifa)
+
+def _tarifa_aleatoria(rng, planes):
+    """DataFrame como precios_<año>.csv: precios por escalones de edad (como las tarifas reales), con ceros y alguna baja."""
+    filas = []
+    for cia, plan in planes:
+        cortes = np.sort(rng.choice(np.arange(1, TRAMO), size=int(rng.integers(0, 12)), replace=False))
+        escalones = np.split(np.arange(TRAMO), cortes)
+        for salud in range(len(COLUMNAS_SALUD)):
+            precios = np.concatenate([np.full(len(e), float(rng.choice([0.0, *rng.integers(50, 900, 3)]))) for e in escalones])
+            if salud == 0: sano = precios
+            else: cronico = precios
+        filas += [{'Aseguradora': cia, 'Plan': plan, 'Edad': e, 'Precio_Sano': sano[e], 'Precio_Cronico': cronico[e]} for e in range(TRAMO)]
+    return pd.DataFrame(filas)
+
+def test_tramos_reproducen_la_tabla_densa():
+    rng = np.random.default_rng(5)
+    planes = [('Cia A', f'Plan {i}') for i in range(6)] + [('Cia B', 'Plan 0')]
+    df = _tarifa_aleatoria(rng, planes)
+    offsets = {plan: i for i, plan in enumerate(planes)}
+    densa = tabla_densa(df, offsets)
+    clave, precio = comprimir(densa)
+    assert len(clave) < densa.size and (np.diff(clave) > 0).all()
+
+    indice = indexar_tarifas(offsets, {2026: (clave, precio)})
+    filas, edades, salud = np.meshgrid(np.arange(len(planes)), np.arange(TRAMO), np.arange(len(COLUMNAS_SALUD)), indexing='ij')
+    assert np.array_equal(precios_tarifa(indice, filas, edades, salud), densa)
+    # Cada precio del CSV, fila por fila
+    for fila in df.itertuples(index=False):
+        for j, col in enumerate(COLUMNAS_SALUD):
+            assert precios_tarifa(indice, offsets[(fila.Aseguradora, fila.Plan)], fila.Edad, j) == getattr(fila, col)
+
+def test_edades_sobre_el_maximo_usan_el_precio_del_maximo():
+    rng = np.random.default_rng(8)
+    planes = [('Cia', 'A'), ('Cia', 'B')]
+    indice = compilar_tarifas({2026: _tarifa_aleatoria(rng, planes)})
+    for fila in range(len(planes)):
+        for salud in range(len(COLUMNAS_SALUD)):
+            tope = precios_tarifa(indice, fila, EDAD_MAXIMA, salud)
+            assert (precios_tarifa(indice, fila, np.array([EDAD_MAXIMA + 1, 90, 120]), salud) == tope).all()
+
+def test_varios_anios_comparten_filas_de_plan():
+    rng = np.random.default_rng(2)
+    tarifa_2026 = _tarifa_aleatoria(rng, [('Cia', 'A'), ('Cia', 'B')])
+    tarifa_2027 = _tarifa_aleatoria(rng, [('Cia', 'B'), ('Cia', 'C')])
+    indice = compilar_tarifas({2026: tarifa_2026, 2027: tarifa_2027})
+    assert set(indice['offsets']) == {('Cia', 'A'), ('Cia', 'B'), ('Cia', 'C')}
+    for anio, df in ((2026, tarifa_2026), (2027, tarifa_2027)):
+        del_anio = tarifa_del_anio(indice, anio)
+        for fila in df.itertuples(index=False):
+            assert precios_tarifa(del_anio, del_anio['offsets'][(fila.Aseguradora, fila.Plan)], fila.Edad, 0) == fila.Precio_Sano
+    with pytest.raises(ValueError):
+        tarifa_del_anio(indice, 2030)
+
+# --- VALIDACIÓN ---
+def _filas_plan(plan, edades=range(TRAMO), sano=lambda e: 100.0 + e, cronico=lambda e: 150.0 + 2 * e):
+    return [('Cia', plan, e, sano(e), cronico(e)) for e in edades]
+
+@pytest.fixture
+def csv_anomalias(tmp_path):
+    filas = (_filas_plan('Correcto')
+             + _filas_plan('Hueco', [e for e in range(TRAMO) if not 10 <= e <= 12])
+             + _filas_plan('Duplicada') + _filas_plan('Duplicada', [5, 6], sano=lambda e: 1.0)
+             + _filas_plan('Limite', sano=lambda e: 0.0 if e >= 70 else 100.0 + e, cronico=lambda e: 0.0 if e >= 70 else 150.0 + e)
+             + _filas_plan('Baja', sano=lambda e: 300.0 if e < 40 else 200.0 + e, cronico=lambda e: 500.0 + e)
+             + _filas_plan('Cronico', cronico=lambda e: 50.0 if e in (30, 31) else 150.0 + 2 * e)
+             + _filas_plan('Invalida') + [('Cia', 'Invalida', 95, 1.0, 1.0), ('Cia', 'Invalida', 2.5, 1.0, 1.0)])
+    ruta = tmp_path / 'precios_2026.csv'
+    pd.DataFrame(filas, columns=['Aseguradora', 'Plan', 'Edad'] + COLUMNAS_SALUD).to_csv(ruta, index=False)
+    return str(ruta)
+
+def _por_plan(anomalias):
+    planes = {}
+    for a in anomalias: planes.setdefault(a.plan, []).append((a.tipo, a.detalle))
+    return planes
+
+def test_validar_tarifa_reporta_cada_anomalia(csv_anomalias):
+    planes = _por_plan(validar_tarifa(leer_tarifa(csv_anomalias)))
+    assert 'Correcto' not in planes
+    assert planes['Hueco'] == [('hueco', "sin fila para las edades 10-12 (no se cotizan)")]
+    assert planes['Duplicada'] == [('duplicada', "edades repetidas (vale la primera fila): 5-6")]
+    assert planes['Limite'] == [('edad_limite', "Precio_Sano = 0 desde los 70 años"), ('edad_limite', "Precio_Cronico = 0 desde los 70 años")]
+    assert planes['Baja'] == [('baja_con_edad', "Precio_Sano baja de 300.00 (39 años) a 240.00 (40 años)")]
+    assert planes['Cronico'] == [('baja_con_edad', "Precio_Cronico baja de 208.00 (29 años) a 50.00 (30 años)"),
+                                 ('cronico_menor', "Precio_Cronico menor que Precio_Sano en las edades 30-31")]
+    assert [tipo for tipo, _ in planes['Invalida']] == ['edad_invalida']
+    assert planes['Invalida'][0][1].startswith("2 filas con Edad fuera de 0-81")
+
+def test_validar_tarifa_ceros_interiores_y_plan_sin_precio(tmp_path):
+    filas = (_filas_plan('Cero', sano=lambda e: 0.0 if e in (3, 4) else 100.0 + e)
+             + _filas_plan('Vacio', sano=lambda e: 0.0, cronico=lambda e: 0.0))
+    ruta = tmp_path / 'precios_2026.csv'
+    pd.DataFrame(filas, columns=['Aseguradora', 'Plan', 'Edad'] + COLUMNAS_SALUD).to_csv(ruta, index=False)
+    planes = _por_plan(validar_tarifa(leer_tarifa(str(ruta))))
+    assert planes['Cero'] == [('precio_cero', "Precio_Sano = 0 en las edades 3-4")]
+    assert planes['Vacio'] == [('precio_cero', "Precio_Sano = 0 en todas las edades"), ('precio_cero', "Precio_Cronico = 0 en todas las edades")]